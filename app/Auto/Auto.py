@@ -1,3 +1,5 @@
 import typing as tp
+from collections import namedtuple
 
 Sentence = tp.NewType("Sentence", list[str])
+Move = namedtuple('Move', ('rule', 'context', 'invertible'))
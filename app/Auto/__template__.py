@@ -7,5 +7,11 @@ VERSION = '0.0.1'
 def solve(delegate: callable, branch: list[utils.Sentence]) -> tuple[tp.Union[str, None], tp.Union[tuple[str], None]]:
     pass
 
+def propose(branch: list[utils.Sentence]) -> tuple[utils.Move]:
+    """Returns the rules which can be tried on the branch, in the order they should be tried.
+    A move is invertible if the branch can be proven whenever it can be proven after using the move,
+    so the search never has to try the other moves"""
+    pass
+
 def compatible() -> tuple[str]:
-    pass
\ No newline at end of file
+    pass
@@ -1,6 +1,7 @@
 import typing as tp
 import Auto as utils
 from collections import namedtuple
+from functools import lru_cache
 from math import inf
 
 SOCKET = 'Auto'
@@ -9,6 +10,7 @@ VERSION = '0.0.1'
 
 RULES = ['left and', 'right imp', 'right and', 'left or', 'left imp', 'right or', " "]
 RULES_types = {i.split()[1] for i in RULES[:-1]}
+NONINVERTIBLE = ('left imp', 'right or')
 
 PRECEDENCE = {
     'and': 2,
@@ -16,7 +18,14 @@ PRECEDENCE = {
     'imp': 1
 }
 
-def find_rule(sen: utils.Sentence) -> tp.Union[list[str], None]:
+def find_rule(sen: utils.Sentence) -> tp.Union[tuple[str], None]:
+    """Returns rules usable on the sequent; results are remembered, so every sequent is scanned once"""
+    return _find_rule(tuple(sen))
+
+
+@lru_cache(2**12)
+def _find_rule(sen: tuple[str]) -> tp.Union[tuple[str], None]:
+    """Scans the sequent for usable rules; USE `find_rule` INSTEAD"""
     sen = [i for i in sen if i != "^"]
     side = 'left'
     usable = []
@@ -48,7 +57,7 @@ def find_rule(sen: utils.Sentence) -> tp.Union[list[str], None]:
     if usable == []:
         return None
     else:
-        return usable
+        return tuple(usable)
 
 
 
@@ -60,7 +69,7 @@ def solve(delegate: callable, branch: list[utils.Sentence]) -> tuple[tp.Union[st
     if found_rules is None:
         return None, None
 
-    found_rules.sort(key=lambda x: RULES.index(" ".join(x[:2])))
+    found_rules = sorted(found_rules, key=lambda x: RULES.index(" ".join(x[:2])))
     
     out = None
     i = 0
@@ -94,5 +103,29 @@ def solve(delegate: callable, branch: list[utils.Sentence]) -> tuple[tp.Union[st
         return None, None
 
 
+def propose(branch: list[utils.Sentence]) -> tuple[utils.Move]:
+    found_rules = find_rule(branch[-1])
+    if found_rules is None:
+        return ()
+    return _propose(found_rules)
+
+
+@lru_cache(2**12)
+def _propose(found_rules: tuple[tuple[str]]) -> tuple[utils.Move]:
+    """Turns the usable rules into moves in the order of RULES (invertible rules come first); USE `propose` INSTEAD"""
+    moves = []
+    for rule in sorted(found_rules, key=lambda x: RULES.index(" ".join(x[:2]))):
+        name = " ".join(rule[:2])
+        invertible = name not in NONINVERTIBLE
+        if rule[0]=='left':
+            moves.append(utils.Move(name, {'partID': rule[2]}, invertible))
+        elif rule[1]=='or':
+            moves.append(utils.Move(name, {'conn_side': 'l'}, invertible))
+            moves.append(utils.Move(name, {'conn_side': 'r'}, invertible))
+        else:
+            moves.append(utils.Move(name, {}, invertible))
+    return tuple(moves)
+
+
 def compatible() -> tuple[str]:
     return ('int_seqcal_scottish', 'int_seqcal_swiss')
\ No newline at end of file
@@ -1,6 +1,11 @@
-from collections import namedtuple
+from __future__ import annotations
+
+from collections import namedtuple, Counter
+from functools import lru_cache
 import typing as tp
+import weakref
 
+# Sentences are shared between the proof tree and the rules, so they are never modified in place
 Sentence = tp.NewType("Sentence", list[str])
 
 Rule = namedtuple('Rule', ('symbolic', 'docs', 'func', 'context', 'reusable'))
@@ -13,6 +18,18 @@ class FormalSystemError(Exception):
     pass
 
 
+class TokenTypes(dict):
+    """Caches the types of tokens, so that every `type_lexem` string is split only once"""
+
+    def __missing__(self, token: str) -> str:
+        toktype = token.split('_')[0]
+        self[token] = toktype
+        return toktype
+
+
+token_types = TokenTypes()
+
+
 # Rule decorators
 
 def Creator(func):
@@ -25,7 +42,7 @@ def Creator(func):
 
 
 def Modifier(func):
-    """Will only iterate iterate through existing tuple structures"""
+    """Will only iterate iterate through existing tuple structures; the function gets the sentence itself, so it can't modify it"""
     def wrapper(statement, *args, **kwargs):
         if isinstance(statement, tuple):
             calculated = tuple([wrapper(i, *args, **kwargs)
@@ -37,11 +54,429 @@ def Modifier(func):
         elif statement is None:
             return None
         else:
-            return func(statement[:], *args, **kwargs)
+            return func(statement, *args, **kwargs)
 
     return wrapper
 
 
+# Formula DAG
+
+class Formula(object):
+    """A node of the formula DAG; use `formula` to get one.
+    Nodes are hash-consed (equal token sequences share one node while it's alive), so the bracket structure,
+    subformulas and the reduced form are computed once for every distinct (sub)formula.
+    Subformulas read their bracket index from the formula they were split from.
+    Sentences (token lists) can always be derived from `tokens`.
+    """
+    __slots__ = ('tokens', 'size', 'hash', 'match', 'depth', 'level', 'balanced', 'opening', 'top', '_reduced', '_parts', '__weakref__')
+
+    def __init__(self, tokens: tuple[str], parent: Formula = None, start: int = 0):
+        """
+        :param tokens: Tokens of the formula
+        :type tokens: tuple[str]
+        :param parent: Balanced formula containing the tokens at `start`, with every bracket of the tokens matched among them;
+            the bracket index is then taken from it
+        :type parent: Formula, optional
+        :param start: Index of the first token in the parent
+        :type start: int
+        """
+        self.tokens = tokens
+        self.size = len(tokens)
+        self.hash = hash(tokens)
+        self._reduced = None
+        self._parts = dict()
+        if parent is not None:
+            self._index_from(parent, start)
+            return
+
+        # Bracket index
+        self.match = [-1]*self.size  # Index of the matching bracket (-1 for other tokens and unmatched brackets)
+        self.depth = [0]*self.size   # Amount of brackets opened around the token
+        top = []                     # Tokens outside of brackets
+        opened = []
+        lvl = 0
+        for i, s in enumerate(tokens):
+            if s == '(':
+                self.depth[i] = lvl
+                opened.append(i)
+                lvl += 1
+            elif s == ')':
+                lvl -= 1
+                self.depth[i] = lvl
+                if opened:
+                    j = opened.pop()
+                    self.match[i] = j
+                    self.match[j] = i
+            else:
+                self.depth[i] = lvl
+                if lvl == 0:
+                    top.append((i, token_types[s]))
+        self.top = tuple(top)
+        self.level = lvl
+        self.balanced = lvl == 0 and not opened
+        self.opening = tokens.count('(')
+
+    def _index_from(self, parent: Formula, start: int) -> None:
+        """Shifts the bracket index of the parent to the tokens; USE `Formula(tokens, parent, start)` INSTEAD"""
+        end = start+self.size
+        base = parent.depth[start] if self.size else 0
+        self.match = [j-start if j >= 0 else -1 for j in parent.match[start:end]]
+        self.depth = [d-base for d in parent.depth[start:end]]
+        if base == 0:
+            self.top = tuple((i-start, toktype) for i, toktype in parent.top if start <= i < end)
+        else:
+            self.top = tuple((i, token_types[s]) for i, (s, d) in enumerate(zip(self.tokens, self.depth))
+                             if d == 0 and s != '(' and s != ')')
+        self.level = 0
+        self.balanced = True
+        self.opening = self.tokens.count('(')
+
+    def __hash__(self) -> int:
+        return self.hash
+
+    def __eq__(self, other: object) -> bool:
+        if self is other:
+            return True
+        if not isinstance(other, Formula):
+            return NotImplemented
+        return self.hash == other.hash and self.tokens == other.tokens
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __repr__(self) -> str:
+        return f"Formula({' '.join(self.tokens)})"
+
+    def main(self, precedence: dict[str, int]) -> tp.Union[tuple[int, str], None]:
+        """Returns the index and type of the main connective: the last of the connectives with the lowest precedence outside of brackets
+
+        :param precedence: Precedence of the connectives (lower binds weaker)
+        :type precedence: dict[str, int]
+        :return: Index and type of the connective or None if there is no connective outside of brackets
+        :rtype: tp.Union[tuple[int, str], None]
+        """
+        found = None
+        lowest = None
+        for i, toktype in self.top:
+            if toktype in precedence:
+                if lowest is None or precedence[toktype] < lowest:
+                    lowest = precedence[toktype]
+                    found = (i, toktype)
+                elif precedence[toktype] == lowest:
+                    found = (i, toktype)
+        return found
+
+    def split(self, index: int) -> tuple[Formula, Formula]:
+        """Returns the subformulas on both sides of the token with the given index"""
+        parts = self._parts.get(index, None)
+        if parts is None:
+            if self.balanced and self.depth[index] == 0 and self.match[index] == -1:
+                # No bracket pair contains the token, so both sides can share the index
+                parts = (_intern(self.tokens[:index], self, 0), _intern(self.tokens[index+1:], self, index+1))
+            else:
+                parts = (formula(self.tokens[:index]), formula(self.tokens[index+1:]))
+            self._parts[index] = parts
+        return parts
+
+    def reduced(self) -> Formula:
+        """Returns the formula with reduced brackets (see `reduce_brackets`)"""
+        if self._reduced is None:
+            if self.balanced:
+                # Strip only the brackets matching each other
+                start, end = 0, self.size-1
+                while start < end and self.match[start] == end:
+                    start += 1
+                    end -= 1
+                self._reduced = self if start == 0 else _intern(self.tokens[start:end+1], self, start)
+            else:
+                reduced = _reduce_brackets(self.tokens)
+                self._reduced = self if reduced == self.tokens else formula(reduced)
+        return self._reduced
+
+
+# Nodes are shared through a weak dict, so a node is never duplicated while something uses it.
+# The LRU cache of `formula` keeps the recently used nodes alive.
+_formulas = weakref.WeakValueDictionary()
+
+
+@lru_cache(2**16)
+def formula(tokens: tuple[str]) -> Formula:
+    """Returns the DAG node for the tokens; equal tuples of tokens get the same node"""
+    return _intern(tokens)
+
+
+def _intern(tokens: tuple[str], parent: Formula = None, start: int = 0) -> Formula:
+    """Returns the node of the tokens, makes it if there is none; USE `formula` INSTEAD"""
+    node = _formulas.get(tokens, None)
+    if node is None:
+        node = Formula(tokens, parent, start)
+        _formulas[tokens] = node
+    return node
+
+
+def parse(statement: Sentence, precedence: dict[str, int]) -> Formula:
+    """Builds the formula DAG of the sentence by splitting every subformula on its main connective.
+    Prefixes (ex. negation) are split from the rest of the subformula.
+
+    :param statement: Parsed sentence
+    :type statement: Sentence
+    :param precedence: Precedence of the connectives used in the formal system
+    :type precedence: dict[str, int]
+    :return: Root node of the DAG
+    :rtype: Formula
+    """
+    root = formula(tuple(statement))
+    stack = [root]
+    while stack:
+        node = stack.pop().reduced()
+        if (main := node.main(precedence)) is not None:
+            stack.extend(node.split(main[0]))
+        elif node.size > 1 and node.tokens[0] != '(':
+            stack.append(node.split(0)[1])
+    return root
+
+
+# Sequents
+
+class Sequent(object):
+    """A sequent `A1; ...; An => B` split into the antecedent, the succedent and the stoup position; use `sequent` to read one.
+    The antecedent is a multiset, but its formulas keep their order, so they can be adressed by their number.
+    Sequents are immutable: every modification returns a new sequent sharing the unchanged formulas.
+    """
+    __slots__ = ('antecedent', 'succedent', 'stoup', '_counts')
+
+    SEPARATOR = 'sep_;'
+    TURNSTILE = 'turnstile_=>'
+    STOUP = '^'
+
+    def __init__(self, antecedent: tuple[tuple[str]] = (), succedent: tuple[str] = (), stoup: tp.Union[int, None] = None):
+        """
+        :param antecedent: Formulas on the left side of the turnstile
+        :type antecedent: tuple[tuple[str]]
+        :param succedent: Formula on the right side of the turnstile
+        :type succedent: tuple[str]
+        :param stoup: Number of the prioritized formula in the antecedent, defaults to None
+        :type stoup: tp.Union[int, None], optional
+        """
+        self.antecedent = antecedent
+        self.succedent = succedent
+        self.stoup = stoup
+        self._counts = None
+
+    def __len__(self) -> int:
+        return len(self.antecedent)
+
+    def __getitem__(self, index: int) -> Sentence:
+        """Returns the n-th formula of the antecedent (starting from 0) as a sentence"""
+        if not 0 <= index < len(self.antecedent):
+            raise IndexError("sent_num is too big")
+        return list(self.antecedent[index])
+
+    def __contains__(self, statement: Sentence) -> bool:
+        return self.count(statement) > 0
+
+    def __repr__(self) -> str:
+        return f"Sequent({' '.join(self.tokens())})"
+
+    def count(self, statement: Sentence) -> int:
+        """Returns the multiplicity of the formula in the antecedent"""
+        if self._counts is None:
+            self._counts = Counter(self.antecedent)
+        return self._counts[tuple(statement)]
+
+    def add(self, *statements: Sentence) -> Sequent:
+        """Returns the sequent with the formulas added to the front of the antecedent"""
+        if self.stoup is None:
+            stoup = None
+        else:
+            stoup = self.stoup+len(statements)
+        return Sequent(tuple(tuple(i) for i in statements) + self.antecedent, self.succedent, stoup)
+
+    def remove(self, index: int) -> Sequent:
+        """Returns the sequent without the n-th formula of the antecedent"""
+        if self.stoup is None or self.stoup == index:
+            stoup = None
+        else:
+            stoup = self.stoup - (self.stoup > index)
+        return Sequent(self.antecedent[:index] + self.antecedent[index+1:], self.succedent, stoup)
+
+    def conclude(self, statement: Sentence) -> Sequent:
+        """Returns the sequent with the given succedent"""
+        return Sequent(self.antecedent, tuple(statement), self.stoup)
+
+    def prioritize(self, index: tp.Union[int, None]) -> Sequent:
+        """Returns the sequent with the stoup on the n-th formula of the antecedent (None removes the stoup)"""
+        return Sequent(self.antecedent, self.succedent, index)
+
+    def tokens(self) -> Sentence:
+        """Writes the sequent as a sentence"""
+        sentence = []
+        for i, statement in enumerate(self.antecedent):
+            if i:
+                sentence.append(self.SEPARATOR)
+            if i == self.stoup:
+                sentence.append(self.STOUP)
+            sentence.extend(statement)
+        sentence.append(self.TURNSTILE)
+        sentence.extend(self.succedent)
+        return sentence
+
+
+@lru_cache(2**12)
+def sequent(tokens: tuple[str]) -> Sequent:
+    """Reads the sequent from a sentence; both sides are bracket-reduced and the antecedent is split on separators.
+    Equal sentences share one sequent.
+
+    :param tokens: Sentence with a turnstile outside of brackets
+    :type tokens: tuple[str]
+    :return: The sequent
+    :rtype: Sequent
+    """
+    turnstiles = [i for i, toktype in formula(tokens).top if toktype == 'turnstile']
+    if turnstiles:
+        left = formula(tokens[:turnstiles[-1]]).reduced().tokens
+        right = formula(tokens[turnstiles[-1]+1:]).reduced().tokens
+    else:
+        left, right = (), formula(tokens).reduced().tokens
+
+    antecedent = []
+    part = []
+    stoup = None
+    for s in left:
+        if token_types[s] == 'sep':
+            antecedent.append(tuple(part))
+            part = []
+        elif s == Sequent.STOUP:
+            if stoup is None:
+                stoup = len(antecedent)
+        else:
+            part.append(s)
+    if left:
+        antecedent.append(tuple(part))
+    return Sequent(tuple(antecedent), right, stoup)
+
+
+# Canonical forms
+
+def canonical(statement: Sentence, precedence: dict[str, int]) -> tuple[str]:
+    """Returns the canonical form of a formula, in which only compound subformulas are bracketed,
+    so formulas differing only by redundant brackets get the same form.
+    Forms are interned in the formula DAG: equal forms are usually the same tuple, which makes comparing them an identity check.
+
+    :param statement: The formula
+    :type statement: Sentence
+    :param precedence: Precedence of the connectives used in the formal system
+    :type precedence: dict[str, int]
+    :return: The canonical form
+    :rtype: tuple[str]
+    """
+    return _canonical(tuple(statement), tuple(precedence.items()))
+
+
+@lru_cache(2**16)
+def _canonical(tokens: tuple[str], precedence: tuple[tuple[str, int]]) -> tuple[str]:
+    """Canonical form of a formula; USE `canonical` INSTEAD"""
+    node = formula(tokens).reduced()
+    if (main := node.main(dict(precedence))) is not None:
+        left, right = node.split(main[0])
+        form = _bracketed(left.tokens, precedence) + (node.tokens[main[0]],) + _bracketed(right.tokens, precedence)
+    elif node.size > 1 and node.tokens[0] != '(':
+        form = node.tokens[:1] + _bracketed(node.tokens[1:], precedence)
+    else:
+        form = node.tokens
+    return formula(form).tokens
+
+
+def _bracketed(tokens: tuple[str], precedence: tuple[tuple[str, int]]) -> tuple[str]:
+    form = _canonical(tokens, precedence)
+    return form if len(form) < 2 else ('(',) + form + (')',)
+
+
+def canonical_sequent(seq: Sequent, precedence: dict[str, int]) -> tuple[str]:
+    """Returns the canonical form of a sequent as a sentence: its formulas are canonical
+    and the antecedent is sorted, so sequents differing only by the order of the antecedent get the same form.
+    The prioritized formula keeps the stoup.
+
+    :param seq: The sequent
+    :type seq: Sequent
+    :param precedence: Precedence of the connectives used in the formal system
+    :type precedence: dict[str, int]
+    :return: The canonical form
+    :rtype: tuple[str]
+    """
+    return _canonical_sequent(seq.antecedent, seq.succedent, seq.stoup, tuple(precedence.items()))
+
+
+@lru_cache(2**12)
+def _canonical_sequent(antecedent: tuple[tuple[str]], succedent: tuple[str], stoup: tp.Union[int, None],
+                       precedence: tuple[tuple[str, int]]) -> tuple[str]:
+    """Canonical form of a sequent; USE `canonical_sequent` INSTEAD"""
+    forms = sorted(((Sequent.STOUP,) if i == stoup else ()) + _canonical(f, precedence) for i, f in enumerate(antecedent))
+    return formula(tuple(Sequent(tuple(forms), _canonical(succedent, precedence)).tokens())).tokens
+
+
+def subformulas(seq: Sequent, precedence: dict[str, int]) -> frozenset[tuple[str]]:
+    """Returns the canonical forms of the formulas of a sequent and of all their subformulas
+
+    :param seq: The sequent
+    :type seq: Sequent
+    :param precedence: Precedence of the connectives used in the formal system
+    :type precedence: dict[str, int]
+    :return: The canonical forms
+    :rtype: frozenset[tuple[str]]
+    """
+    return _sequent_subformulas(seq.antecedent, seq.succedent, tuple(precedence.items()))
+
+
+@lru_cache(2**12)
+def _sequent_subformulas(antecedent: tuple[tuple[str]], succedent: tuple[str],
+                         precedence: tuple[tuple[str, int]]) -> frozenset[tuple[str]]:
+    """Subformulas of a sequent; USE `subformulas` INSTEAD"""
+    found = frozenset()
+    for f in antecedent + ((succedent,) if succedent else ()):
+        found |= _subformulas(_canonical(f, precedence), precedence)
+    return found
+
+
+@lru_cache(2**16)
+def _subformulas(form: tuple[str], precedence: tuple[tuple[str, int]]) -> frozenset[tuple[str]]:
+    """Subformulas of a canonical formula; USE `subformulas` INSTEAD"""
+    node = formula(form)
+    found = frozenset((form,))
+    if (main := node.main(dict(precedence))) is not None:
+        for part in node.split(main[0]):
+            found |= _subformulas(_canonical(part.tokens, precedence), precedence)
+    elif node.size > 1 and node.tokens[0] != '(':
+        found |= _subformulas(_canonical(node.tokens[1:], precedence), precedence)
+    return found
+
+
+def readable_used(used: tp.Iterable[tuple[str]], seq: Sequent, precedence: dict[str, int]) -> frozenset[tuple[str]]:
+    """Returns the part of a used set which loop detection can read in the branches grown from the sequent.
+    The rules only build sequents of subformulas of the sequent, so a used formula or sequent
+    containing anything else can't be looked up there.
+
+    :param used: Used formulas and sequents
+    :type used: tp.Iterable[tuple[str]]
+    :param seq: The sequent
+    :type seq: Sequent
+    :param precedence: Precedence of the connectives used in the formal system
+    :type precedence: dict[str, int]
+    :return: The used formulas and sequents built of subformulas of the sequent
+    :rtype: frozenset[tuple[str]]
+    """
+    forms = subformulas(seq, precedence)
+    precedence = tuple(precedence.items())
+    return frozenset(i for i in used if _used_forms(i, precedence) <= forms)
+
+
+@lru_cache(2**12)
+def _used_forms(entry: tuple[str], precedence: tuple[tuple[str, int]]) -> frozenset[tuple[str]]:
+    """Canonical forms of the formulas of a used formula or sequent; USE `readable_used` INSTEAD"""
+    seq = sequent(entry)
+    return frozenset(_canonical(f, precedence) for f in seq.antecedent + ((seq.succedent,) if seq.succedent else ()))
+
+
 # Formating and cleaning
 
 @Modifier
@@ -52,7 +487,13 @@ def reduce_brackets(statement: Sentence) -> Sentence:
     if statement == []:
         return []
 
-    reduced = statement[:]
+    return list(formula(tuple(statement)).reduced().tokens)
+
+
+def _reduce_brackets(reduced: tuple[str]) -> tuple[str]:
+    """Bracket reduction used by `Formula.reduced`; USE `reduce_brackets` INSTEAD"""
+    if not reduced:
+        return reduced
 
     # Deleting brackets
     while reduced[0] == '(' and reduced[-1] == ')':
@@ -74,12 +515,12 @@ def reduce_brackets(statement: Sentence) -> Sentence:
             min_left = delta_left
 
     right = opened_left-opened_right-min_left
-    return -min_left*["("] + reduced + right*[")"]
+    return -min_left*("(",) + reduced + right*(")",)
 
 
 @Modifier
 def quick_bracket_check(reduced: Sentence) -> bool:
-    return reduced.count('(') == reduced.count(')')
+    return formula(tuple(reduced)).level == 0
 
 
 def cleaned(func):
@@ -126,37 +567,22 @@ def strip_around(statement: Sentence, border_type: str, split: bool, precedence:
     """
     if not statement:
         return None
-    lvl = 0
-    middle = None
-    precedence_keys = precedence.keys()
-    border_precedence = precedence.get(border_type, 0)
-    for i, s in enumerate(statement):
-        if s == '(':
-            lvl += 1
-        elif s == ')':
-            lvl -= 1
-        elif lvl == 0 and (toktype := s.split('_')[0]) in precedence_keys:
-            if border_precedence > precedence[toktype]:
-                return None
-            elif border_precedence == precedence[toktype]:
-                if toktype == border_type:
-                    middle = i
-                else:
-                    middle = None
-
-    if middle is None:
+    node = formula(tuple(statement))
+    main = node.main(precedence)
+    if main is None or main[1] != border_type:
         return None
-    elif split:
-        return ((statement[:middle],), (statement[middle+1:],))
+
+    left, right = node.split(main[0])
+    if split:
+        return ((list(left.tokens),), (list(right.tokens),))
     else:
-        return ((statement[:middle], statement[middle+1:]),)
+        return ((list(left.tokens), list(right.tokens)),)
 
 
 # Modifiers
 
 @cleaned
 @Modifier
-# TODO: Needs optimalization
 def reduce_prefix(statement: Sentence, prefix_type: str, prefixes: tuple[str]) -> Sentence:
     """ Deletes a prefix if it closes the rest of the sentence
 
@@ -173,19 +599,19 @@ def reduce_prefix(statement: Sentence, prefix_type: str, prefixes: tuple[str]) -
 
     assert isinstance(statement, list)
 
-    if statement[0].startswith(prefix_type):
+    if token_types[statement[0]] == prefix_type:
         start = 1
         while any((statement[start].startswith(i) for i in prefixes)):
             start += 1
-        statement_no_prefix = statement[start:]
+        no_prefix = formula(tuple(statement[start:]))
 
-        if len(statement_no_prefix) == 1:
+        if no_prefix.size == 1:
             return reduce_brackets(statement[1:])
         else:
-            reduction = reduce_brackets(statement_no_prefix)
-            if reduction.count("(") == statement_no_prefix.count("("):
+            reduction = no_prefix.reduced()
+            if reduction.opening == no_prefix.opening:
                 return None
-            elif reduction.count("(") < statement_no_prefix.count("("):
+            elif reduction.opening < no_prefix.opening:
                 return reduce_brackets(statement[1:])
             else:
                 raise Exception(
@@ -234,7 +660,7 @@ def on_part(sentence: Sentence, split_type: str, sent_num: int, func: callable):
 
     split_count = 0
     for start_split, s in enumerate(sentence):
-        if s.startswith(f"{split_type}_"):
+        if token_types[s] == split_type:
             split_count += 1
         if split_count == sent_num:
             break
@@ -243,7 +669,7 @@ def on_part(sentence: Sentence, split_type: str, sent_num: int, func: callable):
         return None
 
     end_split = start_split+1
-    while end_split<len(sentence) and not sentence[end_split].startswith(f"{split_type}_"):
+    while end_split<len(sentence) and token_types[sentence[end_split]] != split_type:
         end_split += 1
 
     if len(sentence)-1 <= end_split:
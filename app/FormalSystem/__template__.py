@@ -11,6 +11,11 @@ def prepare_for_proving(statement: utils.Sentence) -> utils.Sentence:
 def check_contradict(branch: list[utils.Sentence], used: set[tuple[str]]) -> tp.Union[None, tuple[int, str, str]]:
     pass
 
+def get_literal(sentence: utils.Sentence) -> tp.Union[tuple[tp.Hashable, tp.Hashable], None]:
+    """Returns the normalized form of the sentence and the normalized form of a sentence contradicting it.
+    The engine indexes branches with these and closes them with hash lookups; return None to use check_contradict on the whole branch"""
+    pass
+
 def check_syntax(tokenized_statement: utils.Sentence) -> tp.Union[str, None]:
     """Should return string description of the problem in syntax"""
     pass
@@ -26,6 +31,11 @@ def get_needed_context(rule_name: str) -> tuple[utils.ContextDef]:
 def get_used_types() -> tuple[str]:
     pass
 
+def state_key(branch: list[utils.Sentence], used: set[tuple[str]]) -> tp.Hashable:
+    """Returns the key under which the proof search remembers the branch. Branches with equal keys
+    must be closable by the same rules (up to the order of the formulas), so the key should hold only what the rules can read"""
+    pass
+
 # TODO: Poprawić oznaczenie zwracanego typu
 def use_rule(name: str, branch: list[utils.Sentence], used: set[utils.Sentence], context: dict[str, tp.Any], auto: bool) -> tuple[tp.Union[tuple[tuple[utils.Sentence]], None], int]:
     """Uses a rule of the given name on the provided branch.
@@ -16,133 +16,64 @@ PRECEDENCE = {
 
 debrac = utils.reduce_brackets
 
-def is_sequent(l, s) -> bool:
-    buffor = []
-    for i in l:
-        if i.startswith('sep_'):
-            if buffor == s:
-                return True
-            else:
-                buffor = []
-        else:
-            buffor.append(i)
-    if buffor == s:
-        return True
-    return False
-
-
-def get_part(sentence: utils.Sentence, split_type: str, sent_num: int):
-    """
-    Returns n-th part of the sentence (split_types is the type of separator)
-
-    Changes the sentence!!
-    """
-    split_count = 0
-    start_split = 0
-    for s in sentence:
-        if s.startswith(f"{split_type}_"):
-            split_count += 1
-        if split_count == sent_num:
-            break
-        start_split += 1
-
-    if len(sentence) <= start_split or split_count<sent_num:
-        raise IndexError("sent_num is too big")
-
-    part = []
-    if split_count>0:
-        sentence.pop(start_split)
-    
-    while start_split<len(sentence) and not sentence[start_split].startswith(f"{split_type}_"):
-        part.append(sentence.pop(start_split))
-
-    if len(sentence)>0 and split_count == 0:
-        sentence.pop(start_split)
-    return part
-
-
-def merge_tupstruct(left: tuple[tuple[str]], right: tuple[tuple[str]], glue: str):
-    """
-    Merges two tuple structures into one
-    """
-    if isinstance(left, tuple) and isinstance(left, tuple):
-        assert len(left) == len(right), "Tuples not of equal length"
-        end = []
-        for l, r in zip(left, right):
-            end.append(merge_tupstruct(l, r, glue))
-        return tuple(end)
-    elif isinstance(left, list) and isinstance(left, list):
-        return left + [glue] + right
-    else:
-        # Bug reporting
-        l_correct = (isinstance(left, list) or isinstance(left, tuple))
-        r_correct = (isinstance(right, list) or isinstance(right, tuple))
-        if l_correct and r_correct:
-            raise AssertionError("Tuples not of equal depth")
-        else:
-            raise AssertionError((l_correct*"left")+(l_correct*r_correct *' and ')+(r_correct*"right") + "tuple is messed up")
 
+def canon(statement: utils.Sentence) -> tuple[str]:
+    """Canonical form of a formula; loop detection stores and looks up formulas in this form"""
+    return utils.canonical(statement, PRECEDENCE)
 
-def sep(part: utils.Sentence = None) -> list[str]:
-    if part is None or (len(part)>0 and not part[0].startswith('sep_;')):
-        return ['sep_;']
-    else:
-        return []
 
+def in_antecedent(statement: utils.Sentence, seq: utils.Sequent) -> bool:
+    """Checks if the formula is in the antecedent, ignoring redundant brackets"""
+    form = canon(statement)
+    return any(canon(i) == form for i in seq.antecedent)
 
-def stoup_find(s: utils.Sentence) -> tp.Union[int, None]:
-    count = 0
-    for seq in s:
-        if seq.startswith(f"sep_"):
-            count += 1
-        elif seq == "^":
-            return count
 
+def sides(statement: utils.Sentence, connective: str) -> tp.Union[tuple[utils.Sentence, utils.Sentence], None]:
+    """Returns both sides of the main connective for loop detection, None if the formula's main connective is of another type"""
+    split = utils.strip_around(statement, connective, False, PRECEDENCE)
+    if split is None or split[0] is None:
+        return None
+    return split[0]
 
-def stoup_add(tree: tuple[tuple[utils.Sentence]], rule_name: str, new: bool = False) -> tuple[tuple[utils.Sentence]]:
+def stoup_add(tree: tuple[tuple[utils.Sequent]], rule_name: str, new: bool = False) -> tuple[tuple[utils.Sequent]]:
     if rule_name.endswith('left_imp'):
-        return (tree[0], (['^']+tree[1][0],))
+        return (tree[0], (tree[1][0].prioritize(0),))
     elif rule_name.endswith('left_or'):
         return tree
     elif rule_name.endswith('left_and'):
         if new:
             return tree
         else:
-            ntree = ["^"]+tree[0][0]
-            for i, seq in enumerate(ntree[0][0]):
-                if seq.startswith("sep_"):
-                    break
-            ntree.insert(i+1, "^")
-            return ((ntree,),)
+            return ((tree[0][0].prioritize(0),),)
         
 
 
 def stoupManager(func):
-    def wrapped(auto: bool, left, right, num, *args):
+    def wrapped(auto: bool, seq: utils.Sequent, num, *args):
         if not auto:
-            return func(left, right, num, *args)
-        if (priority := stoup_find(left)) is not None:
+            return func(seq, num, *args)
+        if (priority := seq.stoup) is not None:
             if priority == num-1:
-                res_left, res_right = func([i for i in left if i != "^"], right, num, *args)
-                if res_left is not None:
-                    return stoup_add(res_left, func.__name__), res_right
+                res = func(seq.prioritize(None), num, *args)
+                if res is not None:
+                    return stoup_add(res, func.__name__)
             else:
                 raise utils.FormalSystemError("There is a sequent that is prioritized")
         else:
-            res_left, res_right = func([i for i in left if i != "^"], right, num, *args)
-            if res_left is not None:
-                return stoup_add(res_left, func.__name__, True), res_right
+            res = func(seq, num, *args)
+            if res is not None:
+                return stoup_add(res, func.__name__, True)
     return wrapped
 
 
 def stoupBlock(func):
-    def wrapped(auto: bool, left, *args):
+    def wrapped(auto: bool, seq: utils.Sequent, *args):
         if not auto:
-            return func(left, *args)
-        if stoup_find(left) is not None:
+            return func(seq, *args)
+        if seq.stoup is not None:
             raise utils.FormalSystemError("Rule can't be performed on prioritized sequents")
         else:
-            return func(left, *args)
+            return func(seq, *args)
     return wrapped
 
 
@@ -150,70 +81,67 @@ def stoupBlock(func):
 
 
 @stoupManager
-def rule_left_and(left: utils.Sentence, right: utils.Sentence, num: int):
+def rule_left_and(seq: utils.Sequent, num: int):
     """ A,B,... => ...
         ______________
         A&B,... => ...
     """
     try:
-        conj = get_part(left, 'sep', num-1)
+        conj = seq[num-1]
     except IndexError:
-        return (None, None)
+        return None
     
     split = utils.strip_around(conj, 'and', False, PRECEDENCE)
     if split is None or split[0] is None:
-        return (None, None)
+        return None
     split = split[0]
-    return ((debrac(split[0])+sep()+debrac(split[1])+sep(left)+left,),), ((right,),)
+    return ((seq.remove(num-1).add(debrac(split[0]), debrac(split[1])),),)
 
 
 @stoupBlock
-def rule_right_and(left: utils.Sentence, right: utils.Sentence):
+def rule_right_and(seq: utils.Sequent):
     """ ... => A      ... => B
         __________________________
         ... => A&B
     """
-    conj = get_part(right, 'sep', 0)
-    if conj is None:
-        return (None, None)
-
-    split = utils.strip_around(conj, 'and', False, PRECEDENCE)
+    split = utils.strip_around(list(seq.succedent), 'and', False, PRECEDENCE)
     if split is None or split[0] is None:
-        return (None, None)
+        return None
     split = split[0]
-    return ((left,),(left,),), ((debrac(split[0]),),(debrac(split[1]),),)
+    return ((seq.conclude(debrac(split[0])),),(seq.conclude(debrac(split[1])),),)
 
 
 @stoupManager
-def rule_left_or(left: utils.Sentence, right: utils.Sentence, num: int):
+def rule_left_or(seq: utils.Sequent, num: int):
     """ A,... => ...  B,... => ...
         __________________________
         AvB,... => ...
     """
     try:
-        conj = get_part(left, 'sep', num-1)
+        conj = seq[num-1]
     except IndexError:
-        return (None, None)
+        return None
     
     split = utils.strip_around(conj, 'or', False, PRECEDENCE)
     if split is None or split[0] is None:
-        return (None, None)
+        return None
     split = split[0]
-    return ((debrac(split[0])+sep(left)+left,),(debrac(split[1])+sep(left)+left,),), ((right,),(right,),)
+    rest = seq.remove(num-1)
+    return ((rest.add(debrac(split[0])),),(rest.add(debrac(split[1])),),)
 
 
 @stoupBlock
-def rule_right_or(left: utils.Sentence, right: utils.Sentence, side: str, used: list[tuple[str]]):
+def rule_right_or(seq: utils.Sequent, side: str, used: list[tuple[str]]):
     """ ... => (A,B)[side]
         ______________
         ... => AvB
     """
-    if not right or side not in ('l', 'r','find'):
-        return (None, None)
+    if not seq.succedent or side not in ('l', 'r','find'):
+        return None
     
-    split = utils.strip_around(right, 'or', False, PRECEDENCE)
+    split = utils.strip_around(list(seq.succedent), 'or', False, PRECEDENCE)
     if split is None or split[0] is None:
-        return (None, None)
+        return None
     left_split, right_split = split[0]
     
 
@@ -222,83 +150,78 @@ def rule_right_or(left: utils.Sentence, right: utils.Sentence, side: str, used:
     elif side=='r':
         ret = right_split
     else:
-        if is_sequent(left, left_split):
+        if left_split in seq:
             ret = left_split
-        elif is_sequent(left, right_split):
+        elif right_split in seq:
             ret = right_split
         else:
             # Default case
             ret = max(split[0], key=len)
 
-    if ret in used:
+    if canon(ret) in used:
         raise utils.FormalSystemError("Operation prohibited by loop detection algorithm")
     else:
-        get_part(right, 'sep', 0)
-        return ((left,),), ((debrac(ret),),)
+        return ((seq.conclude(debrac(ret)),),)
 
 
 @stoupManager
-def rule_left_imp(left: utils.Sentence, right: utils.Sentence, num: int):
+def rule_left_imp(seq: utils.Sequent, num: int):
     """ A -> B, ... => A    B,... => ...
         ________________________________
         A -> B,... => ...
     """
     try:
-        conj = get_part(left, 'sep', num-1)
+        conj = seq[num-1]
     except IndexError:
-        return (None, None)
+        return None
     
     split = utils.strip_around(conj, 'imp', False, PRECEDENCE)
     if split is None or split[0] is None:
-        return (None, None)
+        return None
     split = split[0]
-    return ((conj+sep(left)+left,),(debrac(split[1])+sep(left)+left,),), ((debrac(split[0]),),(right,),)
+    rest = seq.remove(num-1)
+    return ((rest.add(conj).conclude(debrac(split[0])),),(rest.add(debrac(split[1])),),)
 
 
 @stoupBlock
-def rule_right_imp(left: utils.Sentence, right: utils.Sentence):
+def rule_right_imp(seq: utils.Sequent):
     """ ..., A => B
         ______________
         ... => A -> B
     """
-    try:
-        conj = get_part(right, 'sep', 0)
-    except IndexError:
-        return (None, None)
-    
-    split = utils.strip_around(conj, 'imp', False, PRECEDENCE)
+    split = utils.strip_around(list(seq.succedent), 'imp', False, PRECEDENCE)
     if split is None or split[0] is None:
-        return (None, None)
+        return None
     split = split[0]
-    return ((debrac(split[0])+sep(left)+left,),), ((debrac(split[1]),),)
+    return ((seq.add(debrac(split[0])).conclude(debrac(split[1])),),)
 
 
 @stoupBlock
-def rule_left_strong(left: utils.Sentence, right: utils.Sentence, num: int):
+def rule_left_strong(seq: utils.Sequent, num: int):
     """ ..., A, A => ...
         ________________
         ..., A => ...
     """
     try:
-        conj = get_part(left, 'sep', num-1)
+        conj = seq[num-1]
     except IndexError:
-        return (None, None)
+        return None
     
-    return ((conj+sep()+conj+sep(left)+left,),), ((right,),)
+    return ((seq.remove(num-1).add(conj, conj),),)
 
 
 @stoupBlock
-def rule_left_weak(left: utils.Sentence, right: utils.Sentence, num: int):
+def rule_left_weak(seq: utils.Sequent, num: int):
     """ ... => ...
         ______________
         ..., A => ...
     """
     try:
-        conj = get_part(left, 'sep', num-1)
+        seq[num-1]
     except IndexError:
-        return (None, None)
+        return None
     
-    return ((left,),), ((right,),)
+    return ((seq.remove(num-1),),)
 
 
 RULES = {
@@ -397,40 +320,42 @@ RULES = {
 def prepare_for_proving(statement: utils.Sentence) -> utils.Sentence:
     statement = utils.reduce_brackets(statement)
     if not 'turnstile_=>' in statement:
-        return ['turnstile_=>']+statement
-    else:
-        return statement
+        statement = ['turnstile_=>']+statement
+    utils.parse(statement, PRECEDENCE)
+    return statement
 
 
 def check_contradict(branch: list[utils.Sentence], used: set[tuple[str]]) -> tp.Union[None, tuple[int, str, str]]:
-    left, right = utils.strip_around(branch[-1], "turnstile", False, PRECEDENCE)[0]
-    left = [i for i in left if i != "^"]
-    seps = sum((i.startswith('sep_') for i in left), 1)
+    seq = utils.sequent(tuple(branch[-1]))
 
     # Right part verification
-    empty = len(right)==1
+    empty = len(seq.succedent)==1
 
     # Left part verification
-    if len(left)==0:
+    if len(seq)==0:
         return None
-    for i in range(0, seps):
-        f = get_part(left[:], 'sep', i)
+    for f in seq.antecedent:
 
         # F, ... => ...
-        if len(f)==1 and f[0].startswith("falsum_"):
+        if len(f)==1 and utils.token_types[f[0]] == 'falsum':
             return 1, f"Falsum", f"Falsum found on the left"
 
         # p, ... => p
-        if f==right:
+        if f==seq.succedent:
             return 1, f"Ax", f"Sequent on the right corresponds with a sequent on the left"
 
         # Detect finish
-        empty &= not any((any((j.startswith(i) for j in f)) for i in ('and_', 'or_', 'imp_')))
+        empty &= not any((utils.token_types[j] in ('and', 'or', 'imp') for j in f))
 
     if empty:
         return 0, "", "Nothing more can be done with this branch, so it was closed."
 
 
+def get_literal(sentence: utils.Sentence) -> tp.Union[tuple[tp.Hashable, tp.Hashable], None]:
+    """Sequents are closed by check_contradict"""
+    return None
+
+
 def check_syntax(tokenized_statement: utils.Sentence) -> tp.Union[str, None]:
     """Should return string description of the problem in syntax"""
     return True
@@ -456,6 +381,12 @@ def get_used_types() -> tuple[str]:
     return USED_TYPES
 
 
+def state_key(branch: list[utils.Sentence], used: set[tuple[str]]) -> tp.Hashable:
+    """Rules read only the last sequent and the used formulas and sequents built of its subformulas"""
+    seq = utils.sequent(tuple(branch[-1]))
+    return utils.canonical_sequent(seq, PRECEDENCE), utils.readable_used(used, seq, PRECEDENCE)
+
+
 def use_rule(name: str, branch: list[utils.Sentence], used: set[utils.Sentence], context: dict[str, tp.Any], auto: bool = False) -> tuple[tp.Union[tuple[tuple[utils.Sentence]], None], int]:
     """Uses a rule of the given name on the provided branch.
         Context allows to give the FormalSystem additional arguments. 
@@ -474,68 +405,74 @@ def use_rule(name: str, branch: list[utils.Sentence], used: set[utils.Sentence],
     """
     rule = RULES[name]
 
-    start = utils.strip_around(branch[-1], "turnstile", False, PRECEDENCE)
-    start_left, start_right = start[0]
+    seq = utils.sequent(tuple(branch[-1]))
     
     # Check sequent number
-    if context.get('partID', -1) > sum(i.startswith('sep') for i in start_left)+1:
+    if context.get('partID', -1) > max(len(seq), 1):
         raise utils.FormalSystemError("Sequent number is too big")
 
     # Loop detection
     history = None
     if name == "left imp":
-        p = get_part(start_left[:], 'sep', context['partID']-1)
-        l, r = utils.strip_around(p, "imp", False, PRECEDENCE)[0]
-        if tuple(l) in used:
+        p = seq[context['partID']-1]
+        if (split := sides(p, "imp")) is None:
+            return None, None
+        l, r = split
+        if canon(l) in used:
             raise utils.FormalSystemError("Operation prohibited by loop detection algorithm")
         else:
-            history = [[l], [0]]
+            history = [[canon(l)], [0]]
 
 
     elif name == 'left or':
-        p = get_part(start_left[:], 'sep', context['partID']-1)
-        l, r = utils.strip_around(p, "or", False, PRECEDENCE)[0]
-        if is_sequent(start_left, l) or is_sequent(start_left, r):
+        p = seq[context['partID']-1]
+        if (split := sides(p, "or")) is None:
+            return None, None
+        l, r = split
+        if in_antecedent(l, seq) or in_antecedent(r, seq):
             raise utils.FormalSystemError("Operation prohibited by loop detection algorithm")
         else:
-            history = [[-1, start_right], [-1, start_right]]
+            history = [[-1, canon(seq.succedent)], [-1, canon(seq.succedent)]]
 
 
     elif name == 'right imp':
-        if (stripped := utils.strip_around(start_right, "imp", False, PRECEDENCE)) is None:
+        if (split := sides(list(seq.succedent), "imp")) is None:
             return None, None
-        l, r = stripped[0]
-        if is_sequent(start_left, l):
-            if tuple(r) not in used:
-                history = [[r]]
+        l, r = split
+        if in_antecedent(l, seq):
+            if canon(r) not in used:
+                history = [[canon(r)]]
             else:
                 raise utils.FormalSystemError("Operation prohibited by loop detection algorithm")
         else:
-            history = [[-1, r]]
+            history = [[-1, canon(r)]]
 
 
     elif name == 'right and':
-        l, r = utils.strip_around(start_right, "and", False, PRECEDENCE)[0]
-        if tuple(l) in used or tuple(r) in used:
+        if (split := sides(list(seq.succedent), "and")) is None:
+            return None, None
+        l, r = split
+        if canon(l) in used or canon(r) in used:
             raise utils.FormalSystemError("Operation prohibited by loop detection algorithm")
         else:
-            history = [[l], [r]]
+            history = [[canon(l)], [canon(r)]]
 
     elif name =='right or':
         context['used'] = used
 
     # Rule usage
-    usage = rule.func(auto, start_left[:], start_right[:], *context.values())
-    if not usage:
+    out = rule.func(auto, seq, *context.values())
+    if not out:
         return None, None
-    left, right = usage
 
+    # Sequents already derived on the branch (since the last reset) are loops
+    derived = [utils.canonical_sequent(branch[-1], PRECEDENCE) for branch in out]
+    if any(i in used for i in derived):
+        raise utils.FormalSystemError("Operation prohibited by loop detection algorithm")
 
     # Outcome return
-    if not (left is None or right is None):
-        # History length multiplication
-        if not history:
-            history = [[0]]*len(left)
-        return merge_tupstruct(left, right, "turnstile_=>"), history
-    else:
-        return None, None
+    # History length multiplication
+    if not history:
+        history = [[0]]*len(out)
+    history = [[i for i in h if i != 0] + [d] for h, d in zip(history, derived)]
+    return tuple(tuple(i.tokens() for i in branch) for branch in out), history
@@ -15,217 +15,135 @@ PRECEDENCE = {
 }
 
 
-def is_sequent(l, s) -> bool:
-    buffor = []
-    for i in l:
-        if i.startswith('sep_'):
-            if buffor == s:
-                return True
-            else:
-                buffor = []
-        else:
-            buffor.append(i)
-    if buffor == s:
-        return True
-    return False
-
-
-def get_part(sentence: utils.Sentence, split_type: str, sent_num: int):
-    """
-    Returns n-th part of the sentence (split_types is the type of separator)
-
-    Changes the sentence!!
-    """
-    split_count = 0
-    start_split = 0
-    for s in sentence:
-        if s.startswith(f"{split_type}_"):
-            split_count += 1
-        if split_count == sent_num:
-            break
-        start_split += 1
-
-    if len(sentence) <= start_split or split_count<sent_num:
-        raise IndexError("sent_num is too big")
-
-    part = []
-    if split_count>0:
-        sentence.pop(start_split)
-    
-    while start_split<len(sentence) and not sentence[start_split].startswith(f"{split_type}_"):
-        part.append(sentence.pop(start_split))
-
-    if len(sentence)>0 and split_count == 0:
-        sentence.pop(start_split)
-    return part
-
-
-def merge_tupstruct(left: tuple[tuple[str]], right: tuple[tuple[str]], glue: str):
-    """
-    Merges two tuple structures into one
-    """
-    if isinstance(left, tuple) and isinstance(left, tuple):
-        assert len(left) == len(right), "Tuples not of equal length"
-        end = []
-        for l, r in zip(left, right):
-            end.append(merge_tupstruct(l, r, glue))
-        return tuple(end)
-    elif isinstance(left, list) and isinstance(left, list):
-        return left + [glue] + right
-    else:
-        # Bug reporting
-        l_correct = (isinstance(left, list) or isinstance(left, tuple))
-        r_correct = (isinstance(right, list) or isinstance(right, tuple))
-        if l_correct and r_correct:
-            raise AssertionError("Tuples not of equal depth")
-        else:
-            raise AssertionError((l_correct*"left")+(l_correct*r_correct *' and ')+(r_correct*"right") + "tuple is messed up")
-
-
-def sep(part: utils.Sentence = None) -> list[str]:
-    if part is None or (len(part)>0 and not part[0].startswith('sep_;')):
-        return ['sep_;']
-    else:
-        return []
-
-
 # Rule definition
 
 
-def rule_left_and(left: utils.Sentence, right: utils.Sentence, num: int):
+def rule_left_and(seq: utils.Sequent, num: int):
     """ A,B,... => ...
         ______________
         A&B,... => ...
     """
     try:
-        conj = get_part(left, 'sep', num-1)
+        conj = seq[num-1]
     except IndexError:
-        return (None, None)
+        return None
     
     split = utils.strip_around(conj, 'and', False, PRECEDENCE)
     if split is None or split[0] is None:
-        return (None, None)
+        return None
     split = split[0]
-    return ((split[0]+sep()+split[1]+sep(left)+left,),), ((right,),)
+    return ((seq.remove(num-1).add(split[0], split[1]),),)
 
 
-def rule_right_and(left: utils.Sentence, right: utils.Sentence):
+def rule_right_and(seq: utils.Sequent):
     """ ... => A      ... => B
         __________________________
         ... => A&B
     """
-    conj = get_part(right, 'sep', 0)
-    if conj is None:
-        return (None, None)
-
-    split = utils.strip_around(conj, 'and', False, PRECEDENCE)
+    split = utils.strip_around(list(seq.succedent), 'and', False, PRECEDENCE)
     if split is None or split[0] is None:
-        return (None, None)
+        return None
     split = split[0]
-    return ((left,),(left,),), ((split[0],),(split[1],),)
+    return ((seq.conclude(split[0]),),(seq.conclude(split[1]),),)
 
-def rule_left_or(left: utils.Sentence, right: utils.Sentence, num: int):
+def rule_left_or(seq: utils.Sequent, num: int):
     """ A,... => ...  B,... => ...
         __________________________
         AvB,... => ...
     """
     try:
-        conj = get_part(left, 'sep', num-1)
+        conj = seq[num-1]
     except IndexError:
-        return (None, None)
+        return None
     
     split = utils.strip_around(conj, 'or', False, PRECEDENCE)
     if split is None or split[0] is None:
-        return (None, None)
+        return None
     split = split[0]
-    return ((split[0]+sep(left)+left,),(split[1]+sep(left)+left,),), ((right,),(right,),)
+    rest = seq.remove(num-1)
+    return ((rest.add(split[0]),),(rest.add(split[1]),),)
 
 
-def rule_right_or(left: utils.Sentence, right: utils.Sentence, side: str):
+def rule_right_or(seq: utils.Sequent, side: str):
     """ ... => (A,B)[side]
         ______________
         ... => AvB
     """
-    if not right or side not in ('l', 'r','find'):
-        return (None, None)
+    if not seq.succedent or side not in ('l', 'r','find'):
+        return None
     
-    subsent = get_part(right, 'sep', 0)
-    split = utils.strip_around(subsent, 'or', False, PRECEDENCE)
+    split = utils.strip_around(list(seq.succedent), 'or', False, PRECEDENCE)
     if split is None or split[0] is None:
-        return (None, None)
+        return None
     left_split, right_split = split[0]
     
     if side=='l':
-        return ((left,),), ((left_split,),)
+        return ((seq.conclude(left_split),),)
     elif side=='r':
-        return ((left,),), ((right_split,),)
+        return ((seq.conclude(right_split),),)
     else:
-        if is_sequent(left, left_split):
-            return ((left,),), ((left_split,),)
-        elif is_sequent(left, right_split):
-            return ((left,),), ((right_split,),)
+        if left_split in seq:
+            return ((seq.conclude(left_split),),)
+        elif right_split in seq:
+            return ((seq.conclude(right_split),),)
         else:
             # Default case
-            return ((left,),), ((max(split[0], key=len),),)
+            return ((seq.conclude(max(split[0], key=len)),),)
 
 
 
-def rule_left_imp(left: utils.Sentence, right: utils.Sentence, num: int):
+def rule_left_imp(seq: utils.Sequent, num: int):
     """ A -> B, ... => A    B,... => ...
         ________________________________
         A -> B,... => ...
     """
     try:
-        conj = get_part(left, 'sep', num-1)
+        conj = seq[num-1]
     except IndexError:
-        return (None, None)
+        return None
     
     split = utils.strip_around(conj, 'imp', False, PRECEDENCE)
     if split is None or split[0] is None:
-        return (None, None)
+        return None
     split = split[0]
-    return ((conj+sep(left)+left,),(split[1]+sep(left)+left,),), ((split[0],),(right,),)
+    rest = seq.remove(num-1)
+    return ((rest.add(conj).conclude(split[0]),),(rest.add(split[1]),),)
 
 
-def rule_right_imp(left: utils.Sentence, right: utils.Sentence):
+def rule_right_imp(seq: utils.Sequent):
     """ ..., A => B
         ______________
         ... => A -> B
     """
-    try:
-        conj = get_part(right, 'sep', 0)
-    except IndexError:
-        return (None, None)
-    
-    split = utils.strip_around(conj, 'imp', False, PRECEDENCE)
+    split = utils.strip_around(list(seq.succedent), 'imp', False, PRECEDENCE)
     if split is None or split[0] is None:
-        return (None, None)
+        return None
     split = split[0]
-    return ((split[0]+sep(left)+left,),), ((split[1],),)
+    return ((seq.add(split[0]).conclude(split[1]),),)
 
-def rule_left_strong(left: utils.Sentence, right: utils.Sentence, num: int):
+def rule_left_strong(seq: utils.Sequent, num: int):
     """ ..., A, A => ...
         ________________
         ..., A => ...
     """
     try:
-        conj = get_part(left, 'sep', num-1)
+        conj = seq[num-1]
     except IndexError:
-        return (None, None)
+        return None
     
-    return ((conj+sep()+conj+sep(left)+left,),), ((right,),)
+    return ((seq.remove(num-1).add(conj, conj),),)
 
-def rule_left_weak(left: utils.Sentence, right: utils.Sentence, num: int):
+def rule_left_weak(seq: utils.Sequent, num: int):
     """ ... => ...
         ______________
         ..., A => ...
     """
     try:
-        conj = get_part(left, 'sep', num-1)
+        seq[num-1]
     except IndexError:
-        return (None, None)
+        return None
     
-    return ((left,),), ((right,),)
+    return ((seq.remove(num-1),),)
 
 RULES = {
     'left and': utils.Rule(
@@ -323,39 +241,42 @@ RULES = {
 def prepare_for_proving(statement: utils.Sentence) -> utils.Sentence:
     statement = utils.reduce_brackets(statement)
     if not 'turnstile_=>' in statement:
-        return ['turnstile_=>']+statement
-    else:
-        return statement
+        statement = ['turnstile_=>']+statement
+    utils.parse(statement, PRECEDENCE)
+    return statement
 
 
 def check_contradict(branch: list[utils.Sentence], used: set[tuple[str]]) -> tp.Union[None, tuple[int, str, str]]:
-    left, right = utils.strip_around(branch[-1], "turnstile", False, PRECEDENCE)[0]
-    seps = sum((i.startswith('sep_') for i in left), 1)
+    seq = utils.sequent(tuple(branch[-1]))
 
     # Right part verification
-    empty = len(right)==1
+    empty = len(seq.succedent)==1
 
     # Left part verification
-    if len(left)==0:
+    if len(seq)==0:
         return None
-    for i in range(0, seps):
-        f = get_part(left[:], 'sep', i)
+    for f in seq.antecedent:
 
         # F, ... => ...
-        if len(f)==1 and f[0].startswith("falsum_"):
+        if len(f)==1 and utils.token_types[f[0]] == 'falsum':
             return 1, f"Falsum", f"Falsum found on the left"
 
         # p, ... => p
-        if f==right:
+        if f==seq.succedent:
             return 1, f"Ax", f"Sequent on the right corresponds with a sequent on the left"
 
         # Detect finish
-        empty &= not any((any((j.startswith(i) for j in f)) for i in ('and_', 'or_', 'imp_')))
+        empty &= not any((utils.token_types[j] in ('and', 'or', 'imp') for j in f))
 
     if empty:
         return 0, "", "Nothing more can be done with this branch, so it was closed."
 
 
+def get_literal(sentence: utils.Sentence) -> tp.Union[tuple[tp.Hashable, tp.Hashable], None]:
+    """Sequents are closed by check_contradict"""
+    return None
+
+
 def check_syntax(tokenized_statement: utils.Sentence) -> tp.Union[str, None]:
     """Should return string description of the problem in syntax"""
     return True
@@ -381,6 +302,12 @@ def get_used_types() -> tuple[str]:
     return USED_TYPES
 
 
+def state_key(branch: list[utils.Sentence], used: set[tuple[str]]) -> tp.Hashable:
+    """Rules read only the last sequent and the used formulas and sequents built of its subformulas"""
+    seq = utils.sequent(tuple(branch[-1]))
+    return utils.canonical_sequent(seq, PRECEDENCE), utils.readable_used(used, seq, PRECEDENCE)
+
+
 def use_rule(name: str, branch: list[utils.Sentence], used: set[utils.Sentence], context: dict[str, tp.Any], auto: bool = False) -> tuple[tp.Union[tuple[tuple[utils.Sentence]], None], int]:
     """Uses a rule of the given name on the provided branch.
         Context allows to give the FormalSystem additional arguments. 
@@ -399,39 +326,38 @@ def use_rule(name: str, branch: list[utils.Sentence], used: set[utils.Sentence],
     """
     rule = RULES[name]
 
-    start = utils.strip_around(branch[-1], "turnstile", False, PRECEDENCE)
-    start_left, start_right = start[0]
+    seq = utils.sequent(tuple(branch[-1]))
     
     # Check sequent number
-    if context.get('partID', -1) > sum(i.startswith('sep') for i in start_left)+1:
+    if context.get('partID', -1) > max(len(seq), 1):
         raise utils.FormalSystemError("Sequent number is too big")
 
     # Loop detection
     history = None
     if name == "left imp":
-        if tuple(start_right) in used:
+        if seq.succedent in used:
             raise utils.FormalSystemError("Operation prohibited by loop detection algorithm")
         else:
-            history = [[start_right], [0]]
+            history = [[seq.succedent], [0]]
     elif name == 'left or':
         history = [[-1], [-1]]
     elif name == 'right imp':
-        l = utils.strip_around(start_right, "imp", False, PRECEDENCE)
+        l = utils.strip_around(list(seq.succedent), "imp", False, PRECEDENCE)
         if l is None:
             return None, None
-        elif is_sequent(start_left, l[0][0]):
+        elif l[0][0] in seq:
             history = [[0]]
         else:
             history = [[-1]]
 
     # Rule usage
-    left, right = rule.func(start_left[:], start_right[:], *context.values())
+    out = rule.func(seq, *context.values())
 
     # Outcome return
-    if not (left is None or right is None):
+    if out is not None:
         # History length multiplication
         if not history:
-            history = [[0]]*len(left)
-        return merge_tupstruct(left, right, "turnstile_=>"), history
+            history = [[0]]*len(out)
+        return tuple(tuple(i.tokens() for i in branch) for branch in out), history
     else:
-        return None, None
\ No newline at end of file
+        return None, None
@@ -77,7 +77,8 @@ RULES = {
 
 @utils.cleaned
 def prepare_for_proving(statement: utils.Sentence) -> utils.Sentence:
-    """Cleaning the sentence"""
+    """Cleaning the sentence and building its formula DAG"""
+    utils.parse(statement, PRECEDENCE)
     return statement
 
 
@@ -85,9 +86,9 @@ def check_contradict(branch: list[utils.Sentence], used: set[tuple[str]]) -> tp.
     """Checks for closing sentences"""
     for num1, statement_1 in enumerate(branch[:-1]):
         for num2, statement_2 in enumerate(branch[-2:]):
-            if statement_1[0].startswith('not') and not statement_2[0].startswith('not'):
+            if utils.token_types[statement_1[0]] == 'not' and utils.token_types[statement_2[0]] != 'not':
                 negated, statement = statement_1, statement_2
-            elif statement_2[0].startswith('not') and not statement_1[0].startswith('not'):
+            elif utils.token_types[statement_2[0]] == 'not' and utils.token_types[statement_1[0]] != 'not':
                 negated, statement = statement_2, statement_1
             else:
                 continue
@@ -102,6 +103,16 @@ def check_contradict(branch: list[utils.Sentence], used: set[tuple[str]]) -> tp.
         
 
 
+def get_literal(sentence: utils.Sentence) -> tp.Union[tuple[tp.Hashable, tp.Hashable], None]:
+    """Returns the normalized sentence and the normalized form of its negation; used to index branches"""
+    if utils.token_types[sentence[0]] == 'not':
+        body = utils.formula(tuple(sentence[1:])).reduced()
+        return (True, body), (False, body)
+    else:
+        body = utils.formula(tuple(sentence))
+        return (False, body), (True, body)
+
+
 def check_syntax(sentence: utils.Sentence) -> tp.Union[str, None]:
     """True if sentence's syntax is correct; Doesn't check brackets"""
     return None
@@ -130,6 +141,11 @@ def get_used_types() -> tuple[str]:
     return USED_TYPES
 
 
+def state_key(branch: list[utils.Sentence], used: set[tuple[str]]) -> tp.Hashable:
+    """Rules can use any sentence of the branch, so the key holds all of them"""
+    return tuple(tuple(i) for i in branch), frozenset(used)
+
+
 def use_rule(name: str, branch: list[utils.Sentence], used: set[utils.Sentence], context: dict[str,tp.Any], auto: bool = False) -> tuple[tp.Union[tuple[tuple[utils.Sentence]], None], int]:
     """Uses a rule of the given name on the provided branch.
         Context allows to give the FormalSystem additional arguments. 
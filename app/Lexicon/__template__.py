@@ -9,6 +9,11 @@ def tokenize(statement: str, used_tokens: tp.Iterable[str], defined: dict[str, s
     pass
 
 
+def tokenize_many(statements: tp.Iterable[str], used_tokens: tp.Iterable[str], defined: dict[str, str] = dict(), processes: int = 0) -> tp.Iterator[utils.Sentence]:
+    """Tokenizes multiple statements, results are yielded in the order of the statements"""
+    pass
+
+
 def get_lexem(token: str) -> str:
     """Returns the lexem which was used to find the token"""
     pass
@@ -1,8 +1,13 @@
 import typing as tp
-from collections import namedtuple
+import hashlib
+import json
+import multiprocessing
+import os
+from collections import namedtuple, OrderedDict
 from string import ascii_letters as alphabet
 from functools import lru_cache
 import re
+import sys
 from functools import reduce
 import Lexicon as utils
 
@@ -11,6 +16,13 @@ VERSION = '0.0.1'
 
 TESTING = False
 
+# Batch tokenization
+CACHE_SIZE = 4096       # Amount of statements remembered by `tokenize_many`
+POOL_THRESHOLD = 512    # Minimal amount of new statements to use worker processes
+FORK_AVAILABLE = 'fork' in multiprocessing.get_all_start_methods()
+
+tokenized_cache = OrderedDict()
+
 full_lexicon = dict(
     constants=(
         # AND
@@ -53,6 +65,10 @@ full_lexicon = dict(
     ),
 )
 
+# Compiled lexicons are stored on disk, the revision invalidates them after any change of the lexicon
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__lexcache__')
+LEXICON_REVISION = hashlib.sha1(repr((VERSION, sorted(full_lexicon.items()))).encode('utf-8')).hexdigest()
+
 full_lexicon['types'] = reduce(lambda x, y: x | y, ((
     {i[1] for i in value} for value in full_lexicon.values())), set())
 
@@ -82,12 +98,100 @@ def check_range(letter: str, indexA: int, indexB: int) -> bool:
 
 
 Lexicon = namedtuple(
-    'Lexicon', ['pattern', 'defined', 'keywords', 'variables'])
+    'Lexicon', ['pattern', 'defined', 'keywords', 'variables', 'trie', 'chars'])
 
+# Priorities of the literal groups in the trie; mirror the order of alternatives in Lexicon.pattern
+PRIORITY_NON_CONVERTIBLE = 0
+PRIORITY_DEFINED = 1
+PRIORITY_KEYWORD = 2
 
-@lru_cache(3)
+
+@lru_cache(32)
 def simplify_lexicon(used_tokens: frozenset[str], defined: frozenset[tuple[str, str]]) -> Lexicon:
-    """Filters out patterns that aren't used, creates a regex pattern at Lexicon.pattern, returns a lexicon object"""
+    """Returns a lexicon object for the given types and definitions (see `compile_lexicon`).
+    Compiled lexicons are reused from the disk cache in `CACHE_DIR` if possible"""
+    path = cache_path(used_tokens, defined)
+    lex = load_lexicon(path)
+    if lex is None:
+        lex = compile_lexicon(used_tokens, defined)
+        save_lexicon(lex, path)
+    return lex
+
+
+def cache_path(used_tokens: frozenset[str], defined: frozenset[tuple[str, str]]) -> str:
+    """Returns the path of the cached lexicon; the key consists of used types, definitions and the lexicon revision"""
+    key = repr((LEXICON_REVISION, TESTING, sorted(used_tokens), sorted(defined)))
+    return os.path.join(CACHE_DIR, f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.json")
+
+
+def load_lexicon(path: str) -> tp.Union[Lexicon, None]:
+    """Reads a compiled lexicon from the disk cache, returns None if it can't be used.
+    The file only holds data (JSON), so a changed or planted file can't run any code"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.pop('revision') != LEXICON_REVISION:
+            return None
+        return Lexicon(
+            pattern=re.compile(data['pattern']),
+            defined=dict(data['defined']),
+            keywords=dict(data['keywords']),
+            variables=[((i[0][0], i[0][1]), i[1]) for i in data['variables']],
+            trie=_load_trie(data['trie']),
+            # Tokens need to be interned in this process
+            chars={i: sys.intern(j) for i, j in data['chars'].items()},
+        )
+    except Exception:
+        return None
+
+
+def save_lexicon(lex: Lexicon, path: str) -> None:
+    """Writes a compiled lexicon to the disk cache, problems with writing are ignored"""
+    data = dict(
+        revision=LEXICON_REVISION,
+        pattern=lex.pattern.pattern,
+        defined=lex.defined,
+        keywords=lex.keywords,
+        variables=lex.variables,
+        trie=_dump_trie(lex.trie),
+        chars=lex.chars,
+    )
+    temp = f"{path}.{os.getpid()}"
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(temp, path)
+    except OSError:
+        if os.path.exists(temp):
+            os.remove(temp)
+
+
+def _dump_trie(node: dict) -> dict:
+    """Converts the trie to JSON data; the `(priority, token)` tuples become `[priority, token or error message, is error]`"""
+    dumped = dict()
+    for char, child in node.items():
+        if char == '':
+            dumped[''] = [child[0], str(child[1]), isinstance(child[1], utils.CompilerError)]
+        else:
+            dumped[char] = _dump_trie(child)
+    return dumped
+
+
+def _load_trie(node: dict) -> dict:
+    """Reverts `_dump_trie`, the tokens are interned"""
+    loaded = dict()
+    for char, child in node.items():
+        if char == '':
+            priority, token, error = child
+            loaded[''] = (priority, utils.CompilerError(token) if error else sys.intern(token))
+        else:
+            loaded[char] = _load_trie(child)
+    return loaded
+
+
+def compile_lexicon(used_tokens: frozenset[str], defined: frozenset[tuple[str, str]]) -> Lexicon:
+    """Filters out patterns that aren't used, creates a regex pattern at Lexicon.pattern and the tokenizer tables, returns a lexicon object"""
     lack = used_tokens - full_lexicon['types']
     if lack:
         raise utils.CompilerError(
@@ -124,7 +228,94 @@ def simplify_lexicon(used_tokens: frozenset[str], defined: frozenset[tuple[str,
         [re.escape(i[0]) for i in filtered_keywords], key=len, reverse=True) + [i[0] for i in filtered_var]
     pattern = re.compile("|".join(in_pattern))
 
-    return Lexicon(pattern=pattern, defined=dict_def, keywords=dict_keys, variables=tup_variables)
+    lex = Lexicon(pattern=pattern, defined=dict_def, keywords=dict_keys, variables=tup_variables, trie=None, chars=None)
+    return lex._replace(trie=compile_trie(lex), chars=compile_chars(lex))
+
+
+def _final_token(string: str, lex: Lexicon) -> tp.Union[str, utils.CompilerError]:
+    """Runs `find_token` ahead of time; errors are returned, so that they can be raised only when the lexem is found"""
+    try:
+        return sys.intern(find_token(string, lex))
+    except utils.CompilerError as e:
+        return e
+
+
+def compile_trie(lex: Lexicon) -> dict:
+    """Generates a character trie of all literal lexems (brackets, defined and keywords)
+
+    Every node is a dict of `char: child`; the empty string key holds a `(priority, token)` tuple
+    if a lexem ends in this node. The token is already in its final form.
+
+    :param lex: Lexicon object without the tables (generate with simplify_lexicon)
+    :type lex: Lexicon
+    :return: Root of the trie
+    :rtype: dict
+    """
+    trie = dict()
+    groups = (
+        (PRIORITY_NON_CONVERTIBLE, utils.NON_CONVERTIBLE),
+        (PRIORITY_DEFINED, lex.defined.keys()),
+        (PRIORITY_KEYWORD, lex.keywords.keys()),
+    )
+    for priority, lexems in groups:
+        for lexem in lexems:
+            if not lexem:
+                continue
+            node = trie
+            for char in lexem:
+                node = node.setdefault(char, dict())
+            if '' not in node or node[''][0] > priority:
+                node[''] = (priority, _final_token(lexem, lex))
+    return trie
+
+
+def compile_chars(lex: Lexicon) -> dict[str, str]:
+    """Generates a table of single letter variables and their final tokens"""
+    chars = dict()
+    for letter in alphabet:
+        if any((check_range(letter, i[0][0], i[0][1]) for i in lex.variables)):
+            chars[letter] = sys.intern(find_token(letter, lex))
+    return chars
+
+
+def scan(statement: str, lex: Lexicon) -> utils.Sentence:
+    """Tokenizes the statement in one pass using the tables compiled in the lexicon.
+    Literal lexems are matched by the longest prefix in the trie (earlier groups of `Lexicon.pattern` win),
+    then single letter variables; other characters are skipped.
+
+    :param statement: The statement to tokenize
+    :type statement: str
+    :param lex: Used lexicon object (generate with simplify_lexicon)
+    :type lex: Lexicon
+    :raises CompilerError: A lexem can't be properly tokenized
+    :return: Tokenized statement
+    :rtype: utils.Sentence
+    """
+    trie, chars = lex.trie, lex.chars
+    sentence = []
+    length = len(statement)
+    i = 0
+    while i < length:
+        # Longest literal match
+        node = trie.get(statement[i])
+        found = None
+        end = i
+        while node is not None:
+            end += 1
+            if (leaf := node.get('')) is not None and (found is None or leaf[0] <= found[0]):
+                found, stop = leaf, end
+            node = node.get(statement[end]) if end < length else None
+
+        if found is not None:
+            if isinstance(found[1], utils.CompilerError):
+                raise found[1]
+            sentence.append(found[1])
+            i = stop
+        else:
+            if (token := chars.get(statement[i])) is not None:
+                sentence.append(token)
+            i += 1
+    return sentence
 
 
 def find_token(string: str, lex: Lexicon) -> str:
@@ -188,14 +379,95 @@ def tokenize(statement: str, used_tokens: tp.Iterable[str], defined: dict[str, s
     dictionary = simplify_lexicon(frozenset(used_tokens), frozenset(defined.items()))
     
     # Find and get tokens
-    sentence = dictionary.pattern.findall(statement)
-    sentence = [find_token(lexem, dictionary) for lexem in sentence]
+    return scan(statement, dictionary)
 
-    # Additional check
-    if not is_fully_tokenized(sentence):
-        raise utils.CompilerError("System didn't fully tokenize the sentence")
-    
-    return sentence
+
+def tokenize_many(statements: tp.Iterable[str], used_tokens: tp.Iterable[str], defined: dict[str, str] = dict(), processes: int = 0) -> tp.Iterator[utils.Sentence]:
+    """Transforms multiple statements into lists of tokens (like `tokenize`), results are yielded in the order of the statements.
+    Tokenized statements are remembered in a bounded cache (`CACHE_SIZE`), so repeated statements aren't tokenized again.
+
+    :param statements: Statements to tokenize
+    :type statements: tp.Iterable[str]
+    :param used_tokens: List of tokens used in this formal system (`FormalSystem.get_used_types`)
+    :type used_tokens: tp.Iterable[str]
+    :param defined: Variables defined by the user, defaults to dict()
+    :type defined: dict[str, str], optional
+    :param processes: Amount of worker processes used when there are at least `POOL_THRESHOLD` new statements, defaults to 0 (no workers)
+    :type processes: int, optional
+    :raises CompilerError: A statement wasn't tokenized; raised when the generator reaches it
+    :return: Generator of tokenized statements
+    :rtype: tp.Iterator[utils.Sentence]
+    """
+    used_tokens = frozenset(used_tokens)
+    defined = frozenset(defined.items())
+    dictionary = simplify_lexicon(used_tokens, defined)
+
+    # Worker processes
+    found = dict()
+    chunks = iter(())
+    if processes > 1 and FORK_AVAILABLE:
+        statements = list(statements)
+        new = list(dict.fromkeys(
+            (i for i in statements if (i, used_tokens, defined) not in tokenized_cache)))
+        if len(new) >= POOL_THRESHOLD:
+            chunks = _pool_scan(new, dictionary, processes)
+
+    for statement in statements:
+        key = (statement, used_tokens, defined)
+        sentence = tokenized_cache.get(key, None)
+        if sentence is None:
+            while statement not in found and (chunk := next(chunks, None)) is not None:
+                found.update(chunk)
+            result = found.pop(statement) if statement in found else scan(statement, dictionary)
+            if isinstance(result, str):
+                raise utils.CompilerError(result)
+            sentence = tuple(result)
+            tokenized_cache[key] = sentence
+            if len(tokenized_cache) > CACHE_SIZE:
+                tokenized_cache.popitem(last=False)
+        else:
+            tokenized_cache.move_to_end(key)
+        yield list(sentence)
+
+
+def _pool_scan(statements: list[str], lex: Lexicon, processes: int) -> tp.Iterator[dict[str, tp.Union[utils.Sentence, str]]]:
+    """Tokenizes the statements in forked worker processes; USE `tokenize_many` INSTEAD
+
+    :return: Generator of `{statement: sentence or error message}` dicts, one for every chunk in the order of the statements
+    :rtype: tp.Iterator[dict[str, tp.Union[utils.Sentence, str]]]
+    """
+    context = multiprocessing.get_context('fork')
+    size = -(-len(statements) // processes)
+    workers = []
+    for start in range(0, len(statements), size):
+        receiver, sender = context.Pipe(duplex=False)
+        chunk = statements[start:start+size]
+        process = context.Process(target=_scan_worker, args=(sender, chunk, lex), daemon=True)
+        process.start()
+        sender.close()
+        workers.append((process, receiver, chunk))
+
+    try:
+        for process, receiver, chunk in workers:
+            results = receiver.recv()
+            yield {statement: [sys.intern(i) for i in result] if isinstance(result, list) else result
+                   for statement, result in zip(chunk, results)}
+    finally:
+        for process, receiver, _ in workers:
+            receiver.close()
+            process.join()
+
+
+def _scan_worker(connection, statements: list[str], lex: Lexicon) -> None:
+    """Worker process of `_pool_scan`, sends back sentences or error messages"""
+    results = []
+    for statement in statements:
+        try:
+            results.append(scan(statement, lex))
+        except utils.CompilerError as e:
+            results.append(str(e))
+    connection.send(results)
+    connection.close()
 
 
 def get_lexem(token: str) -> str:
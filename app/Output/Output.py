@@ -2,7 +2,7 @@ import typing as tp
 from collections import namedtuple
 
 Sentence = tp.NewType("Sentence", list[str])
-PrintedTree = namedtuple('PrintedTree', ('sentences', 'children', 'closer'))
+PrintedTree = namedtuple('PrintedTree', ('sentences', 'children', 'closer', 'cache'), defaults=(None,))
 
 def align(strings: list[str], length: int = None) -> list[str]:
     """Generates additional spaces at the end of string which makes them all have the same length
@@ -11,4 +11,20 @@ def align(strings: list[str], length: int = None) -> list[str]:
     """
     if not length:
         length = max((len(i) for i in strings))
-    return ["".join((i, " "*(length-len(i)))) for i in strings]
\ No newline at end of file
+    return ["".join((i, " "*(length-len(i)))) for i in strings]
+
+def cached(func: callable) -> callable:
+    """Stores the results of a function rendering a subtree in the cache of the subtree (`PrintedTree.cache`).
+    The engine keeps a PrintedTree until something in its subtree changes, so only the changed subtrees are rendered again.
+    The function has to take the subtree and the lexem parser as the first arguments; the results shouldn't be modified.
+    """
+    def new(tree: PrintedTree, lexem_parser: callable, *args):
+        if tree.cache is None:
+            return func(tree, lexem_parser, *args)
+        key = (func, lexem_parser, *args)
+        if (result := tree.cache.get(key)) is None:
+            result = tree.cache[key] = func(tree, lexem_parser, *args)
+        return result
+    new.__name__ = func.__name__
+    new.__doc__ = func.__doc__
+    return new
@@ -39,7 +39,7 @@ def write_tree(tree: utils.PrintedTree, lexem_parser: callable) -> list[str]:
     """
     Returns a tree/table representation of the whole proof
     """
-    return [_write_tree(tree.sentences, tree.children, lexem_parser)]
+    return [_write_node(tree, lexem_parser)]
 
 
 def _translate(s: utils.Sentence, lexem_parser: callable):
@@ -54,11 +54,17 @@ def _translate(s: utils.Sentence, lexem_parser: callable):
     return " ".join(readable)
 
 
+@utils.cached
+def _write_node(tree: utils.PrintedTree, lexem_parser: callable) -> str:
+    """Renders a subtree; results are cached in the subtree"""
+    return _write_tree(tree.sentences, tree.children, lexem_parser)
+
+
 def _write_tree(sentences, children, lexem_parser: callable) -> str:
     if len(sentences)>0:
         return "\\infer{%s}{%s}" % (_translate(sentences[0], lexem_parser), 
             _write_tree(sentences[1:], children, lexem_parser))
     elif children is not None:
-        return " & ".join((_write_tree(i.sentences, i.children, lexem_parser) for i in children))
+        return " & ".join((_write_node(i, lexem_parser) for i in children))
     else:
         return ""
\ No newline at end of file
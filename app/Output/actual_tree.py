@@ -6,11 +6,13 @@ Autorzy:
     Jakub Dakowski (@PogromcaPapai) - autor implementacji
 """
 import Output as utils
-from anytree import Node, RenderTree
+from anytree import ContStyle
 
 SOCKET = 'Output'
 VERSION = '0.0.1'
 
+STYLE = ContStyle()
+
 
 def get_readable(sentence: utils.Sentence, lexem_parser: callable) -> str:
     """Returns a readable version of the sentence
@@ -36,28 +38,33 @@ def write_tree(tree: utils.PrintedTree, lexem_parser: callable) -> list[str]:
     """
     Zwraca drzewiastą reprezentację drzewa
     """
-    strs = []
-    for pre, fill, node in RenderTree(get_nodes(tree.sentences, lexem_parser, tree.children)[0]):
-        strs.append(f"{pre}{node.name}".rstrip('\n'))
-    return strs
+    return list(write_subtree(tree, lexem_parser))
 
 
-def get_nodes(sentences: list[str], lexem_parser: callable, children: list[utils.PrintedTree]) -> list[Node]: 
-    """Zwraca listę dzieci do dania do drzewa.
-    Jeżeli istnieją jeszcze zdania w sentences, to mają one pierwszeństwo. W innym przypadku wyliczane są dzieci.
+@utils.cached
+def write_subtree(tree: utils.PrintedTree, lexem_parser: callable) -> tuple[str]:
+    """Zwraca linie poddrzewa w takiej postaci, jaką dałby RenderTree z anytree, z wcięciami liczonymi od korzenia poddrzewa.
+    Każde zdanie jest jedynym dzieckiem poprzedniego, a dzieci węzła drzewa są dziećmi jego ostatniego zdania.
+    Linie dzieci są brane z ich pamięci podręcznej i tylko poprzedzane wcięciem, więc renderowane są jedynie zmienione poddrzewa.
 
-    :param sentences: PrintedTree.sentences
-    :type sentences: list[str]
+    :param tree: Poddrzewo do wypisania
+    :type tree: utils.PrintedTree
     :param lexem_parser: Transformuje tokeny w leksemy
     :type lexem_parser: callable
-    :param children: PrintedTree.children
-    :type children: list[PrintedTree]
-    :return: Lista dzieci do dodania do węzła
-    :rtype: list[Node]
+    :return: Linie poddrzewa (nie należy ich modyfikować)
+    :rtype: tuple[str]
     """
-    if sentences:
-        return [Node(get_readable(sentences[0], lexem_parser), children=get_nodes(sentences[1:], lexem_parser, children))]
-    elif children:
-        return sum((get_nodes(child.sentences, lexem_parser, child.children) for child in children), [])
-    else:
-        return []
\ No newline at end of file
+    lines = []
+    for i, sentence in enumerate(tree.sentences):
+        pre = STYLE.empty*(i-1) + STYLE.end if i else ''
+        lines.append(f"{pre}{get_readable(sentence, lexem_parser)}".rstrip('\n'))
+
+    if tree.children:
+        indent = STYLE.empty*(len(tree.sentences)-1)
+        for j, child in enumerate(tree.children):
+            last = j == len(tree.children)-1
+            first, *rest = write_subtree(child, lexem_parser)
+            lines.append(indent + (STYLE.end if last else STYLE.cont) + first)
+            fill = indent + (STYLE.empty if last else STYLE.vertical)
+            lines.extend(fill + line for line in rest)
+    return tuple(lines)
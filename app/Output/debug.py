@@ -22,10 +22,12 @@ def write_tree(tree: utils.PrintedTree, lexem_parser: callable) -> list[str]:
     """
     Returns a tree/table representation of the whole proof
     """
-    return _write_tree(tree, lexem_parser)[0]
-    
+    return list(_write_tree(tree, lexem_parser)[0])
+
+@utils.cached
 def _write_tree(tree: utils.PrintedTree, lexem_parser: callable) -> tuple[list[str], int]:
     """A technical function used to generate a table representation of the whole proof. USE `write_tree` INSTEAD.
+    Results are cached in the subtree, so they can't be modified.
 
     :param tree: Tree to print
     :type tree: utils.PrintedTree
@@ -23,12 +23,7 @@ logging.basicConfig(filename='log.log', level=logging.DEBUG,
 logger = logging.getLogger('interface')
 
 
-def UIlogged(func):
-    def new(*args, **kwargs):
-        logger.debug(
-            f"{func.__name__} with args={str(args)} and kwargs={str(kwargs)}")
-        return func(*args, **kwargs)
-    return new
+UIlogged = engine.traced(logger, logging.DEBUG)
 
 
 # Command parsing execution
@@ -121,6 +116,18 @@ def do_clear(session) -> str:
     return ""
 
 
+def do_trace(session: engine.Session, state: str) -> str:
+    """Turns the tracing of the commands in the log on or off
+
+    Arguments:
+        - on/off [str]
+    """
+    if state.lower() not in ('on', 'off'):
+        return "Use 'on' or 'off'"
+    engine.set_tracing(state.lower() == 'on')
+    return f"Tracing turned {state.lower()}"
+
+
 def do_exit(session: engine.Session):
     """Exits the app"""
     logger.info("Exiting the app")
@@ -200,6 +207,38 @@ def do_write(session: engine.Session, filename: str):
         return f"Proof saved as {filename}"
 
 
+def do_save(session: engine.Session, filename: str) -> str:
+    """
+    Saves the proof to a file with the provided name, so it can be restored with `load`; an existing file is overwritten.
+
+    Arguments:
+        - filename [str]
+    """
+    try:
+        session.save_proof(filename)
+    except engine.EngineError as e:
+        return str(e)
+    else:
+        return f"Proof saved as {filename}"
+
+
+def do_load(session: engine.Session, filename: str) -> str:
+    """
+    Restores a proof saved with `save`
+
+    Arguments:
+        - filename [str]
+    """
+    if session.proof:
+        return "A proof would be deleted"
+    try:
+        session.load_proof(filename)
+    except engine.EngineError as e:
+        return str(e)
+    else:
+        return f"Proof loaded from {filename}"
+
+
 # Proof manipulation
 
 
@@ -219,9 +258,9 @@ def do_prove(session: engine.Session, sentence: str) -> str:
         return "Sentence tokenized successfully \nProof initialized"
 
 
-def do_auto(session: engine.Session):
+def do_auto(session: engine.Session, processes: int = 1, budget: engine.Budget = None):
     try:
-        out = session.auto()
+        out = session.auto(processes, budget)
     except engine.EngineError as e:
         return str(e)
     if out:
@@ -229,6 +268,47 @@ def do_auto(session: engine.Session):
     else:
         return "Nothing more can be done"
 
+
+def do_auto_parallel(session: engine.Session, processes: int):
+    """Proves the open branches in many processes
+
+    Arguments:
+        - Amount of processes [int]
+    """
+    return do_auto(session, processes)
+
+
+def do_auto_budget(session: engine.Session, limits: str):
+    """Proves the open branches within the limits; every open branch may use the rule and node limits
+
+    Arguments:
+        - Limits written as limit=value: rules, nodes, time (seconds), memory (bytes) [str]
+    """
+    budget = {}
+    for limit in limits.split():
+        name, _, value = limit.partition('=')
+        if name not in engine.Budget._fields:
+            return f"No such limit: {name}"
+        try:
+            budget[name] = float(value) if name == 'time' else int(value)
+        except ValueError:
+            return f"Wrong value of the {name} limit: {value}"
+    return do_auto(session, 1, engine.Budget(**budget))
+
+
+def do_auto_stats(session: engine.Session):
+    """Shows the statistics of the last auto run"""
+    stats = session.stats
+    if stats is None:
+        return "Auto wasn't used in this session"
+    out = [f"Nodes expanded: {stats.nodes}",
+           f"Rules used: {stats.rules} ({stats.rules_per_second:.0f} per second)",
+           f"Max depth: {stats.max_depth}",
+           f"Cache: {stats.cache_hits} hits, {stats.cache_misses} misses",
+           f"Time: {stats.time:.3f} s"]
+    out.extend(f" - {rule}: {seconds*1e6:.0f} µs" for rule, seconds in stats.time_per_rule.items())
+    return "\n".join(out)
+
 def do_use(session: engine.Session, command) -> str:
     """Uses a rule in the proof
 
@@ -301,6 +381,26 @@ def do_contra(session, branch: str):
         return f"No contradictions found on branch {branch}."
 
 
+def do_undo(session: engine.Session) -> str:
+    """Reverts the last rule usage (or the last auto run)"""
+    try:
+        session.undo()
+    except engine.EngineError as e:
+        return str(e)
+    else:
+        return f"Step undone, current branch: {session.branch}"
+
+
+def do_redo(session: engine.Session) -> str:
+    """Brings back the last undone step"""
+    try:
+        session.redo()
+    except engine.EngineError as e:
+        return str(e)
+    else:
+        return f"Step redone, current branch: {session.branch}"
+
+
 def do_leave(session) -> str:
     """Resets the proof"""
     session.reset_proof()
@@ -353,18 +453,25 @@ command_dict = OrderedDict({
     'jump': {'comm': do_jump, 'args': [str], 'summary': ''},
     'next': {'comm': do_next, 'args': [], 'summary': ''},
     # Proof manipulation
-    # Czy zrobić oddzielne save i write? save serializowałoby tylko do wczytania, a write drukowałoby input
     'write': {'comm': do_write, 'args': [str], 'summary': ''},
+    'save': {'comm': do_save, 'args': [str], 'summary': ''},
+    'load': {'comm': do_load, 'args': [str], 'summary': ''},
     'use': {'comm': do_use, 'args': 'multiple_strings', 'summary': ''},
     'leave': {'comm': do_leave, 'args': [], 'summary': ''},
     'prove': {'comm': do_prove, 'args': 'multiple_strings', 'summary': ''},
+    'auto parallel': {'comm': do_auto_parallel, 'args': [int], 'summary': ''},
+    'auto stats': {'comm': do_auto_stats, 'args': [], 'summary': ''},
+    'auto budget': {'comm': do_auto_budget, 'args': 'multiple_strings', 'summary': ''},
     'auto': {'comm': do_auto, 'args': [], 'summary': ''},
+    'undo': {'comm': do_undo, 'args': [], 'summary': ''},
+    'redo': {'comm': do_redo, 'args': [], 'summary': ''},
     # Program interaction
     'plugin switch': {'comm': do_plug_switch, 'args': [str, str], 'summary': ''},
     'plugin list all': {'comm': do_plug_list_all, 'args': [], 'summary': ''},
     'plugin list': {'comm': do_plug_list, 'args': [str], 'summary': ''},
     'plugin gen': {'comm': do_plug_gen, 'args': [str, str], 'summary': ''},
     'clear': {'comm': do_clear, 'args': [], 'summary': ''},
+    'trace': {'comm': do_trace, 'args': [str], 'summary': ''},
     # 'kaja godek': {'comm': lambda x: "***** ***", 'args': [], 'summary': ''}
 })
 
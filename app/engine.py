@@ -3,10 +3,15 @@ from __future__ import annotations
 import json
 import logging
 import logging as log
+import multiprocessing
 import os
 import typing as tp
+from collections import namedtuple
+from functools import wraps
+from time import perf_counter
 
 import pop_engine as pop
+from search import Budget, Derivation, Search, Stats, TranspositionTable, expand
 from tree import *
 
 Module = pop.Module
@@ -17,24 +22,83 @@ Module = pop.Module
 logger = logging.getLogger('engine')
 
 
-def EngineLog(func):
-    def new(*args, **kwargs):
-        logger.debug(
-            f"{func.__name__} with args={str(args)} and kwargs={str(kwargs)}")
-        return func(*args, **kwargs)
-    return new
+# Tracing is switched with `set_tracing` (off by default, as the interface logs DEBUG records to a file);
+# when it's off or the logger ignores the level, traced calls only check these two
+TRACING = False
 
 
-def EngineChangeLog(func):
-    def new(*args, **kwargs):
-        logger.info(
-            f"{func.__name__} with args={str(args)} and kwargs={str(kwargs)}")
-        return func(*args, **kwargs)
-    return new
+def set_tracing(enabled: bool) -> None:
+    """Turns the tracing of the engine and interface calls on or off at runtime"""
+    global TRACING
+    TRACING = enabled
+
+
+def summarize(value: tp.Any) -> str:
+    """Describes a value without its full representation: short strings and numbers are shown, containers by their size"""
+    if isinstance(value, (int, float, bool, type(None))):
+        return repr(value)
+    elif isinstance(value, str):
+        return repr(value) if len(value) <= 40 else f"str[{len(value)}]"
+    try:
+        return f"{type(value).__name__}[{len(value)}]"
+    except TypeError:
+        return type(value).__name__
+
+
+class CallTrace(object):
+    """Message of a traced call; the arguments are summarized only if a handler formats the record"""
+    __slots__ = ('args', 'kwargs', 'result')
+
+    def __init__(self, args: tuple, kwargs: dict, result: tp.Any):
+        self.args = args
+        self.kwargs = kwargs
+        self.result = result
+
+    def __str__(self) -> str:
+        args = [summarize(i) for i in self.args] + [f"{i}={summarize(j)}" for i, j in self.kwargs.items()]
+        return f"({', '.join(args)}) -> {summarize(self.result)}"
+
+
+def traced(log: logging.Logger, level: int) -> tp.Callable[[tp.Callable], tp.Callable]:
+    """Returns a decorator logging the calls of a function: its name, the duration and a summary of the arguments and the result.
+    The record has the fields `call`, `duration` (in seconds) and `failed`, so handlers can use them without parsing the message.
+    Nothing is measured or formatted unless tracing is on and the logger handles the level.
+
+    :param log: Logger to use
+    :type log: logging.Logger
+    :param level: Level of the records
+    :type level: int
+    """
+    def decorator(func: tp.Callable) -> tp.Callable:
+        name = func.__name__
+
+        @wraps(func)
+        def new(*args, **kwargs):
+            if not TRACING or not log.isEnabledFor(level):
+                return func(*args, **kwargs)
+            start = perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                duration = perf_counter()-start
+                log.log(level, "%s failed after %.3f ms %s", name, duration*1000, CallTrace(args, kwargs, e),
+                        extra={'call': name, 'duration': duration, 'failed': True})
+                raise
+            duration = perf_counter()-start
+            log.log(level, "%s took %.3f ms %s", name, duration*1000, CallTrace(args, kwargs, result),
+                    extra={'call': name, 'duration': duration, 'failed': False})
+            return result
+        return new
+    return decorator
+
+
+EngineLog = traced(logger, logging.DEBUG)
+EngineChangeLog = traced(logger, logging.INFO)
 
 
 def DealWithPOP(func):
     """A decorator which convert all PluginErrors to EngineErrors for simpler handling in the UI socket"""
+    @wraps(func)
     def new(*args, **kwargs):
         try:
             return func(*args, **kwargs)
@@ -43,6 +107,34 @@ def DealWithPOP(func):
     return new
 
 
+# Parallel proving
+
+# Worker processes are forked, so they get the plugged plugins and the search without pickling them
+FORK_AVAILABLE = 'fork' in multiprocessing.get_all_start_methods()
+PARALLEL_THRESHOLD = 256    # Nodes a branch is searched for in the session's process before it's given to the workers
+_worker_search = None
+
+
+def _init_worker(search: Search) -> None:
+    """Initializer of the processes of `Session.auto`"""
+    global _worker_search
+    _worker_search = search
+
+
+def _search_worker(task: tuple[tuple[tuple[str]], tuple[tuple[str]]]) -> tuple[tuple[tp.Union[Derivation, None], bool, tp.Union[str, None], Stats], list[tuple]]:
+    """Searches for a derivation of a branch given as (sentences, used sentences); USE `Session.auto` INSTEAD.
+
+    :return: The derivation (or None), `Search.exhausted`, `Search.tripped` and the statistics; entries put into the table
+    :rtype: tuple[tuple[tp.Union[Derivation, None], bool, tp.Union[str, None], Stats], list[tuple]]
+    """
+    branch, used = task
+    _worker_search.reset()
+    _worker_search.table.record()
+    derivation = _worker_search.prove(list(branch), UsedSet(used))
+    found = derivation, _worker_search.exhausted, _worker_search.tripped, _worker_search.stats()
+    return found, _worker_search.table.recorded()
+
+
 # Exceptions
 
 
@@ -66,6 +158,16 @@ def type_translator(type_):
 # Session
 
 
+class Unplugged(object):
+    """Stands in for the functions of a socket without a plugin"""
+
+    def __init__(self, socket: str):
+        self.socket = socket
+
+    def __getattr__(self, name: str):
+        raise EngineError(f"{self.socket} lacks a plugin")
+
+
 class Session(object):
     """
     Session objects allow the UserInterface plugin to interact with the engine
@@ -73,6 +175,7 @@ class Session(object):
     """
     ENGINE_VERSION = '0.0.1'
     SOCKETS = ('FormalSystem', 'Lexicon', 'Output', 'Auto')
+    Bound = namedtuple('Bound', SOCKETS + ('FormalSystemError',))
 
     def __init__(self, session_ID: str, config_file: str):
         """Initializes an empty Session which reads from the config file
@@ -89,6 +192,9 @@ class Session(object):
                                          self.config['chosen_plugins'].get(name, None)) for name in self.SOCKETS}
         self.sockets["UserInterface"] = pop.DummySocket("UserInterface", os.path.abspath(
             "UserInterface"), self.ENGINE_VERSION, '__template__.py')
+        self.bound = self.Bound(*(self._bind(name) for name in self.SOCKETS), self._bind_error())
+        self.table = TranspositionTable()
+        self.stats = None
 
         self.defined = {}
         self.proof = None
@@ -108,6 +214,22 @@ class Session(object):
             raise EngineError(f"There is no socket named {socket}")
         else:
             return sock()
+
+
+    def _bind(self, socket: str) -> tp.Union[tuple[tp.Callable], Unplugged]:
+        """Resolves the functions of the plugin in the socket (see `pop.Socket.bind`)"""
+        try:
+            return self.sockets[socket].bind()
+        except pop.PluginError:
+            return Unplugged(socket)
+
+
+    def _bind_error(self) -> tp.Union[type, tuple]:
+        """Resolves the exception raised by the rules of the FormalSystem plugin; an empty tuple (catching nothing) if there is no plugin"""
+        try:
+            return self.sockets['FormalSystem']().utils.FormalSystemError
+        except pop.PluginError:
+            return ()
             
 
     @EngineChangeLog
@@ -137,6 +259,15 @@ class Session(object):
         except (pop.PluginError, pop.LackOfFunctionsError, pop.FunctionInterfaceError, pop.VersionError) as e:
             raise EngineError(str(e))
             
+        # Functions of the old plugin can't be used anymore
+        if socket_name in self.SOCKETS:
+            self.bound = self.bound._replace(**{socket_name: self._bind(socket_name)})
+        if socket_name == 'FormalSystem':
+            self.bound = self.bound._replace(FormalSystemError=self._bind_error())
+        # and what was found with them is forgotten
+        if socket_name in ('FormalSystem', 'Auto'):
+            self.table.clear()
+
         # Config editing
         self.config['chosen_plugins'][socket_name] = new
         self.write_config()
@@ -202,8 +333,8 @@ class Session(object):
         :raises ValueError: Wrong statement syntax
         """
         try:
-            tokenized = self.acc('Lexicon').tokenize(
-                statement, self.acc('FormalSystem').get_used_types(), self.defined)
+            tokenized = self.bound.Lexicon.tokenize(
+                statement, self.bound.FormalSystem.get_used_types(), self.defined)
         except self.acc('Lexicon').utils.CompilerError as e:
             raise EngineError(str(e))
         problem = None#self.acc('FormalSystem').check_syntax(tokenized)
@@ -211,8 +342,8 @@ class Session(object):
             logger.warning(f"{statement} is not a valid statement \n{problem}")
             raise EngineError(f"Syntax error: {problem}")
         else:
-            tokenized = self.acc('FormalSystem').prepare_for_proving(tokenized)
-            self.proof = Tree(tokenized, branch_name='Linen')
+            tokenized = self.bound.FormalSystem.prepare_for_proving(tokenized)
+            self.proof = Tree(tokenized, branch_name='Linen', literal=self.bound.FormalSystem.get_literal, history=History())
             self.branch = 'Linen'
 
 
@@ -222,6 +353,53 @@ class Session(object):
         self.branch = ''
 
 
+    @EngineLog
+    def save_proof(self, path: str) -> None:
+        """Writes the proof to a binary snapshot (see `Tree.dump`), which can be restored with `load_proof`
+
+        :param path: Path of the snapshot; it's replaced only after the whole proof has been written
+        :type path: str
+        :raises EngineError: No proof started or the file couldn't be written
+        """
+        if not self.proof:
+            raise EngineError("There is no proof started")
+
+        meta = {'FormalSystem': self.sockets['FormalSystem'].get_plugin_name(), 'branch': self.branch}
+        temp = f"{path}.{os.getpid()}"
+        try:
+            with open(temp, 'wb') as f:
+                self.proof.dump(f, meta)
+            os.replace(temp, path)
+        except (OSError, TreeError) as e:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise EngineError(f"Proof couldn't be saved: {e}")
+
+
+    @EngineLog
+    @DealWithPOP
+    def load_proof(self, path: str) -> None:
+        """Replaces the proof with one restored from a snapshot written by `save_proof`
+
+        :param path: Path of the snapshot
+        :type path: str
+        :raises EngineError: The file couldn't be read, isn't a valid snapshot or was saved with another FormalSystem plugin
+        """
+        FS = self.sockets['FormalSystem'].get_plugin_name()
+        try:
+            with open(path, 'rb') as f:
+                proof, meta = Tree.load(f, literal=self.bound.FormalSystem.get_literal, expected={'FormalSystem': FS},
+                                        history=History())
+        except (OSError, TreeError) as e:
+            raise EngineError(f"Proof couldn't be loaded: {e}")
+
+        self.proof = proof
+        if meta.get('branch') in proof.leaves:
+            self.branch = meta['branch']
+        else:
+            self.branch = next(iter(proof.leaves))
+
+
     @EngineLog
     @DealWithPOP
     def deal_contradiction(self, branch_name: str) -> tp.Union[None, str]:
@@ -240,12 +418,17 @@ class Session(object):
             else:
                 raise e
         
-        # Branch checking
-        out = self.acc('FormalSystem').check_contradict(branch, used)
+        # Branch checking; indexed sentences only need hash lookups
+        found = self.proof.getleaves(branch_name)[0].find_contradicting(branch[-2:])
+        if found is False:
+            out = self.bound.FormalSystem.check_contradict(branch, used)
+        elif found is not None:
+            out = self.bound.FormalSystem.check_contradict(list(found), used)
+        else:
+            out = None
         if out:
             code, printed, info = out
-            EngineLog(
-                f"Closing {branch_name}: {code=}, {info=}")
+            logger.debug("Closing %s: code=%s, info=%s", branch_name, code, info)
             self.proof.getleaves(branch_name)[0].close(printed, code)
             return f"{branch_name}: {info}"
         else:
@@ -254,7 +437,7 @@ class Session(object):
    
     def context_info(self, rule: str):
         """Returns context info for a rule"""
-        return self.acc('FormalSystem').get_needed_context(rule)
+        return self.bound.FormalSystem.get_needed_context(rule)
 
 
     @EngineLog
@@ -262,7 +445,7 @@ class Session(object):
     def use_rule(self, rule: str, context: dict[str, tp.Any], auto: bool = False) -> tp.Union[None, tuple[str]]:
         """Uses a rule of the given name on the current branch of the proof.
         Context allows to give the FormalSystem additional arguments 
-        Use `self.acc('FormalSystem').get_needed_context(rule)` to check for needed context
+        Use `self.context_info(rule)` to check for needed context
 
         :param rule: Rule name (from `FormalSystem` plugin)
         :type rule: str
@@ -275,33 +458,42 @@ class Session(object):
         if not self.proof:
             raise EngineError(
                 "There is no proof started")
-        if not rule in self.acc('FormalSystem').get_rules().keys():
+        FS = self.bound.FormalSystem
+        if not rule in FS.get_rules().keys():
             raise EngineError("No such rule")
         
         # Context checking
-        context_info = self.acc('FormalSystem').get_needed_context(rule)
+        context_info = FS.get_needed_context(rule)
         if {i.variable for i in context_info} != set(context.keys()):
             raise EngineError("Wrong context")
 
+        # A rule used by hand begins a new step of the history, rules used by `auto` belong to its step
+        if not auto:
+            self.proof.history.checkpoint(self.branch)
+
         # Statement and used retrieving
-        branch = self._get_node().getbranch()[0][:]
-        used = self._get_node().get_used()
+        old = self._get_node()
+        branch = old.getbranch()[0]
+        used = old.get_used()
     
-        # Rule execution
+        # Rule execution; in the auto mode the outcome may be known from the search
+        errors = self.bound.FormalSystemError
         try:
-            out, used_extention = self.acc('FormalSystem').use_rule(rule, branch, used, context, auto)
-        except self.acc('FormalSystem').utils.FormalSystemError as e:
+            if auto:
+                out, used_extention = expand(self.table, FS.use_rule, errors, rule, branch, used, context, FS.state_key(branch, used))
+            else:
+                out, used_extention = FS.use_rule(rule, branch, used, context, auto)
+        except errors as e:
             raise EngineError(str(e))
 
         # Adding to used rules and returning
         if out is not None:
-            old = self._get_node()
-            self._get_node().append(out)
+            old.append(out)
             children = old.getchildren()
             
             if not children:
                 assert len(used_extention)==1, "Wrong used_extention length"
-                self._get_node().add_used(used_extention[0])
+                old.add_used(used_extention[0])
                 return (old.name,)
             else:
                 for j, s in zip(children, used_extention):
@@ -311,37 +503,118 @@ class Session(object):
             return None
 
 
+    @EngineLog
     @DealWithPOP
-    def auto(self) -> tuple[str]:
+    def auto(self, parallel: int = 1, budget: Budget = None) -> tuple[str]:
+        """Proves every open branch with a search over the moves proposed by the Auto plugin.
+        Only the found derivations are added to the proof; a branch without one is left open,
+        or closed with code 8 if the search was complete and no derivation exists.
+        If the budget is exceeded, the part of the derivation which doesn't need searching is added
+        to the branch being searched and the other branches are left as they were.
+        Statistics of the search are kept in `self.stats`
+
+        :param parallel: Amount of processes searching the open branches (forked, so only where fork is available),
+            at most one per CPU. Derivations are added in the order of the branches, so the proof is the same as with one process
+        :type parallel: int
+        :param budget: Limits of the search. The rule and node limits apply to every branch and make the proof
+            the same with any amount of processes; the time and memory limits are shared by all branches
+        :type budget: Budget
+        """
         # Tests
         if not self.proof:
             raise EngineError("There is no proof started")
-        if self.sockets['FormalSystem'].get_plugin_name() not in self.acc('Auto').compatible():
+        if self.sockets['FormalSystem'].get_plugin_name() not in self.bound.Auto.compatible():
             raise EngineError(f"Plugin {self.sockets['Auto'].get_plugin_name()} doesn't support proving in {self.sockets['FormalSystem'].get_plugin_name()}")
 
-        black = set()
-        out = []
-        while len(leaves := [i.name for i in self.proof.getopen() if not i.name in black])>0:
-            
-            out.append(f"Jumping to {leaves[0]} branch")
-            self.jump(leaves[0])
-
-            info, branches = self.acc('Auto').solve(self.use_rule, self._get_node().getbranch()[0])
-            if info:
-                out.append(info)
-                if info=="Branch always loops":
-                    self.proof.getleaves(leaves[0])[0].close("...", 8)
-                    black.add(leaves[0])
-                    continue
-                for branch in branches:
-                    o = self.deal_contradiction(branch)
-                    if o:
-                        out.append(o)
+        FS = self.bound.FormalSystem
+        try:
+            search = Search(FS.use_rule, FS.check_contradict, self.bound.Auto.propose,
+                            self.bound.FormalSystemError, self.table, budget=budget, key=FS.state_key)
+        except ValueError as e:
+            raise EngineError(str(e))
+        self.proof.history.checkpoint(self.branch)
+
+        # Derivations close every branch they make, so the open branches are known beforehand
+        leaves = [self.proof.leaves[name] for name in self.proof.leaves.open_names()]
+        processes = min(parallel, os.cpu_count() or 1, len(leaves)) if FORK_AVAILABLE else 1
+        if processes > 1:
+            self.stats = search.stats()
+            return self._auto_commit(leaves, self._auto_parallel(search, leaves, processes))
+        else:
+            found = ((search.prove(leaf.getbranch()[0], leaf.get_used()), search.exhausted, search.tripped, None)
+                     for leaf in leaves)
+            try:
+                return self._auto_commit(leaves, found)
+            finally:
+                self.stats = search.stats()
+
+
+    def _auto_parallel(self, search: Search, leaves: list[Tree], processes: int
+                       ) -> tp.Iterator[tuple[tp.Union[Derivation, None], bool, tp.Union[str, None], Stats]]:
+        """Searches the leaves for `auto` in worker processes, yields the outcomes in the order of the leaves.
+        Forking costs more than most searches, so every leaf is first searched here for up to `PARALLEL_THRESHOLD` nodes
+        and only the leaves which need more are given to the workers (if there are at least two of them).
+        Entries the workers put into their tables are added to the table of the session."""
+        budget = search.budget
+        limit = PARALLEL_THRESHOLD if budget.nodes is None else min(budget.nodes, PARALLEL_THRESHOLD)
+        found, tasks = [], []
+        for leaf in leaves:
+            probe = Search(search.use_rule, search.check_contradict, search.propose, search.errors, search.table,
+                           search.max_depth, budget._replace(nodes=limit), search.isolated, search.key)
+            probe.deadline = search.deadline
+            branch, used = leaf.getbranch()[0], leaf.get_used()
+            derivation = probe.prove(branch, used)
+            if probe.tripped == 'nodes' and (budget.nodes is None or limit < budget.nodes):
+                tasks.append((len(found), (tuple(tuple(i) for i in branch), tuple(used))))
+                found.append(probe.stats())
             else:
-                black.add(leaves[0])
-                out.append("Couldn't perform any actions")
+                found.append((derivation, probe.exhausted, probe.tripped, probe.stats()))
+
+        if len(tasks) == 1:
+            i, (branch, used) = tasks[0]
+            search.reset()
+            derivation = search.prove(list(branch), UsedSet(used))
+            found[i] = (derivation, search.exhausted, search.tripped, found[i].merge(search.stats()))
+            tasks = []
+        if not tasks:
+            yield from found
+            return
+
+        context = multiprocessing.get_context('fork')
+        with context.Pool(min(processes, len(tasks)), _init_worker, (search,)) as pool:
+            results = pool.imap(_search_worker, [task for _, task in tasks])
+            for i, outcome in enumerate(found):
+                if isinstance(outcome, Stats):
+                    (derivation, exhausted, tripped, stats), entries = next(results)
+                    self.table.update(entries)
+                    outcome = (derivation, exhausted, tripped, outcome.merge(stats))
+                yield outcome
+
+
+    def _auto_commit(self, leaves: list[Tree],
+                     found: tp.Iterable[tuple[tp.Union[Derivation, None], bool, tp.Union[str, None], tp.Union[Stats, None]]]) -> list[str]:
+        """Adds the derivations found by `auto` to the leaves; statistics given with them are added to `self.stats`"""
+        out = []
+        for leaf, (derivation, exhausted, tripped, branch_stats) in zip(leaves, found):
+            name = leaf.name
+            out.append(f"Jumping to {name} branch")
+            if branch_stats is not None:
+                self.stats = self.stats.merge(branch_stats)
+
+            if tripped:
+                if derivation is not None:
+                    out.extend(self._commit(name, derivation))
+                out.append(f"Search stopped, the {tripped} budget was exceeded")
+                break
+            elif derivation is None:
+                if exhausted:
+                    leaf.close("...", 8)
+                    out.append("Branch can't be proven")
+                else:
+                    out.append("Couldn't find a proof")
                 continue
-            
+            out.extend(self._commit(name, derivation))
+
             ended, closed = self.proof_finished()
             if closed:
                 out.append("Proof was succesfully finished")
@@ -355,6 +628,67 @@ class Session(object):
         return out
 
 
+    def _commit(self, name: str, derivation: Derivation) -> list[str]:
+        """Uses the rules of a derivation found by `auto` on the branch of the given name"""
+        if derivation.rule is None:
+            return [self.deal_contradiction(name)]
+        self.branch = name
+        names = self.use_rule(derivation.rule, dict(derivation.context), True)
+        out = [f"Performed {' '.join((derivation.rule, *(str(i) for i in derivation.context.values())))}"]
+        for child, child_derivation in zip(names, derivation.children):
+            if child_derivation is not None:  # Not derived in a partial derivation
+                out.extend(self._commit(child, child_derivation))
+        return out
+
+
+    # History
+
+
+    def undo(self) -> None:
+        """Reverts the last step of the proof: a rule used by hand (with the closures found after it) or a whole `auto` run.
+        Nothing is computed again, the changes are reverted from the history of the proof"""
+        if not self.proof:
+            raise EngineError("There is no proof started")
+        if (step := self.proof.history.undo()) is None:
+            raise EngineError("There is nothing to undo")
+        self._restore_branch(step[1])
+
+
+    def redo(self) -> None:
+        """Applies the last undone step again"""
+        if not self.proof:
+            raise EngineError("There is no proof started")
+        if (step := self.proof.history.redo()) is None:
+            raise EngineError("There is nothing to redo")
+        self._restore_branch(step[1])
+
+
+    def version(self) -> int:
+        """Returns the version of the proof, which can be restored with `restore`"""
+        if not self.proof:
+            raise EngineError("There is no proof started")
+        return self.proof.history.version()
+
+
+    def restore(self, version: int) -> None:
+        """Brings the proof back (or forward, if it was undone) to the given version"""
+        if not self.proof:
+            raise EngineError("There is no proof started")
+        try:
+            self.proof.history.goto(version)
+        except TreeError as e:
+            raise EngineError(str(e))
+        self._restore_branch(None)
+
+
+    def _restore_branch(self, branch: tp.Union[str, None]) -> None:
+        """Sets the active branch after the proof was changed by the history, keeps the old one if it still exists"""
+        if branch in self.proof.leaves:
+            self.branch = branch
+        elif self.branch not in self.proof.leaves:
+            self.branch = next(iter(self.proof.leaves))
+
+
     # Proof navigation
 
 
@@ -368,8 +702,8 @@ class Session(object):
                 f"Branch '{self.branch}' doesn't exist in this proof")
         except AttributeError:
             raise EngineError("There is no proof started")
-        reader = lambda x: self.acc('Output').get_readable(x, self.acc('Lexicon').get_lexem)
-        return [reader(i) for i in branch], closed
+        get_readable, get_lexem = self.bound.Output.get_readable, self.bound.Lexicon.get_lexem
+        return [get_readable(i, get_lexem) for i in branch], closed
 
 
     def getbranches(self):
@@ -384,7 +718,7 @@ class Session(object):
     @DealWithPOP
     def getrules(self):
         """Returns all rule names"""
-        return self.acc('FormalSystem').get_rules()
+        return self.bound.FormalSystem.get_rules()
 
 
     @DealWithPOP
@@ -395,7 +729,7 @@ class Session(object):
                 "There is no proof started")
         
         printed = self.proof.gettree()
-        return self.acc('Output').write_tree(printed, self.acc('Lexicon').get_lexem)
+        return self.bound.Output.write_tree(printed, self.bound.Lexicon.get_lexem)
 
 
     def next(self) -> None:
@@ -403,14 +737,9 @@ class Session(object):
         if not self.proof:
             raise EngineError("There is no proof started")
 
-        for name, tree in self.proof.leaves.items():
-            if name == self.branch:
-                continue
-            elif tree.closed:
-                continue
-            else:
-                self.branch = name
-                return f"Branch changed to {name}"
+        if (leaf := self.proof.first_open((self.branch,))) is not None:
+            self.branch = leaf.name
+            return f"Branch changed to {leaf.name}"
         raise EngineError("All branches are closed")
 
     
@@ -6,7 +6,7 @@ import os
 import sys
 import shutil
 import typing as tp
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple
 
 Module = type(tp)
 
@@ -92,6 +92,20 @@ class Socket(object):
     def get_plugin_name(self):
         return self.__call__().__name__
 
+    def bind(self) -> tuple[tp.Callable]:
+        """Returns the functions of the plugged module required by the template as a named tuple.
+        The functions are resolved once, so calling them skips the socket; bind again after plugging another plugin
+
+        Raises:
+            PluginError: Raised if nothing is plugged in
+
+        Returns:
+            tuple[tp.Callable]: Named tuple of the functions (named after the socket)
+        """
+        plugin = self.__call__()
+        handles = namedtuple(self.name, self.func_names)
+        return handles(*(getattr(plugin, i) for i in self.func_names))
+
     def isplugged(self):
         return bool(self.plug)
 
@@ -0,0 +1,436 @@
+"""Proof search used by `Session.auto`
+
+The search works on copies of branches (the sentences and the persistent used set of the branch),
+so the proof is left untouched until a derivation is found. The engine then uses the rules of the derivation on the proof.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import typing as tp
+from collections import OrderedDict, namedtuple
+from math import inf
+from time import monotonic, perf_counter
+
+from tree import UsedSet
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# rule is None if the branch is closed; in a partial derivation children which weren't derived are None
+Derivation = namedtuple('Derivation', ('rule', 'context', 'children'))
+# Limits of a call of `Session.auto`: rule applications, expanded nodes, seconds and bytes of resident memory
+Budget = namedtuple('Budget', ('rules', 'nodes', 'time', 'memory'), defaults=(None, None, None, None))
+
+MAX_DEPTH = 8
+TABLE_SIZE = 2**16
+CHECK_EVERY = 64  # Amount of nodes between the checks of the clock and the memory
+
+
+class Stats(namedtuple('Stats', ('nodes', 'rules', 'max_depth', 'cache_hits', 'cache_misses', 'time', 'rule_time'))):
+    """Statistics of a search: expanded nodes, rule applications (also the ones taken from the table),
+    the length of the longest path, hits and misses of the transposition table, seconds spent searching
+    and `{rule: (calls, seconds)}` of the calls of `FormalSystem.use_rule`
+    """
+    __slots__ = ()
+
+    @property
+    def rules_per_second(self) -> float:
+        return self.rules/self.time if self.time else 0.0
+
+    @property
+    def time_per_rule(self) -> dict[str, float]:
+        """Average time of a call of `FormalSystem.use_rule` for every rule"""
+        return {rule: seconds/calls for rule, (calls, seconds) in self.rule_time.items()}
+
+    def merge(self, other: Stats) -> Stats:
+        """Adds up statistics of two searches"""
+        rule_time = dict(self.rule_time)
+        for rule, (calls, seconds) in other.rule_time.items():
+            old = rule_time.get(rule, (0, 0.0))
+            rule_time[rule] = (old[0]+calls, old[1]+seconds)
+        return Stats(self.nodes+other.nodes, self.rules+other.rules, max(self.max_depth, other.max_depth),
+                     self.cache_hits+other.cache_hits, self.cache_misses+other.cache_misses,
+                     self.time+other.time, rule_time)
+
+
+class BudgetExceeded(Exception):
+    """Stops the search when a limit of the budget is reached; `Search.prove` handles it"""
+
+    def __init__(self, limit: str):
+        super().__init__(f"Budget exceeded: {limit}")
+        self.limit = limit
+
+
+def memory_used() -> tp.Union[int, None]:
+    """Returns the resident memory of the process in bytes. Without /proc the peak resident memory is returned;
+    None if neither can be read"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes everywhere except macOS
+    return peak if sys.platform == 'darwin' else peak*1024
+
+
+def state_key(branch: tp.Sequence[tp.Sequence[str]], used: UsedSet) -> tuple[tuple[str], frozenset]:
+    """Key of a branch of a sequent calculus, where the rules only read the last sentence and the used set;
+    `FormalSystem.state_key` gives keys shared by more branches"""
+    return tuple(branch[-1]), frozenset(used)
+
+
+class TranspositionTable(object):
+    """Remembers what is known about states of branches, so that sequents repeated in other branches
+    (or in the next round of iterative deepening) aren't expanded and searched again.
+    The least recently used entries are evicted when the table is full.
+
+    Entries:
+        ('expand', rule, context, sentence, state) -> outcome of `FormalSystem.use_rule` on the branch ending with the sentence
+                                                     or the error it raised
+        ('result', state) -> (depth, `Derivation`, sentence) if the state was proven on a branch ending with the sentence,
+                             otherwise the greatest depth at which the search failed (`inf` if it can't be proven)
+    """
+
+    def __init__(self, size: int = TABLE_SIZE):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._recorded = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: tp.Hashable, default: tp.Any = None) -> tp.Any:
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: tp.Hashable, value: tp.Any) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if self._recorded is not None:
+            self._recorded[key] = None
+        if len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def items(self) -> list[tuple[tp.Hashable, tp.Any]]:
+        """Returns the entries from the least recently used one"""
+        return list(self._entries.items())
+
+    def update(self, entries: tp.Iterable[tuple[tp.Hashable, tp.Any]]) -> None:
+        """Puts the (key, value) pairs into the table"""
+        for key, value in entries:
+            self.put(key, value)
+
+    def record(self) -> None:
+        """Starts remembering which entries are put into the table, see `recorded`"""
+        self._recorded = dict()
+
+    def recorded(self) -> list[tuple[tp.Hashable, tp.Any]]:
+        """Stops recording and returns the entries put into the table since `record` which are still in it"""
+        keys, self._recorded = self._recorded or (), None
+        return [(key, self._entries[key]) for key in keys if key in self._entries]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+def expand(table: TranspositionTable, use_rule: tp.Callable, errors: tp.Union[type, tuple[type]],
+           rule: str, branch: tp.Sequence[tp.Sequence[str]], used: UsedSet, context: dict[str, tp.Any],
+           state: tuple = None) -> tuple:
+    """Uses a rule like `FormalSystem.use_rule` in the auto mode; the outcome (or the error) is taken from the table if it's there.
+    Outcomes point at formulas by their position, so they are looked up with the exact last sentence
+
+    :param state: Key of the branch (`state_key` if not given)
+    :type state: tp.Hashable
+    """
+    key = ('expand', rule, tuple(context.items()), tuple(branch[-1]), state or state_key(branch, used))
+    found = table.get(key)
+    if found is None:
+        try:
+            found = use_rule(rule, branch, used, dict(context), True)
+        except errors as e:
+            found = e
+        table.put(key, found)
+    if isinstance(found, Exception):
+        raise found.with_traceback(None)
+    return found
+
+
+class Search(object):
+    """Depth-first search with backtracking over the moves proposed by the Auto plugin.
+
+    Invertible moves are used without trying the other moves, as they can't lose a proof.
+    Non-invertible moves are tried one by one and limited with iterative deepening:
+    a search of depth d uses at most d of them on every path of the derivation.
+
+    The rule and node limits of the budget apply to every `prove` call, the clock is shared by all of them
+    (it starts when the search is made). If a limit is reached, `prove` returns a partial derivation and `tripped` names the limit.
+    With a rule or node limit every `prove` call searches with a table of its own, whose entries are added to the shared table
+    afterwards, so the counts (and so the outcome) don't depend on what earlier searches left in the table.
+    """
+
+    def __init__(self, use_rule: tp.Callable, check_contradict: tp.Callable, propose: tp.Callable,
+                 errors: tp.Union[type, tuple[type]], table: TranspositionTable = None, max_depth: int = MAX_DEPTH,
+                 budget: Budget = None, isolated: bool = None, key: tp.Callable = state_key):
+        """
+        :param use_rule: `FormalSystem.use_rule`
+        :param check_contradict: `FormalSystem.check_contradict`
+        :param propose: `Auto.propose`
+        :param errors: Exceptions meaning that a rule can't be used (ex. because of loop detection)
+        :type errors: tp.Union[type, tuple[type]]
+        :param table: Table shared by the searches of a session, a new one is used if not given
+        :type table: TranspositionTable
+        :param max_depth: Maximal amount of non-invertible moves on a path
+        :type max_depth: int
+        :param budget: Limits of the search, unlimited if not given
+        :type budget: Budget
+        :param isolated: Whether every `prove` call uses a table of its own, defaults to whether the budget limits rules or nodes
+        :type isolated: bool
+        :param key: `FormalSystem.state_key`, the key of a branch in the table, defaults to `state_key`
+        :type key: tp.Callable
+        :raises ValueError: The budget limits memory, which can't be measured here
+        """
+        if budget is not None and budget.memory is not None and memory_used() is None:
+            raise ValueError("Memory can't be measured on this platform, so it can't be limited")
+        self.use_rule = use_rule
+        self.check_contradict = check_contradict
+        self.propose = propose
+        self.errors = errors
+        self.key = key
+        self.table = table if table is not None else TranspositionTable()
+        self.max_depth = max_depth
+        self.budget = budget if budget is not None else Budget()
+        self.deadline = monotonic() + self.budget.time if self.budget.time is not None else None
+        if isolated is None:
+            isolated = self.budget.rules is not None or self.budget.nodes is not None
+        self.isolated = isolated
+        self._cutoff = False
+        self._node_limit = self._rule_limit = inf
+        self.reset()
+
+    def reset(self) -> None:
+        """Zeroes the statistics and forgets the outcome of the last `prove` call"""
+        self.exhausted = False
+        self.tripped = None
+        self.nodes = 0
+        self.rules = 0
+        self.max_level = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.time = 0.0
+        self.rule_time = dict()
+
+    def stats(self) -> Stats:
+        """Returns the statistics of the searches since the last `reset`"""
+        return Stats(self.nodes, self.rules, self.max_level, self.cache_hits, self.cache_misses, self.time, dict(self.rule_time))
+
+    def prove(self, branch: list[tp.Sequence[str]], used: UsedSet) -> tp.Union[Derivation, None]:
+        """Searches for a derivation closing every branch grown from the given one.
+        If none is found, `exhausted` tells whether the search was complete or stopped by `max_depth`.
+        If the budget was exceeded, `tripped` is set and the returned derivation is partial (see `partial`)
+
+        :param branch: Sentences of the branch
+        :type branch: list[tp.Sequence[str]]
+        :param used: Used set of the branch
+        :type used: UsedSet
+        :return: The derivation or None
+        :rtype: tp.Union[Derivation, None]
+        """
+        branch = list(branch)
+        start = perf_counter()
+        shared = self.table
+        if self.isolated:
+            self.table = TranspositionTable(shared.size)
+        hits, misses = self.table.hits, self.table.misses
+        budget = self.budget
+        self._node_limit = self.nodes + budget.nodes if budget.nodes is not None else inf
+        self._rule_limit = self.rules + budget.rules if budget.rules is not None else inf
+        self.tripped = None
+        try:
+            self._check()
+            for depth in range(self.max_depth+1):
+                self._cutoff = False
+                found = self._prove(branch, used, depth, 0)
+                if found is not None or not self._cutoff:
+                    break
+            self.exhausted = found is None and not self._cutoff
+        except BudgetExceeded as e:
+            self.tripped = e.limit
+            self.exhausted = False
+            found = self.partial(branch, used)
+        finally:
+            self.cache_hits += self.table.hits - hits
+            self.cache_misses += self.table.misses - misses
+            if self.table is not shared:
+                shared.update(self.table.items())
+                self.table = shared
+            self.time += perf_counter() - start
+        return found
+
+    def partial(self, branch: list[tp.Sequence[str]], used: UsedSet) -> tp.Union[Derivation, None]:
+        """Returns the part of a derivation that doesn't need searching: closures, derivations found before
+        and invertible moves. Children which would need the search are None; None is returned if nothing can be done"""
+        state = self.key(branch, used)
+        known = self.table.get(('result', state))
+        if isinstance(known, tuple) and (found := self._reuse(known, branch, used)) is not None:
+            return found
+        closed = self.check_contradict(branch, used)
+        if closed:
+            return Derivation(None, None, ()) if closed[0] == 1 else None
+
+        for move in self.propose(branch):
+            if not move.invertible:
+                continue
+            try:
+                out, used_extention = expand(self.table, self.use_rule, self.errors, move.rule, branch, used, move.context, state)
+            except self.errors:
+                continue
+            if out is None:
+                continue
+            return Derivation(move.rule, move.context, tuple(self.partial(branch + list(new), used.apply_codes(extention))
+                                                              for new, extention in zip(out, used_extention)))
+        return None
+
+    def _reuse(self, known: tuple, branch: list[tp.Sequence[str]], used: UsedSet) -> tp.Union[Derivation, None]:
+        """Returns the derivation of a ('result', state) entry for a branch with the same key"""
+        derivation, sentence = known[1], known[2]
+        if sentence == tuple(branch[-1]):
+            return derivation
+        return self._transport(derivation, list(branch[:-1]) + [sentence], branch, used)
+
+    def _transport(self, derivation: Derivation, source: list[tp.Sequence[str]], branch: list[tp.Sequence[str]],
+                   used: UsedSet) -> tp.Union[Derivation, None]:
+        """Rebuilds a derivation of the source branch for a branch with the same key, but another last sentence.
+        Contexts point at formulas by their position, so every move is replaced with the proposed move of the same rule
+        whose children have the same keys as the children of the source. Returns None if there is no such move.
+
+        :param derivation: Derivation of the source branch
+        :type derivation: Derivation
+        :param source: Branch the derivation was found for
+        :type source: list[tp.Sequence[str]]
+        """
+        if derivation is None or derivation.rule is None or tuple(source[-1]) == tuple(branch[-1]):
+            return derivation
+        try:
+            out, used_extention = expand(self.table, self.use_rule, self.errors, derivation.rule, source, used, derivation.context)
+        except self.errors:
+            return None
+        if out is None:
+            return None
+        sources = [source + list(new) for new in out]
+        wanted = [self.key(new, used.apply_codes(extention)) for new, extention in zip(sources, used_extention)]
+
+        for move in self.propose(branch):
+            if move.rule != derivation.rule:
+                continue
+            try:
+                out, used_extention = expand(self.table, self.use_rule, self.errors, move.rule, branch, used, move.context)
+            except self.errors:
+                continue
+            if out is None or len(out) != len(wanted):
+                continue
+            children = [(branch + list(new), used.apply_codes(extention)) for new, extention in zip(out, used_extention)]
+            if [self.key(*child) for child in children] != wanted:
+                continue
+            moved = tuple(self._transport(*args) for args in zip(derivation.children, sources, *zip(*children)))
+            if None not in moved:
+                return Derivation(move.rule, move.context, moved)
+        return None
+
+    def _check(self) -> None:
+        """Raises BudgetExceeded if the time or the memory limit was reached"""
+        if self.deadline is not None and monotonic() > self.deadline:
+            raise BudgetExceeded('time')
+        if self.budget.memory is not None and memory_used() > self.budget.memory:
+            raise BudgetExceeded('memory')
+
+    def _use_rule(self, rule: str, *args) -> tuple:
+        """`FormalSystem.use_rule` with its time measured"""
+        start = perf_counter()
+        try:
+            return self.use_rule(rule, *args)
+        finally:
+            calls, seconds = self.rule_time.get(rule, (0, 0.0))
+            self.rule_time[rule] = (calls+1, seconds+perf_counter()-start)
+
+    def _prove(self, branch: list[tp.Sequence[str]], used: UsedSet, depth: int, level: int) -> tp.Union[Derivation, None]:
+        state = self.key(branch, used)
+        sentence = tuple(branch[-1])
+        known = self.table.get(('result', state))
+        if isinstance(known, tuple):
+            # A derivation is reused only at its depth, as a deeper search could find another one first;
+            # this way the outcome doesn't depend on what's in the table
+            if known[0] == depth and (found := self._reuse(known, branch, used)) is not None:
+                return found
+        elif known is not None and known >= depth:
+            self._cutoff |= known < inf
+            return None
+
+        # Failures caused by the depth limit are told apart from the final ones
+        cutoff, self._cutoff = self._cutoff, False
+        found = self._search(branch, used, depth, level, state)
+        if found is not None:
+            self.table.put(('result', state), (depth, found, sentence))
+        else:
+            self.table.put(('result', state), depth if self._cutoff else inf)
+        self._cutoff |= cutoff
+        return found
+
+    def _search(self, branch: list[tp.Sequence[str]], used: UsedSet, depth: int, level: int, state: tuple) -> tp.Union[Derivation, None]:
+        # A limit of n means that at most n nodes are expanded (and n rules used); the clock and the memory are checked every CHECK_EVERY nodes
+        if self.nodes >= self._node_limit:
+            raise BudgetExceeded('nodes')
+        if self.nodes % CHECK_EVERY == 0:
+            self._check()
+        self.nodes += 1
+        if level > self.max_level:
+            self.max_level = level
+
+        closed = self.check_contradict(branch, used)
+        if closed:
+            return Derivation(None, None, ()) if closed[0] == 1 else None
+
+        for move in self.propose(branch):
+            if not move.invertible and depth == 0:
+                self._cutoff = True
+                continue
+
+            if self.rules >= self._rule_limit:
+                raise BudgetExceeded('rules')
+            self.rules += 1
+            try:
+                out, used_extention = expand(self.table, self._use_rule, self.errors,
+                                             move.rule, branch, used, move.context, state)
+            except self.errors:
+                continue
+            if out is None:
+                continue
+
+            left = depth if move.invertible else depth-1
+            children = []
+            for new, extention in zip(out, used_extention):
+                child = self._prove(branch + list(new), used.apply_codes(extention), left, level+1)
+                if child is None:
+                    break
+                children.append(child)
+            else:
+                return Derivation(move.rule, move.context, tuple(children))
+
+            if move.invertible:
+                return None
+        return None
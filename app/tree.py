@@ -1,8 +1,11 @@
 from __future__ import annotations
 
 import typing as tp
-import json, random
+import gc, json, random, struct, sys
+from bisect import bisect_left, bisect_right
 from collections import namedtuple, OrderedDict
+from collections.abc import Mapping, Sequence, Set
+from itertools import islice
 from string import ascii_uppercase as alphabet
 from math import inf as INFINITY
 
@@ -10,7 +13,13 @@ with open('colors.json') as f:
     colors = list(json.load(f).keys())
 
 Sentence = tp.NewType("Sentence", list[str])
-PrintedTree = namedtuple('PrintedTree', ('sentences', 'children', 'closer'))
+PrintedTree = namedtuple('PrintedTree', ('sentences', 'children', 'closer', 'cache'), defaults=(None,))
+Operation = namedtuple('Operation', ('kind', 'node', 'old', 'new'))
+
+# Binary snapshots of proofs (see `Tree.dump`)
+SNAPSHOT_MAGIC = b'LPPF'
+SNAPSHOT_VERSION = 1
+NODE_FIELDS = 6  # parent, name, closure code, closure info, amount of statements, used set mode
 
 
 class TreeError(Exception):
@@ -18,7 +27,503 @@ class TreeError(Exception):
         super().__init__(msg, *args, **kwargs)
 
 
+def _write_array(file: tp.BinaryIO, typecode: str, items: tp.Iterable[int]) -> None:
+    """Writes a length-prefixed little-endian array of integers; `typecode` is a `struct` format character,
+    which has the standard size whatever the platform ('B' 1 byte, 'I' and 'i' 4 bytes)"""
+    items = items if isinstance(items, (bytes, list)) else list(items)
+    file.write(struct.pack(f'<Q{len(items)}{typecode}', len(items), *items))
+
+
+def _read_bytes(file: tp.BinaryIO, size: int) -> bytes:
+    data = file.read(size)
+    if len(data) != size:
+        raise TreeError("Snapshot is truncated")
+    return data
+
+
+def _read_array(file: tp.BinaryIO, typecode: str) -> tuple[int]:
+    """Reads an array written by `_write_array`"""
+    length, = struct.unpack('<Q', _read_bytes(file, 8))
+    return struct.unpack(f'<{length}{typecode}', _read_bytes(file, length*struct.calcsize(f'<{typecode}')))
+
+
+class NameAllocator(object):
+    """Gives out unique branch names: the colors in random order first (so the interface can color the branches),
+    then numbers. Names taken in any other way should be reserved."""
+
+    def __init__(self, palette: tp.Iterable[str], rng: random.Random = random):
+        self._palette = list(palette)
+        rng.shuffle(self._palette)
+        self._taken = set()
+        self._counter = 0
+
+    def reserve(self, name: str) -> None:
+        """Marks the name as taken"""
+        self._taken.add(name)
+
+    def allocate(self) -> str:
+        """Returns a new name and marks it as taken"""
+        while self._palette:
+            name = self._palette.pop()
+            if name not in self._taken:
+                self._taken.add(name)
+                return name
+        while True:
+            self._counter += 1
+            name = str(self._counter)
+            if name not in self._taken:
+                self._taken.add(name)
+                return name
+
+
+class Leaves(OrderedDict):
+    """Registry of the leaves of a tree (name -> leaf) in the order in which the names were added.
+    Every name is linked with its neighbours and has an ordering key, so neighbours are found in O(1).
+    Reassigning a name (a leaf replaced by its first child) keeps its place.
+    New names for the branches come from `names`.
+    The registry also keeps the open leaves (in the same order) and counts the leaves closed without a proof,
+    so the state of the proof is known without visiting the leaves; leaves report their closure with `_account`.
+    """
+
+    def __init__(self, names: NameAllocator = None):
+        super().__init__()
+        if names is None:
+            names = NameAllocator(colors)
+        self.names = names
+        self._links = dict()     # name -> [previous name, next name]
+        self._order = dict()     # name -> ordering key (grows with every new name)
+        self._last = None
+        self._counter = 0
+        self._open = dict()      # names of the open leaves
+        self._sorted = True      # False if `_open` lost the order of the registry
+        self._stopped = 0        # amount of leaves closed with a code other than 1
+
+    @staticmethod
+    def _kind(closed: tp.Union[tuple[int, str], None]) -> str:
+        if not closed:
+            return 'open'
+        elif closed[0] == 1:
+            return 'proved'
+        else:
+            return 'stopped'
+
+    def _account(self, name: str, old: tp.Union[str, None], new: tp.Union[str, None]) -> None:
+        """Updates the open leaves and the counters after a leaf of the given name changed its kind (None - no leaf)"""
+        if old == new:
+            return
+        if old == 'open':
+            del self._open[name]
+        elif old == 'stopped':
+            self._stopped -= 1
+        if new == 'open':
+            if self._open and self._order[next(reversed(self._open))] > self._order[name]:
+                self._sorted = False
+            self._open[name] = None
+        elif new == 'stopped':
+            self._stopped += 1
+
+    def __setitem__(self, name: str, leaf: Tree) -> None:
+        old = super().get(name)
+        if name not in self._links:
+            self._links[name] = [self._last, None]
+            if self._last is not None:
+                self._links[self._last][1] = name
+            self._last = name
+            self._order[name] = self._counter
+            self._counter += 1
+            self.names.reserve(name)
+        super().__setitem__(name, leaf)
+        self._account(name, None if old is None else self._kind(old.closed), self._kind(leaf.closed))
+
+    def __delitem__(self, name: str) -> None:
+        self._account(name, self._kind(self[name].closed), None)
+        super().__delitem__(name)
+        previous, following = self._links.pop(name)
+        del self._order[name]
+        if previous is not None:
+            self._links[previous][1] = following
+        if following is not None:
+            self._links[following][0] = previous
+        else:
+            self._last = previous
+
+    def pop(self, name: str, *default):
+        if name in self._links:
+            leaf = self[name]
+            del self[name]
+            return leaf
+        return super().pop(name, *default)
+
+    def popitem(self, last: bool = True) -> tuple[str, Tree]:
+        name = next(reversed(self) if last else iter(self))
+        return name, self.pop(name)
+
+    def clear(self) -> None:
+        super().clear()
+        self._links.clear()
+        self._order.clear()
+        self._last = None
+        self._open.clear()
+        self._sorted = True
+        self._stopped = 0
+
+    def previous(self, name: str) -> tp.Union[str, None]:
+        """Returns the name added right before the given one"""
+        return self._links[name][0]
+
+    def next(self, name: str) -> tp.Union[str, None]:
+        """Returns the name added right after the given one"""
+        return self._links[name][1]
+
+    def position(self, name: str) -> int:
+        """Returns the ordering key of the name; keys of later names are bigger"""
+        return self._order[name]
+
+    def open_names(self) -> tp.Iterator[str]:
+        """Iterates over the names of the open leaves in the order of the registry"""
+        if not self._sorted:
+            self._open = dict.fromkeys(sorted(self._open, key=self._order.__getitem__))
+            self._sorted = True
+        return iter(self._open)
+
+    def open_count(self) -> int:
+        return len(self._open)
+
+    def is_finished(self) -> bool:
+        """Checks if all leaves are closed"""
+        return not self._open
+
+    def is_closed(self) -> bool:
+        """Checks if all leaves are closed with a proof"""
+        return not self._open and not self._stopped
+
+
+class _Layers(object):
+    """Base of the persistent containers: a stack of immutable layers merged like digits of a binary counter.
+    A container has O(log n) layers and every version shares the layers of the version it was made from,
+    so snapshots cost nothing.
+    """
+    __slots__ = ('_items', '_parent', '_len')
+
+    def __init__(self, items: tp.Collection, parent: _Layers = None):
+        self._items = items
+        self._parent = parent
+        self._len = len(items) + (len(parent) if parent is not None else 0)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def _layer(self, key: tp.Hashable) -> tp.Union[_Layers, None]:
+        """Returns the layer holding the key"""
+        hash(key)  # Unhashable keys are refused like in a set, even when there are no layers
+        layer = self
+        while layer is not None:
+            if key in layer._items:
+                return layer
+            layer = layer._parent
+        return None
+
+    def _layers(self) -> tp.Iterator[_Layers]:
+        layer = self
+        while layer is not None:
+            yield layer
+            layer = layer._parent
+
+    def _push(self, items: tp.Collection) -> _Layers:
+        """Returns a new version with the items (not present yet) put on top"""
+        parent = self if self._items else self._parent
+        while parent is not None and len(parent._items) <= len(items):
+            items = self._merge(parent._items, items)
+            parent = parent._parent
+        new = object.__new__(type(self))
+        _Layers.__init__(new, items, parent)
+        return new
+
+
+class UsedSet(_Layers, Set):
+    """Persistent set of the used sentences of a branch; `add` returns a new set, so children share the set of their parent.
+    Small layers are kept as tuples, which take a fraction of the memory of a frozenset.
+    """
+    __slots__ = ()
+    SMALL_LAYER = 8
+
+    @staticmethod
+    def _merge(older: tp.Collection, newer: tuple) -> tp.Collection:
+        if isinstance(older, tuple) and len(older) + len(newer) <= UsedSet.SMALL_LAYER:
+            return older + newer
+        return frozenset(older).union(newer)
+
+    def __init__(self, items: tp.Iterable[tp.Hashable] = ()):
+        super().__init__(frozenset(items))
+
+    def __contains__(self, item: tp.Hashable) -> bool:
+        return self._layer(item) is not None
+
+    def __iter__(self) -> tp.Iterator[tp.Hashable]:
+        for layer in self._layers():
+            yield from layer._items
+
+    def __repr__(self) -> str:
+        return f"UsedSet({set(self)})"
+
+    def add(self, item: tp.Hashable) -> UsedSet:
+        """Returns the set with the item added"""
+        if item in self:
+            return self
+        return self._push((item,))
+
+    def apply_codes(self, used_l: tp.Iterable[tp.Union[int, tp.Iterable[str]]]) -> UsedSet:
+        """Returns the set changed by a used extension returned by `FormalSystem.use_rule`:
+        -1 resets the set, 0 stops reading the extension and other items are added as tuples"""
+        new = self
+        for used in used_l:
+            assert not isinstance(used, str)
+            if used == -1:
+                new = UsedSet()
+            elif used == 0:
+                break
+            else:
+                new = new.add(tuple(used))
+        return new
+
+    def _extension(self, base: UsedSet) -> tp.Union[list[tp.Hashable], None]:
+        """Returns the items added to `base` to get this set, None if this set doesn't contain `base`.
+        Layers of a set are disjoint, so only the layers the sets don't share have to be compared;
+        they are found by walking down both stacks (the sizes shrink on the way) until they meet."""
+        a, b = self, base
+        new, old = [], set()
+        while a is not b:
+            if a is not None and (b is None or a._len >= b._len):
+                new.extend(a._items)
+                a = a._parent
+            else:
+                old.update(b._items)
+                b = b._parent
+        added = [i for i in new if i not in old]
+        if len(base) + len(added) != len(self):
+            return None
+        return added
+
+    def _extend(self, items: tuple[tp.Hashable]) -> UsedSet:
+        """Returns the set with the items (none of them present yet) added in one layer"""
+        if not items:
+            return self
+        if len(items) > self.SMALL_LAYER:
+            items = frozenset(items)
+        return self._push(items)
+
+
+class LiteralIndex(_Layers, Mapping):
+    """Persistent literal index of a branch (key -> the first sentence with that key); `add` returns a new index"""
+    __slots__ = ()
+
+    @staticmethod
+    def _merge(older: dict, newer: dict) -> dict:
+        return {**older, **newer}
+
+    def __init__(self, items: dict[tp.Hashable, Sentence] = None):
+        super().__init__(dict(items) if items else dict())
+
+    def __getitem__(self, key: tp.Hashable) -> Sentence:
+        if (layer := self._layer(key)) is None:
+            raise KeyError(key)
+        return layer._items[key]
+
+    def __contains__(self, key: tp.Hashable) -> bool:
+        return self._layer(key) is not None
+
+    def __iter__(self) -> tp.Iterator[tp.Hashable]:
+        for layer in self._layers():
+            yield from layer._items
+
+    def __repr__(self) -> str:
+        return f"LiteralIndex({dict(self)})"
+
+    def add(self, key: tp.Hashable, statement: Sentence) -> LiteralIndex:
+        """Returns the index with the sentence added, unless the key is already there"""
+        if key in self:
+            return self
+        return self._push({key: statement})
+
+
+class Branch(Sequence):
+    """Read-only view of the sentences in a branch, stored in the nodes on the way from the root to the leaf.
+    Nodes don't change after they get children, so the view only keeps the nodes (found through the parent links)
+    and the amount of sentences before each one. Slices are returned as lists.
+    """
+    __slots__ = ('_nodes', '_offsets', '_len')
+
+    def __init__(self, node: Tree):
+        self._nodes = node._chain()
+        self._offsets = [i.offset for i in self._nodes]
+        self._len = node.offset + len(node.statements)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __getitem__(self, index: tp.Union[int, slice]) -> tp.Union[Sentence, list[Sentence]]:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._len)
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            out = []
+            i = max(bisect_right(self._offsets, start)-1, 0)
+            while start < stop:
+                offset = self._offsets[i]
+                chunk = self._nodes[i].statements
+                end = min(stop-offset, len(chunk))
+                out.extend(chunk[start-offset:end])
+                start = offset+end
+                i += 1
+            return out
+
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("branch index out of range")
+        if index >= self._offsets[-1]:
+            return self._nodes[-1].statements[index-self._offsets[-1]]
+        i = bisect_right(self._offsets, index)-1
+        return self._nodes[i].statements[index-self._offsets[i]]
+
+    def __iter__(self) -> tp.Iterator[Sentence]:
+        left = self._len
+        for node in self._nodes:
+            yield from islice(node.statements, left)
+            left -= len(node.statements)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (Branch, list)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"Branch({list(self)})"
+
+
+class History(object):
+    """Log of the changes of a tree; every change is an `Operation` which can be reverted and applied again.
+    A version of the tree is the amount of applied operations, so taking a snapshot costs O(1)
+    and going back to it only reverts the operations made after it, no rules are used again.
+    Checkpoints divide the log into steps for `undo` and `redo` and store information about the state (ex. the active branch).
+    A change made after going back discards the operations which could be applied again.
+
+    Kinds of operations (`old` and `new` values):
+        statements  (amount of statements, literal index) before and (added statements, literal index) after
+        children    None and the tuple of the new children
+        used        used set before and after
+        closed      closure before and after
+    """
+
+    def __init__(self):
+        self._log = []
+        self._cursor = 0
+        self._marks = []    # versions beginning the steps, growing
+        self._infos = []    # information stored with the checkpoints
+
+    def __len__(self) -> int:
+        return len(self._log)
+
+    def version(self) -> int:
+        """Returns the version of the tree, which can be restored with `goto`"""
+        return self._cursor
+
+    def record(self, kind: str, node: Tree, old: tp.Any, new: tp.Any) -> None:
+        """Adds an operation which has just been performed on the tree"""
+        if self._cursor < len(self._log):
+            del self._log[self._cursor:]
+            cut = bisect_right(self._marks, self._cursor)
+            del self._marks[cut:], self._infos[cut:]
+        self._log.append(Operation(kind, node, old, new))
+        self._cursor += 1
+
+    def checkpoint(self, info: tp.Any = None) -> None:
+        """Begins a new step at the current version; a checkpoint already made there only gets the new information"""
+        i = bisect_left(self._marks, self._cursor)
+        if i < len(self._marks) and self._marks[i] == self._cursor:
+            self._infos[i] = info
+        else:
+            self._marks.insert(i, self._cursor)
+            self._infos.insert(i, info)
+
+    def goto(self, version: int) -> None:
+        """Reverts or applies operations until the tree is in the given version"""
+        if not 0 <= version <= len(self._log):
+            raise TreeError(f"There is no version {version} in the history")
+        while self._cursor > version:
+            self._cursor -= 1
+            self._revert(self._log[self._cursor])
+        while self._cursor < version:
+            self._apply(self._log[self._cursor])
+            self._cursor += 1
+
+    def undo(self) -> tp.Union[tuple[int, tp.Any], None]:
+        """Goes back to the beginning of the last step
+
+        :return: The version and the information of the checkpoint or None if there is nothing to undo
+        :rtype: tp.Union[tuple[int, tp.Any], None]
+        """
+        i = bisect_left(self._marks, self._cursor)-1
+        if i < 0:
+            return None
+        self.goto(self._marks[i])
+        return self._marks[i], self._infos[i]
+
+    def redo(self) -> tp.Union[tuple[int, tp.Any], None]:
+        """Applies the next undone step
+
+        :return: The version and the information of the next checkpoint (None if it's the end of the log) or None if there is nothing to redo
+        :rtype: tp.Union[tuple[int, tp.Any], None]
+        """
+        if self._cursor == len(self._log):
+            return None
+        i = bisect_right(self._marks, self._cursor)
+        if i < len(self._marks):
+            self.goto(self._marks[i])
+            return self._marks[i], self._infos[i]
+        self.goto(len(self._log))
+        return len(self._log), None
+
+    @staticmethod
+    def _revert(op: Operation) -> None:
+        node = op.node
+        if op.kind in ('statements', 'children'):
+            node._invalidate()
+        if op.kind == 'statements':
+            del node.statements[op.old[0]:]
+            node.literals = op.old[1]
+        elif op.kind == 'children':
+            node.children = ()
+            for child in reversed(op.new):
+                if child.name != node.name:
+                    del node.leaves[child.name]
+            node.leaves[node.name] = node
+        elif op.kind == 'used':
+            node.used = op.old
+        elif op.kind == 'closed':
+            node._set_closed(op.old)
+
+    @staticmethod
+    def _apply(op: Operation) -> None:
+        node = op.node
+        if op.kind in ('statements', 'children'):
+            node._invalidate()
+        if op.kind == 'statements':
+            node.statements.extend(op.new[0])
+            node.literals = op.new[1]
+        elif op.kind == 'children':
+            node.children = op.new
+            for child in op.new:
+                node.leaves[child.name] = child
+        elif op.kind == 'used':
+            node.used = op.new
+        elif op.kind == 'closed':
+            node._set_closed(op.new)
+
+
 class Tree(object):
+    __slots__ = ('name', 'statements', 'parent', 'children', 'closed', 'used', 'leaves',
+                 'literal', 'literals', 'offset', 'position', 'history', '_printed')
     child_limit = 2
     namegen = random.Random()
 
@@ -32,7 +537,7 @@ class Tree(object):
     #     cls.child_limit = amount
 
 
-    def __init__(self, start_statement: Sentence, branch_name: str = 'A', parent: Tree = None, leaves_dict: dict[str, Tree] = None, closed: tp.Union[None, tuple[int]] = None, used: set[int] = None):
+    def __init__(self, start_statement: Sentence, branch_name: str = 'A', parent: Tree = None, leaves_dict: Leaves = None, closed: tp.Union[None, tuple[int]] = None, used: UsedSet = None, literal: tp.Callable[[Sentence], tp.Union[tuple[tp.Hashable, tp.Hashable], None]] = None, literals: LiteralIndex = None, history: History = None):
         """The representation of one node in a tree; non-diverging rules add to this one's statement list. It's accounted for in the interface
 
         :param start_statement: The first statement to insert into the node
@@ -41,44 +546,72 @@ class Tree(object):
         :type branch_name: str, optional
         :param parent: Parent node
         :type parent: Tree, optional
-        :param leaves_dict: If the tree has a dict of leaves it can be stored here; when not provided system will create an empty dict
-        :type leaves_dict: dict[str, Tree], optional
+        :param leaves_dict: If the tree has a registry of leaves it can be stored here; when not provided system will create an empty one
+        :type leaves_dict: Leaves, optional
         :param closed: Stores information about the closing sentences of this leaf, defaults to None
         :type closed: tuple[int], optional
         :param used: A set for storing IDs of sentences which can't be used again in this branch, defaults to an empty set
-        :type used: tp.Set[int], optional
+        :type used: UsedSet, optional
+        :param literal: Function returning the index key of a sentence and the key of the sentence contradicting it (or None), used to fill the literal index, defaults to None
+        :type literal: tp.Callable, optional
+        :param literals: Literal index of the branch (key -> sentence), defaults to an empty index
+        :type literals: LiteralIndex, optional
+        :param history: Log shared by the nodes of the tree, which records the changes so they can be undone; not kept if None, defaults to None
+        :type history: History, optional
         """
         self.name = branch_name
         self.statements = [start_statement]
         self.parent = parent
-        self.children = []
+        if parent is None:
+            self.offset = 0
+            self.position = 0
+        else:
+            self.offset = parent.offset + len(parent.statements)
+            self.position = len(parent.children)
+        self._printed = None
+        self.children = ()
         self.closed = closed
         if used is None:
-            self.used = set()
-        else:    
+            self.used = UsedSet()
+        elif isinstance(used, UsedSet):
             self.used = used
+        else:
+            self.used = UsedSet(used)
         if leaves_dict is None:
-            leaves_dict = OrderedDict()
+            leaves_dict = Leaves(NameAllocator(colors, self.namegen))
         leaves_dict[branch_name] = self
         self.leaves = leaves_dict
+        self.literal = literal
+        if literals is None:
+            self.literals = LiteralIndex()
+        elif isinstance(literals, LiteralIndex):
+            self.literals = literals
+        else:
+            self.literals = LiteralIndex(literals)
+        self.history = history
+        self._index((start_statement,))
 
     # Technical
 
     @staticmethod
     def _dist(a: Tree, b: Tree) -> int:
-        """Calculates distance between two letters"""
-        assert a.leaves == b.leaves
-        return list(a.leaves.keys()).index(a.name) - list(a.leaves.keys()).index(b.name)
+        """Compares the places of two leaves in the registry (positive if `a` comes after `b`)"""
+        assert a.leaves is b.leaves
+        return a.leaves.position(a.name) - a.leaves.position(b.name)
+
+
+    def _index(self, statements: tp.Iterable[Sentence]) -> None:
+        """Adds the statements to the literal index of the branch"""
+        if self.literal is None:
+            return
+        for statement in statements:
+            if (keys := self.literal(statement)) is not None:
+                self.literals = self.literals.add(keys[0], statement)
 
 
     def gen_name(self, am=2) -> tuple[str]:
-        """Generates two possible names for the children of this node"""
-        possible = [i for i in colors if not i in self.leaves.keys()]
-        if len(possible)<am-1:
-            if len(self.leaves) == 1000:
-                raise TreeError("No names exist")
-            return self.name, *[str(self.namegen.randint(0, 1000)) for i in range(am-1)]
-        return self.name, *random.choices(possible, k=am-1) 
+        """Generates names for the children of this node; the first child takes over the name of this node"""
+        return self.name, *(self.leaves.names.allocate() for _ in range(am-1))
 
 
     # Tree reading
@@ -95,34 +628,53 @@ class Tree(object):
         if not index is None:
             return self.children[index]
         else:
-            return tuple(self.children)
+            return self.children
 
 
-    def getbranch(self) -> tuple[str, bool]:
-        """Returns all the sentences in this node's branch and information about branch's closure"""
+    def getbranch(self) -> tuple[Branch, bool]:
+        """Returns all the sentences in this node's branch (as a read-only view) and information about branch's closure"""
         return self._getbranch(), self.closed
 
 
-    def _getbranch(self):
+    def _getbranch(self) -> Branch:
         """Returns all the sentences in this node's branch; `getbranch` is recommended"""
-        if self.parent:
-            return self.parent._getbranch() + self.statements
-        else:
-            return self.statements
+        return Branch(self)
 
 
-    def gettree(self):
-        """Creates recursively a named tuple with the sentences"""
-        if self.children:
-            children = (i.gettree() for i in self.children)
-            closer = ''
-        else:
-            children = None
-            if self.closed:
-                closer = self.closed[0]
-            else:
+    def _chain(self) -> list[Tree]:
+        """Returns the nodes from the root to this one"""
+        nodes = []
+        node = self
+        while node is not None:
+            nodes.append(node)
+            node = node.parent
+        nodes.reverse()
+        return nodes
+
+
+    def gettree(self) -> PrintedTree:
+        """Creates recursively a named tuple with the sentences.
+        The tuple of a node is kept until something in its subtree changes, so the Output plugins can cache renders in `PrintedTree.cache`"""
+        if self._printed is None:
+            if self.children:
+                children = tuple(i.gettree() for i in self.children)
                 closer = ''
-        return PrintedTree(sentences=self.statements, children=children, closer=closer)
+            else:
+                children = None
+                if self.closed:
+                    closer = self.closed[0]
+                else:
+                    closer = ''
+            self._printed = PrintedTree(sentences=self.statements, children=children, closer=closer, cache=dict())
+        return self._printed
+
+
+    def _invalidate(self) -> None:
+        """Drops the printed tuples of the node and its ancestors; if a node has none, its ancestors don't have them either"""
+        node = self
+        while node is not None and node._printed is not None:
+            node._printed = None
+            node = node.parent
 
 
     def getleaves(self, *names: tp.Iterable[str]) -> list[Tree]:
@@ -143,7 +695,17 @@ class Tree(object):
         :return: Iterator of the leaves
         :rtype: tp.Iterator[Tree]
         """
-        return (i for i in self.getleaves(*names) if not i.closed)
+        if names:
+            return (i for i in self.getleaves(*names) if not i.closed)
+        return iter([self.leaves[i] for i in self.leaves.open_names()])
+
+
+    def first_open(self, skip: tp.Container[str] = ()) -> tp.Union[Tree, None]:
+        """Returns the first open leaf whose name is not in `skip`"""
+        for name in self.leaves.open_names():
+            if name not in skip:
+                return self.leaves[name]
+        return None
 
 
     def getbranch_neighbour(self, left_right: str):
@@ -155,28 +717,16 @@ class Tree(object):
         :return: A leaf of the neighbour branch
         :rtype: Tree
         """
-        min_dist = INFINITY
-        obj_w_min = None
         if left_right.upper() in ('R', 'RIGHT'):
-            for _, i in self.leaves.items():
-                dist = self._dist(i, self)
-                if dist > 0 and dist < min_dist:
-                    min_dist = dist
-                    obj_w_min = i
-            return obj_w_min
-
-        # Copy of the previous part, but with different distance computing
+            name = self.leaves.next(self.name)
         elif left_right.upper() in ('L', 'LEFT'):
-            for _, i in self.leaves.items():
-                dist = self._dist(self, i)
-                if dist > 0 and dist < min_dist:
-                    min_dist = dist
-                    obj_w_min = i
-            return obj_w_min
-
+            name = self.leaves.previous(self.name)
         else:
             raise TreeError(f"'{left_right}' is not a valid direction")
+
+        if name is None:
             return None
+        return self.leaves[name]
 
 
     def getnode_neighbour(self, left_right: str) -> tp.Union[Tree]:
@@ -192,7 +742,7 @@ class Tree(object):
             return None
 
         # Find neighbour's index
-        index = self.parent.getchildren().index(self)
+        index = self.position
         if left_right.upper() in ('R', 'RIGHT'):
             index += 1
         elif left_right.upper() in ('L', 'LEFT'):
@@ -215,11 +765,11 @@ class Tree(object):
 
     def is_finished(self) -> bool:
         """Checks if all branches are closed"""
-        return all((i.closed for i in self.leaves.values()))
+        return self.leaves.is_finished()
 
     def is_closed(self) -> bool:
         """Checks if all branches are closed"""
-        return all((i.closed is not None and i.closed[0] == 1 for i in self.leaves.values()))
+        return self.leaves.is_closed()
 
 
     # Tree modification
@@ -231,17 +781,26 @@ class Tree(object):
         :param statements: statement(s)
         :type statements: Sentence
         """
+        length, literals = len(self.statements), self.literals
+        self._invalidate()
         self.statements.extend(statements)
+        self._index(statements)
+        if self.history is not None:
+            self.history.record('statements', self, (length, literals), (tuple(statements), self.literals))
 
 
     def _add_children(self, *statements: tp.Iterable[tuple[Sentence]]):
         """Adds statements as children of the node"""
         names = self.gen_name()
         for i, sentence in enumerate(statements):
-            self.children.append(Tree(
-                sentence[0], names[i], self, leaves_dict=self.leaves, closed=self.closed, used=self.used.copy()))
+            self.children += (Tree(
+                sentence[0], names[i], self, leaves_dict=self.leaves, closed=self.closed, used=self.used,
+                literal=self.literal, literals=self.literals, history=self.history),)
             if (to_add := sentence[1:]):
                 self.children[-1].append((to_add,))
+        self._invalidate()
+        if self.history is not None:
+            self.history.record('children', self, None, self.children)
 
 
     def append(self, statements: tuple[tuple[Sentence]]):
@@ -262,6 +821,25 @@ class Tree(object):
                 f'Trying to append {len(statements)} branches to the tree')
 
 
+    def find_contradicting(self, statements: tp.Iterable[Sentence]) -> tp.Union[tuple[Sentence, Sentence], None, bool]:
+        """Looks up sentences contradicting the given ones in the literal index of the branch
+
+        :param statements: Sentences to check (usually the newest ones)
+        :type statements: tp.Iterable[Sentence]
+        :return: Pair of contradicting sentences, None if there is none, False if some of the sentences can't be indexed
+        :rtype: tp.Union[tuple[Sentence, Sentence], None, bool]
+        """
+        if self.literal is None:
+            return False
+        found = None
+        for statement in statements:
+            if (keys := self.literal(statement)) is None:
+                return False
+            if found is None and (other := self.literals.get(keys[1])) is not None:
+                found = (other, statement)
+        return found
+
+
     def close(self, info: str, code: int = 1) -> None:
         """Closes the branch using the last
 
@@ -271,26 +849,197 @@ class Tree(object):
         8 - Loop prevention (get it? the loop?)
         """
         assert isinstance(info, str) and isinstance(code, int)
-        self.closed = (code, info)
+        old = self.closed
+        self._set_closed((code, info))
+        if self.history is not None:
+            self.history.record('closed', self, old, self.closed)
+
+    def _set_closed(self, closed: tp.Union[tuple[int, str], None]) -> None:
+        """Changes the closure of the node and reports it to the registry if the node is a leaf"""
+        old = self.closed
+        self.closed = closed
+        self._invalidate()
+        if self.leaves.get(self.name) is self:
+            self.leaves._account(self.name, self.leaves._kind(old), self.leaves._kind(closed))
 
-    def get_used(self) -> set[Sentence]:
+    def get_used(self) -> UsedSet:
         """
-        Adds the statement ID to the used statements set
-        Should only be used after non-reusable rules
+        Returns the used statements set; it's persistent, so later additions don't change it
         """
-        return self.used.copy()
+        return self.used
 
     def add_used(self, used_l: tuple[tp.Union[int, tuple[str]]]) -> None:
         """
         Adds the statement ID to the used statements set
         Should only be used after non-reusable rules
         """
-        for used in used_l:
-            assert not isinstance(used, str)
-            #               Code handling:
-            if used == -1:  # Reset set
-                self.used.clear()
-            elif used == 0: # Pass
-                return
-            else:
-                self.used.add(tuple(used))
+        old = self.used
+        self.used = old.apply_codes(used_l)
+        if self.history is not None and self.used is not old:
+            self.history.record('used', self, old, self.used)
+
+
+    # Serialization
+
+
+    def dump(self, file: tp.BinaryIO, meta: dict = None) -> None:
+        """Writes the whole tree (with the order of the leaf registry and the used sets) to a binary file.
+        Tokens are interned into a string table and sentences into a table of token IDs,
+        nodes are written in preorder as an array of integers, so everything is written in a few bulk writes.
+
+        Layout (little-endian with the standard sizes of `struct`: I - unsigned and i - signed 4 byte integers,
+        every array is prefixed with its length as Q):
+            header          magic and version ('<4sH')
+            meta            JSON in UTF-8
+            strings         lengths (I) and the joined strings in UTF-8
+            sentences       lengths (I) and token IDs (I)
+            nodes           `NODE_FIELDS` integers per node (i): parent index (-1 - root), name ID, closure code (-1 - open),
+                            closure info ID, amount of statements, used set mode (0 - extends the parent's set, 1 - new set)
+            statements      sentence IDs (I)
+            used            amounts of the added sentences (I) and their IDs (I)
+            leaves          name IDs in the order of the registry (I)
+
+        :param file: File opened for binary writing
+        :type file: tp.BinaryIO
+        :param meta: JSON-serializable information stored with the tree, defaults to None
+        :type meta: dict, optional
+        :raises TreeError: The tree holds something other than sentences of string tokens
+        """
+        strings = dict()
+        sentences = dict()
+        token_ids = []
+
+        def string(s: str) -> int:
+            if (i := strings.get(s)) is None:
+                if not isinstance(s, str):
+                    raise TreeError(f"{s!r} can't be saved, only strings can be tokens")
+                i = strings[s] = len(strings)
+            return i
+
+        def sentence(tokens: tp.Iterable[str]) -> int:
+            key = tuple(tokens)
+            if (i := sentences.get(key)) is None:
+                i = sentences[key] = len(sentences)
+                token_ids.extend(map(string, key))
+            return i
+
+        nodes, statements, used_counts, used_items = [], [], [], []
+        stack = [(self.getroot(), -1)]
+        index = 0
+        while stack:
+            node, parent = stack.pop()
+            base = node.parent.used if node.parent is not None else UsedSet()
+            mode = 0
+            if (added := node.used._extension(base)) is None:
+                mode, added = 1, list(node.used)
+            closed = node.closed
+            nodes.extend((parent, string(node.name), closed[0] if closed else -1,
+                          string(closed[1]) if closed else -1, len(node.statements), mode))
+            statements.extend(sentence(i) for i in node.statements)
+            used_counts.append(len(added))
+            used_items.extend(sentence(i) for i in added)
+            stack.extend((child, index) for child in reversed(node.children))
+            index += 1
+        leaves = [string(i) for i in self.leaves]
+
+        file.write(struct.pack('<4sH', SNAPSHOT_MAGIC, SNAPSHOT_VERSION))
+        _write_array(file, 'B', json.dumps(meta or {}).encode('utf-8'))
+        _write_array(file, 'I', map(len, strings))
+        _write_array(file, 'B', "".join(strings).encode('utf-8'))
+        _write_array(file, 'I', map(len, sentences))
+        _write_array(file, 'I', token_ids)
+        _write_array(file, 'i', nodes)
+        _write_array(file, 'I', statements)
+        _write_array(file, 'I', used_counts)
+        _write_array(file, 'I', used_items)
+        _write_array(file, 'I', leaves)
+
+
+    @classmethod
+    def load(cls, file: tp.BinaryIO, literal: tp.Callable[[Sentence], tp.Union[tuple[tp.Hashable, tp.Hashable], None]] = None, expected: dict = None, history: History = None) -> tuple[Tree, dict]:
+        """Reads a tree written by `dump`; the literal index is rebuilt with the given function
+
+        :param file: File opened for binary reading
+        :type file: tp.BinaryIO
+        :param literal: Function used to fill the literal index (see `__init__`), defaults to None
+        :type literal: tp.Callable, optional
+        :param expected: Values the meta of the snapshot has to contain; checked before the tree is built, defaults to None
+        :type expected: dict, optional
+        :param history: Log for the changes of the restored tree (see `__init__`), defaults to None
+        :type history: History, optional
+        :raises TreeError: The file is not a valid snapshot or its meta doesn't match `expected`
+        :return: Root of the tree and the meta stored with it
+        :rtype: tuple[Tree, dict]
+        """
+        magic, version = struct.unpack('<4sH', _read_bytes(file, 6))
+        if magic != SNAPSHOT_MAGIC:
+            raise TreeError("File is not a proof snapshot")
+        if version != SNAPSHOT_VERSION:
+            raise TreeError(f"Snapshot version {version} is not supported")
+        meta = json.loads(bytes(_read_array(file, 'B')).decode('utf-8'))
+        for key, value in (expected or {}).items():
+            if meta.get(key) != value:
+                raise TreeError(f"Snapshot was saved with {key} {meta.get(key)}, not {value}")
+
+        lengths = _read_array(file, 'I')
+        text = bytes(_read_array(file, 'B')).decode('utf-8')
+        strings, start = [], 0
+        for length in lengths:
+            strings.append(sys.intern(text[start:start+length]))
+            start += length
+        lengths = _read_array(file, 'I')
+        tokens = list(map(strings.__getitem__, _read_array(file, 'I')))
+        sentences, start = [], 0
+        for length in lengths:
+            sentences.append(tokens[start:start+length])
+            start += length
+        fields = _read_array(file, 'i')
+        statements = _read_array(file, 'I')
+        used_counts = _read_array(file, 'I')
+        used_items = _read_array(file, 'I')
+        leaves = _read_array(file, 'I')
+
+        # Nodes are built in preorder with a plain dict as the registry, the order of the registry is restored afterwards
+        temp = dict()
+        nodes = []
+        s = u = 0
+        collecting = gc.isenabled()
+        gc.disable()  # The collector would scan the new nodes over and over while they are created
+        try:
+            for i in range(0, len(fields), NODE_FIELDS):
+                parent, name, code, info, amount, mode = fields[i:i+NODE_FIELDS]
+                closed = (code, strings[info]) if code != -1 else None
+                first, *rest = (sentences[j] for j in statements[s:s+amount])
+                s += amount
+                if parent == -1 and not nodes:
+                    node = cls(first, strings[name], leaves_dict=temp, closed=closed, literal=literal)
+                    used = node.used
+                elif 0 <= parent < len(nodes):
+                    up = nodes[parent]
+                    node = cls(first, strings[name], up, leaves_dict=temp, closed=closed, used=up.used,
+                               literal=literal, literals=up.literals)
+                    up.children += (node,)
+                    used = UsedSet() if mode else up.used
+                else:
+                    raise TreeError(f"Node {len(nodes)} has a wrong parent")
+                count = used_counts[len(nodes)]
+                node.used = used._extend(tuple(tuple(sentences[j]) for j in used_items[u:u+count]))
+                u += count
+                if rest:
+                    node._add_statements(rest)
+                nodes.append(node)
+
+            registry = Leaves(NameAllocator(colors, cls.namegen))
+            for i in leaves:
+                registry[strings[i]] = temp[strings[i]]
+        except (IndexError, KeyError, ValueError) as e:
+            raise TreeError(f"Snapshot is corrupted: {e!r}")
+        finally:
+            if collecting:
+                gc.enable()
+        if not nodes or len(registry) != len(temp):
+            raise TreeError("Snapshot is corrupted: wrong leaves")
+        for node in nodes:
+            node.leaves = registry
+            node.history = history
+        return nodes[0], meta
@@ -0,0 +1,69 @@
+"""Benchmark of the automatic proving
+
+Proves a set of formulas with `Session.auto` in both sequent calculi, once with the transposition table of the session
+and once with a table which can't hold anything.
+Then splits the conjunction of the formulas into a branch for every formula and proves them with `auto(parallel)`
+for a growing amount of processes. Usage:
+
+    python benchmark_auto.py [repeats]
+"""
+import json
+import os
+import sys
+import tempfile
+import timeit
+
+APP = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app'))
+sys.path.append(APP)
+
+FORMULAS = [
+    "(p -> q) -> ((q -> r) -> ((r -> s) -> ((s -> t) -> (p -> t))))",
+    "((p or q) -> F) -> ((p -> F) and (q -> F))",
+    "((p or (p -> F)) -> F) -> F",
+    "((p or q) and (p or r)) -> (p or (q and r))",
+    "((p -> q) -> r) -> ((p -> r) -> ((q -> r) -> (r or (p -> q))))",
+    "((p -> F) -> F) -> p",
+    "(p -> q) or (q -> p)",
+    "(((p -> q) -> p) -> p)",
+]
+
+
+def main(repeats: int) -> None:
+    os.chdir(APP)  # tree.py and the plugins read files from the app directory
+    import engine
+    import search
+
+    with tempfile.TemporaryDirectory() as directory:
+        config = os.path.join(directory, 'config.json')
+        for system in ('int_seqcal_scottish', 'int_seqcal_swiss'):
+            with open(config, 'w') as f:
+                json.dump({"chosen_plugins": {"UserInterface": "CLI", "Lexicon": "basic", "FormalSystem": system,
+                                              "Output": "TeX_infer", "Auto": "seqcal"}}, f)
+            session = engine.Session('benchmark', config)
+
+            def run():
+                session.table.clear()
+                for formula in FORMULAS:
+                    session.new_proof(formula)
+                    session.auto()
+
+            for name, size in (('table', search.TABLE_SIZE), ('no table', 0)):
+                session.table = search.TranspositionTable(size)
+                best = min(timeit.repeat(run, number=1, repeat=repeats))
+                print(f"{system:>20} {name:>10}: {best*1e3:8.1f} ms ({session.table.hits} hits, {session.table.misses} misses)")
+
+            def split():
+                session.table.clear()
+                session.new_proof(" and ".join(f"({i})" for i in FORMULAS))
+                todo = [session.branch]
+                while todo:
+                    session.branch = todo.pop()
+                    todo.extend(session.use_rule('right and', {}) or ())
+
+            for processes in sorted({1, 2, os.cpu_count() or 1}):
+                best = min(timeit.repeat(lambda: session.auto(processes), split, number=1, repeat=repeats))
+                print(f"{system:>20} {processes:>3} processes: {best*1e3:8.1f} ms ({len(FORMULAS)} branches)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,43 @@
+"""Microbenchmark of calling plugin functions from the engine
+
+Compares the lookup through the socket (`Session.acc`) with the functions bound when the plugin is plugged (`Session.bound`)
+and measures `Session.getbranch`, which calls the Output and Lexicon plugins for every sentence. Usage:
+
+    python benchmark_dispatch.py [calls]
+"""
+import json
+import os
+import sys
+import tempfile
+import timeit
+
+APP = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app'))
+sys.path.append(APP)
+
+
+def main(calls: int) -> None:
+    os.chdir(APP)  # tree.py and the plugins read files from the app directory
+    import engine
+
+    with tempfile.TemporaryDirectory() as directory:
+        config = os.path.join(directory, 'config.json')
+        with open(config, 'w') as f:
+            json.dump({"chosen_plugins": {"UserInterface": "CLI", "Lexicon": "basic", "FormalSystem": "zeroth_order_logic",
+                                          "Output": "TeX_infer", "Auto": "seqcal"}}, f)
+        session = engine.Session('benchmark', config)
+        session.new_proof('~((p and q) -> (q or p))')
+        session.use_rule('false imp', {'sentenceID': 0})
+        session.use_rule('true and', {'sentenceID': 1})
+
+        cases = [
+            ('acc', lambda: session.acc('FormalSystem').get_needed_context),
+            ('bound', lambda: session.bound.FormalSystem.get_needed_context),
+            ('getbranch', session.getbranch),
+        ]
+        for name, func in cases:
+            best = min(timeit.repeat(func, number=calls, repeat=5))
+            print(f"{name:>20}: {best/calls*1e9:8.1f} ns/call ({calls} calls)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
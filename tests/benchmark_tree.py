@@ -0,0 +1,74 @@
+"""Memory benchmark of the proof tree
+
+Builds a fully split tree of the given size and measures the memory allocated per node with tracemalloc.
+Every node holds the same sentence and one used sentence, so the result is the overhead of the tree itself.
+Memory kept by the caches of the nodes is measured too: after the branch of every leaf is read
+and after the tree is printed with `gettree`. Reading branches keeps nothing in the nodes.
+The printed tuples are kept, so that the Output plugins can cache renders in them; they are as big as the tuples
+every call of `gettree` used to build, and only the changed part of the tree is printed again.
+To compare with another implementation of the tree pass the path of its module, ex.:
+
+    git show <commit>:app/tree.py > /tmp/tree_old.py
+    python benchmark_tree.py 100000 /tmp/tree_old.py
+"""
+import importlib.util
+import itertools
+import os
+import sys
+import tracemalloc
+from collections import deque
+
+APP = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app'))
+sys.path.append(APP)
+
+
+def load(path: str, name: str):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def measure(module, nodes: int) -> tuple[float, float, float]:
+    """Returns the amount of bytes per node of a tree with the given amount of nodes:
+    after building it, after reading the branch of every leaf and after printing it"""
+    # Unique names for any amount of branches, so that only the storage of the tree is measured
+    counter = itertools.count()
+    module.Tree.gen_name = lambda self, am=2: (self.name, *(f"N{next(counter)}" for _ in range(am-1)))
+    sentence = ['sentvar_p']
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    root = module.Tree(sentence, 'A')
+    queue = deque([root])
+    count = 1
+    while count < nodes:
+        node = queue.popleft()
+        node.append(((sentence,), (sentence,)))
+        for child in node.getchildren():
+            child.add_used([('sentvar_q', str(count))])
+            queue.append(child)
+            count += 1
+    queue.clear()
+    built = tracemalloc.get_traced_memory()[0] - before
+    for leaf in root.getleaves():
+        leaf.getbranch()
+    read = tracemalloc.get_traced_memory()[0] - before
+    printed = root.gettree()
+    del printed
+    printed = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return built/count, read/count, printed/count
+
+
+def main(nodes: int, others: list[str]) -> None:
+    os.chdir(APP)  # tree.py reads colors.json
+    implementations = [('current', os.path.join(APP, 'tree.py'))] + [(os.path.basename(i), i) for i in others]
+    for i, (name, path) in enumerate(implementations):
+        module = load(os.path.abspath(path), f"benchmarked_tree_{i}")
+        built, read, printed = measure(module, nodes)
+        print(f"{name:>20}: {built:8.1f} B/node built, {read:8.1f} after reading branches, {printed:8.1f} after printing ({nodes} nodes)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000, sys.argv[2:])
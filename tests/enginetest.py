@@ -0,0 +1,314 @@
+import unittest as test
+import json
+import logging
+import os
+import sys
+import tempfile
+from unittest import mock
+
+sys.path.append('../app/')
+APP = os.path.abspath('../app/')
+cwd = os.getcwd()
+os.chdir(APP)  # tree.py reads colors.json from the app directory
+try:
+    import engine
+finally:
+    os.chdir(cwd)
+
+
+class SessionCase(test.TestCase):
+    """Runs the tests in the app directory (the plugins are found there) with a session using a temporary config"""
+    PLUGINS = {"UserInterface": "CLI", "Lexicon": "basic", "FormalSystem": "int_seqcal_scottish",
+               "Output": "TeX_infer", "Auto": "seqcal"}
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        os.chdir(APP)
+        self.dir = tempfile.TemporaryDirectory()
+        config = os.path.join(self.dir.name, 'config.json')
+        with open(config, 'w') as f:
+            json.dump({"chosen_plugins": self.PLUGINS}, f)
+        self.session = engine.Session('test', config)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.dir.cleanup()
+
+    def state(self):
+        """Everything the interface can read about the proof"""
+        proof = self.session.proof
+        leaves = [(name, leaf.closed, set(leaf.get_used()), list(leaf.getbranch()[0])) for name, leaf in proof.leaves.items()]
+        return self.session.gettree(), leaves, self.session.proof_finished(), self.session.branch
+
+
+class TestSaving(SessionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(self.dir.name, 'proof.lpp')
+        self.session.new_proof("((p or q) -> (q or p)) and (p -> q)")
+        self.session.use_rule('right and', {})
+
+    def test_roundtrip(self):
+        self.session.auto()
+        before = self.state()
+        self.session.save_proof(self.path)
+        self.session.reset_proof()
+        self.session.load_proof(self.path)
+        self.assertEqual(self.state(), before)
+
+    def test_continued(self):
+        self.session.save_proof(self.path)
+        self.session.load_proof(self.path)
+        self.session.auto()
+        self.assertEqual(self.session.proof_finished(), (True, False))
+        self.assertEqual([i.closed[0] for i in self.session.proof.leaves.values()], [1, 8, 1])
+
+    def test_other_system(self):
+        self.session.save_proof(self.path)
+        self.session.plug_switch('FormalSystem', 'int_seqcal_swiss')
+        with self.assertRaises(engine.EngineError):
+            self.session.load_proof(self.path)
+
+    def test_not_snapshot(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not a proof')
+        with self.assertRaises(engine.EngineError):
+            self.session.load_proof(self.path)
+        self.assertEqual(self.session.proof_finished(), (False, False))
+
+
+class TestHistory(SessionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.session.new_proof("((p or q) -> (q or p)) and (p -> q)")
+        self.states = [self.state()]
+
+    def step(self, rule, context=None):
+        self.session.use_rule(rule, context or {})
+        self.states.append(self.state())
+
+    def test_manual(self):
+        self.step('right and')
+        self.step('right imp')
+        self.session.undo()
+        self.assertEqual(self.state(), self.states[1])
+        self.session.undo()
+        self.assertEqual(self.state(), self.states[0])
+        self.session.redo()
+        self.assertEqual(self.state(), self.states[1])
+        self.session.redo()
+        self.assertEqual(self.state(), self.states[2])
+
+    def test_split(self):
+        self.step('right and')
+        self.session.jump(self.session.getbranches()[1])
+        self.step('right imp')
+        self.assertEqual(len(self.session.getbranches()), 2)
+        self.session.undo()
+        self.session.undo()
+        self.assertEqual(self.session.getbranches(), ['Linen'])
+        self.assertEqual(self.state(), self.states[0])
+        self.session.redo()
+        self.session.redo()
+        self.assertEqual(self.state(), self.states[2])
+
+    def test_auto(self):
+        self.step('right and')
+        self.session.auto()
+        after = self.state()
+        self.session.undo()
+        self.assertEqual(self.state(), self.states[1])
+        self.session.redo()
+        # The tree is restored; the active branch is kept, as it still exists
+        self.assertEqual(self.state()[:3], after[:3])
+        self.assertEqual(self.session.branch, 'Linen')
+
+    def test_new_step_clears_redo(self):
+        self.step('right and')
+        self.session.undo()
+        self.session.use_rule('right and', {})
+        with self.assertRaises(engine.EngineError):
+            self.session.redo()
+
+    def test_nothing_to_undo(self):
+        with self.assertRaises(engine.EngineError):
+            self.session.undo()
+        with self.assertRaises(engine.EngineError):
+            self.session.redo()
+
+    def test_restore(self):
+        versions = [self.session.version()]
+        self.step('right and')
+        versions.append(self.session.version())
+        self.session.auto()
+        self.states.append(self.state())
+        versions.append(self.session.version())
+        for i in (0, 2, 1, 0, 2):
+            self.session.restore(versions[i])
+            self.assertEqual(self.state()[:3], self.states[i][:3])
+        with self.assertRaises(engine.EngineError):
+            self.session.restore(versions[-1]+1)
+
+    def test_goto(self):
+        history = self.session.proof.history
+        self.step('right and')
+        self.session.auto()
+        end, last = history.version(), self.session.gettree()
+        trees = []
+        for version in range(end+1):
+            history.goto(version)
+            trees.append(self.session.gettree())
+        for version in reversed(range(end+1)):
+            history.goto(version)
+            self.assertEqual(self.session.gettree(), trees[version])
+        self.assertEqual(trees[0], self.states[0][0])
+        self.assertEqual(trees[-1], last)
+
+
+class TestBinding(SessionCase):
+
+    def check_bound(self):
+        for socket in engine.Session.SOCKETS:
+            plugin = self.session.acc(socket)
+            for name, func in self.session.bound._asdict()[socket]._asdict().items():
+                self.assertIs(func, getattr(plugin, name), (socket, name))
+        self.assertIs(self.session.bound.FormalSystemError, self.session.acc('FormalSystem').utils.FormalSystemError)
+
+    def test_rebound(self):
+        self.check_bound()
+        for socket, plugin in (('FormalSystem', 'int_seqcal_swiss'), ('Output', 'text'), ('Auto', 'seqcal')):
+            old = self.session.bound
+            self.session.plug_switch(socket, plugin)
+            self.check_bound()
+            for other in engine.Session.SOCKETS:
+                if other != socket:
+                    self.assertIs(getattr(self.session.bound, other), getattr(old, other))
+
+    def test_no_lookup(self):
+        # Rules and searches use the bound functions, not the sockets
+        self.session.new_proof("((p or q) -> (q or p)) and (p -> q)")
+        with mock.patch.object(self.session, 'acc', side_effect=AssertionError("socket used")):
+            self.session.use_rule('right and', {})
+            with self.assertRaises(engine.EngineError):
+                self.session.use_rule('left imp', {'partID': 5})
+            self.session.auto()
+        self.assertEqual(self.session.proof_finished(), (True, False))
+
+    def test_errors_after_switch(self):
+        self.session.plug_switch('FormalSystem', 'int_seqcal_swiss')
+        self.session.new_proof("p -> q")
+        with self.assertRaises(engine.EngineError):
+            self.session.use_rule('left imp', {'partID': 5})
+
+
+class TestTracing(test.TestCase):
+
+    def setUp(self):
+        self.log = logging.getLogger('enginetest.tracing')
+        self.log.setLevel(logging.DEBUG)
+        self.records = []
+        self.handler = logging.Handler()
+        self.handler.emit = lambda record: self.records.append(record.getMessage())
+        self.log.addHandler(self.handler)
+        self.func = engine.traced(self.log, logging.DEBUG)(lambda *args: len(args))
+
+    def tearDown(self):
+        self.log.removeHandler(self.handler)
+        engine.set_tracing(False)
+
+    def test_off_by_default(self):
+        self.assertFalse(engine.TRACING)
+
+    def test_off(self):
+        with mock.patch.object(engine, 'summarize', side_effect=AssertionError("formatted")) as summarize, \
+             mock.patch.object(engine, 'perf_counter', side_effect=AssertionError("measured")):
+            self.assertEqual(self.func('a', [1, 2]), 2)
+        summarize.assert_not_called()
+        self.assertEqual(self.records, [])
+
+    def test_level_ignored(self):
+        engine.set_tracing(True)
+        self.log.setLevel(logging.INFO)
+        with mock.patch.object(engine, 'summarize', side_effect=AssertionError("formatted")):
+            self.assertEqual(self.func('a'), 1)
+        self.assertEqual(self.records, [])
+
+    def test_on(self):
+        engine.set_tracing(True)
+        self.assertEqual(self.func('a', [1, 2]), 2)
+        self.assertEqual(len(self.records), 1)
+        self.assertIn("('a', list[2]) -> 2", self.records[0])
+
+
+def printed_tree(node):
+    """`gettree` of the implementation which printed the whole tree every time, without the render caches"""
+    children = tuple(printed_tree(i) for i in node.children) if node.children else None
+    closer = node.closed[0] if node.closed and not node.children else ''
+    return engine.PrintedTree(sentences=list(node.statements), children=children, closer=closer, cache=None)
+
+
+class TestRendering(SessionCase):
+    OUTPUTS = ('TeX_infer', 'text', 'actual_tree', 'debug')
+    CLOSED_OUTPUTS = ('TeX_infer', 'actual_tree')  # text and debug can't print closure codes (ints) yet
+
+    def setUp(self):
+        super().setUp()
+        self.session.new_proof("((p or q) -> (q or p)) and (p -> q)")
+
+    def rendered(self, outputs=OUTPUTS):
+        """Checks that the Output plugins render the proof like they would without caches"""
+        for output in outputs:
+            self.session.plug_switch('Output', output)
+            fresh = self.session.bound.Output.write_tree(printed_tree(self.session.proof), self.session.bound.Lexicon.get_lexem)
+            for _ in range(2):
+                self.assertEqual(self.session.gettree(), fresh, output)
+
+    def test_reused(self):
+        self.session.use_rule('right and', {})
+        self.session.gettree()
+        printed = self.session.proof.gettree()
+        self.assertIs(self.session.proof.gettree(), printed)
+        self.assertTrue(printed.cache)
+        # Only the changed branch and its ancestors are printed again
+        left, right = printed.children
+        self.session.jump(self.session.getbranches()[1])
+        self.session.use_rule('right imp', {})
+        self.session.gettree()
+        new = self.session.proof.gettree()
+        self.assertIsNot(new, printed)
+        self.assertIs(new.children[0], left)
+        self.assertIsNot(new.children[1], right)
+        self.assertTrue(left.cache)
+
+    def test_append(self):
+        self.rendered()
+        self.session.use_rule('right and', {})
+        self.rendered()
+        self.session.use_rule('right imp', {})
+        self.rendered()
+
+    def test_close(self):
+        self.session.use_rule('right and', {})
+        self.rendered(self.CLOSED_OUTPUTS)
+        self.session.auto()
+        self.rendered(self.CLOSED_OUTPUTS)
+        self.session.proof.leaves[self.session.getbranches()[0]].close("x", 0)
+        self.rendered(self.CLOSED_OUTPUTS)
+
+    def test_undo(self):
+        self.session.use_rule('right and', {})
+        self.rendered(self.CLOSED_OUTPUTS)
+        self.session.auto()
+        self.rendered(self.CLOSED_OUTPUTS)
+        self.session.undo()
+        self.rendered(self.CLOSED_OUTPUTS)
+        self.session.undo()
+        self.rendered(self.CLOSED_OUTPUTS)
+        self.session.redo()
+        self.rendered(self.CLOSED_OUTPUTS)
+
+
+if __name__ == "__main__":
+    test.main()
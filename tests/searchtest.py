@@ -0,0 +1,397 @@
+import unittest as test
+from functools import partial
+from importlib import import_module
+from unittest import mock
+
+from enginetest import SessionCase, engine
+import search
+
+
+class SearchCase(SessionCase):
+
+    def search(self, **kwargs):
+        """Returns a search using the plugins of the session with a table of its own"""
+        FS = self.session.bound.FormalSystem
+        kwargs.setdefault('key', FS.state_key)
+        return search.Search(FS.use_rule, FS.check_contradict, self.session.bound.Auto.propose,
+                             self.session.acc('FormalSystem').utils.FormalSystemError, search.TranspositionTable(), **kwargs)
+
+    def start(self, statement):
+        """Starts a proof, returns the sentences and the used set of its branch"""
+        self.session.new_proof(statement)
+        return list(self.session.proof.getbranch()[0]), self.session.proof.get_used()
+
+    def closures(self):
+        return [leaf.closed and leaf.closed[0] for leaf in self.session.proof.leaves.values()]
+
+
+class TestSearch(SearchCase):
+    PROVABLE = "((p or (p -> F)) -> F) -> F"
+    UNPROVABLE = "((p -> q) -> p) -> p"
+
+    def test_provable(self):
+        found = self.search().prove(*self.start(self.PROVABLE))
+        self.assertIsInstance(found, search.Derivation)
+        self.session.auto()
+        self.assertEqual(self.session.proof_finished(), (True, True))
+        self.assertEqual(set(self.closures()), {1})
+
+    def test_unprovable(self):
+        searching = self.search()
+        self.assertIsNone(searching.prove(*self.start(self.UNPROVABLE)))
+        self.assertTrue(searching.exhausted)
+        self.session.auto()
+        self.assertEqual(self.closures(), [8])
+
+    def test_cutoff(self):
+        searching = self.search(max_depth=0)
+        self.assertIsNone(searching.prove(*self.start(self.PROVABLE)))
+        self.assertFalse(searching.exhausted)
+        with mock.patch.object(engine, 'Search', partial(search.Search, max_depth=0)):
+            out = self.session.auto()
+        self.assertIn("Couldn't find a proof", out)
+        self.assertEqual(self.closures(), [None])
+        self.assertEqual(self.session.proof_finished(), (False, False))
+
+    def test_deepening(self):
+        # A proof needing more non-invertible moves than allowed isn't found, but the search isn't exhausted
+        branch = self.start(self.PROVABLE)
+        self.assertIsNone(self.search(max_depth=3).prove(*branch))
+        self.assertIsNotNone(self.search(max_depth=4).prove(*branch))
+
+    def test_proof_untouched(self):
+        branch, used = self.start(self.PROVABLE)
+        self.search().prove(branch, used)
+        self.assertEqual(len(self.session.proof.getbranch()[0]), 1)
+        self.assertEqual(self.closures(), [None])
+
+    def test_same_with_table(self):
+        branch = self.start(self.PROVABLE)
+        searching = self.search()
+        first = searching.prove(*branch)
+        self.assertEqual(searching.prove(*branch), first)
+        self.assertEqual(self.search().prove(*branch), first)
+
+
+class TestTable(SearchCase):
+
+    def test_counting(self):
+        table = search.TranspositionTable(4)
+        self.assertIsNone(table.get('a'))
+        table.put('a', 1)
+        self.assertEqual(table.get('a'), 1)
+        self.assertEqual(table.get('b', 2), 2)
+        self.assertEqual((table.hits, table.misses), (1, 2))
+        table.clear()
+        self.assertEqual((table.hits, table.misses, len(table)), (0, 0, 0))
+
+    def test_eviction(self):
+        table = search.TranspositionTable(3)
+        for i in 'abc':
+            table.put(i, i)
+        table.get('a')
+        table.put('d', 'd')
+        self.assertEqual(len(table), 3)
+        self.assertIsNone(table.get('b'))
+        self.assertEqual([table.get(i) for i in 'acd'], ['a', 'c', 'd'])
+
+    def test_size(self):
+        table = search.TranspositionTable()
+        for i in range(search.TABLE_SIZE + 10):
+            table.put(i, i)
+        self.assertEqual(len(table), search.TABLE_SIZE)
+        self.assertIsNone(table.get(9))
+        self.assertEqual(table.get(10), 10)
+
+    def test_state_key(self):
+        used = search.UsedSet([('sentvar_p',)])
+        a = search.state_key([['sentvar_q'], ['sentvar_p', 'turnstile_=>', 'sentvar_p']], used)
+        b = search.state_key([('sentvar_p', 'turnstile_=>', 'sentvar_p')], used.add(('sentvar_p',)))
+        self.assertEqual(a, b)
+        self.assertEqual(hash(a), hash(b))
+        self.assertNotEqual(a, search.state_key([('sentvar_p', 'turnstile_=>', 'sentvar_p')], search.UsedSet()))
+
+    def test_siblings(self):
+        # Both branches reach `p; q and q => q and p` (in another order), with other sequents and formulas in their used sets
+        self.start("((p and (q and q)) -> (q and p)) and (((q and q) and p) -> (q and p))")
+        first, second = (self.session.proof.leaves[name] for name in self.session.use_rule('right and', {}))
+        searching = self.search()
+        searching.prove(first.getbranch()[0], first.get_used())
+        searching.reset()
+        found = searching.prove(second.getbranch()[0], second.get_used())
+        # `right imp` and `left and` are used, then the sequent is found in the table
+        self.assertEqual(searching.nodes, 2)
+        self.assertEqual(found, self.search().prove(second.getbranch()[0], second.get_used()))
+        self.session.auto()
+        self.assertEqual(self.session.proof_finished(), (True, True))
+
+    def test_expand_cached(self):
+        FS = self.session.bound.FormalSystem
+        calls = []
+
+        def use_rule(*args):
+            calls.append(args[0])
+            return FS.use_rule(*args)
+        table = search.TranspositionTable()
+        branch, used = self.start("p -> p")
+        errors = self.session.acc('FormalSystem').utils.FormalSystemError
+        first = search.expand(table, use_rule, errors, 'right imp', branch, used, {})
+        self.assertEqual(search.expand(table, use_rule, errors, 'right imp', branch, used, {}), first)
+        self.assertEqual(calls, ['right imp'])
+
+    def test_expand_error(self):
+        table = search.TranspositionTable()
+        branch, used = self.start("p -> p")
+        errors = self.session.acc('FormalSystem').utils.FormalSystemError
+        for _ in range(2):
+            with self.assertRaises(errors):
+                search.expand(table, self.session.bound.FormalSystem.use_rule, errors, 'left imp', branch, used, {'partID': 5})
+        self.assertEqual(table.hits, 1)
+
+    def test_shared(self):
+        self.start("(p -> q) -> ((q -> r) -> (p -> r))")
+        self.session.auto()
+        self.assertGreater(len(self.session.table), 0)
+        misses = self.session.table.misses
+        self.start("(p -> q) -> ((q -> r) -> (p -> r))")
+        self.session.auto()
+        self.assertEqual(self.session.proof_finished(), (True, True))
+        self.assertGreater(self.session.table.hits, 0)
+        self.assertLess(self.session.table.misses - misses, misses)
+
+    def test_cleared_by_plugging(self):
+        for socket, plugin in (('FormalSystem', 'int_seqcal_swiss'), ('Auto', 'seqcal')):
+            self.start("(p -> q) -> ((q -> r) -> (p -> r))")
+            self.session.auto()
+            self.assertGreater(len(self.session.table), 0)
+            self.session.plug_switch(socket, plugin)
+            self.assertEqual(len(self.session.table), 0)
+
+    def test_not_cleared_by_output(self):
+        self.start("p -> p")
+        self.session.auto()
+        size = len(self.session.table)
+        self.session.plug_switch('Output', 'TeX_infer')
+        self.assertEqual(len(self.session.table), size)
+
+
+def rules_of(derivation):
+    """Rules used in a derivation; None stands for a child which wasn't derived"""
+    if derivation is None:
+        return [None]
+    return [derivation.rule] + [i for child in derivation.children for i in rules_of(child)]
+
+
+class TestBudget(SearchCase):
+    PROVABLE = TestSearch.PROVABLE
+
+    def setUp(self):
+        super().setUp()
+        self.branch = self.start(self.PROVABLE)
+        full = self.search()
+        full.prove(*self.branch)
+        self.full = full.stats()
+
+    def test_rules(self):
+        for limit in (0, 1, self.full.rules // 2, self.full.rules - 1):
+            searching = self.search(budget=search.Budget(rules=limit))
+            searching.prove(*self.branch)
+            self.assertEqual(searching.tripped, 'rules')
+            self.assertEqual(searching.stats().rules, limit)
+
+    def test_nodes(self):
+        for limit in (0, 1, self.full.nodes // 2, self.full.nodes - 1):
+            searching = self.search(budget=search.Budget(nodes=limit))
+            searching.prove(*self.branch)
+            self.assertEqual(searching.tripped, 'nodes')
+            self.assertEqual(searching.stats().nodes, limit)
+
+    def test_enough(self):
+        # A budget of n allows n, the search needing exactly that much isn't stopped
+        searching = self.search(budget=search.Budget(rules=self.full.rules, nodes=self.full.nodes))
+        self.assertIsInstance(searching.prove(*self.branch), search.Derivation)
+        self.assertIsNone(searching.tripped)
+        self.assertEqual(searching.stats()[:3], self.full[:3])
+
+    def test_time(self):
+        searching = self.search(budget=search.Budget(time=0))
+        searching.prove(*self.branch)
+        self.assertEqual(searching.tripped, 'time')
+        self.assertEqual(searching.stats().nodes, 0)
+
+    @test.skipIf(search.memory_used() is None, "memory can't be measured")
+    def test_memory(self):
+        searching = self.search(budget=search.Budget(memory=1))
+        searching.prove(*self.branch)
+        self.assertEqual(searching.tripped, 'memory')
+
+    @test.skipIf(search.resource is None, "needs the resource module")
+    def test_memory_without_proc(self):
+        with mock.patch('builtins.open', side_effect=OSError):
+            self.assertGreater(search.memory_used(), 0)
+            searching = self.search(budget=search.Budget(memory=1))
+            searching.prove(*self.branch)
+        self.assertEqual(searching.tripped, 'memory')
+
+    def test_memory_not_measurable(self):
+        with mock.patch.object(search, 'memory_used', return_value=None):
+            with self.assertRaises(ValueError):
+                self.search(budget=search.Budget(memory=1))
+            with self.assertRaises(engine.EngineError):
+                self.session.auto(budget=search.Budget(memory=1))
+            self.assertIsNone(self.search(budget=search.Budget(nodes=1)).prove(*self.start("p or q")))
+        self.assertEqual(self.closures(), [None])
+
+    def test_every_prove(self):
+        # The limits apply to every call, whatever the earlier calls used or left in the table
+        searching = self.search(budget=search.Budget(nodes=self.full.nodes))
+        for _ in range(3):
+            self.assertIsInstance(searching.prove(*self.branch), search.Derivation)
+            self.assertIsNone(searching.tripped)
+        self.assertEqual(searching.stats().nodes, 3*self.full.nodes)
+        self.assertGreater(len(searching.table), 0)
+
+    def test_reset(self):
+        searching = self.search(budget=search.Budget(nodes=1))
+        searching.prove(*self.branch)
+        self.assertEqual(searching.tripped, 'nodes')
+        searching.reset()
+        self.assertIsNone(searching.tripped)
+        self.assertFalse(searching.exhausted)
+        self.assertEqual(searching.stats()[:5], (0, 0, 0, 0, 0))
+
+        searching = self.search()
+        searching.prove(*self.start(TestSearch.UNPROVABLE))
+        self.assertTrue(searching.exhausted)
+        searching.reset()
+        self.assertFalse(searching.exhausted)
+
+    def test_auto(self):
+        out = self.session.auto(budget=search.Budget(rules=1))
+        self.assertIn("Search stopped, the rules budget was exceeded", out)
+        self.assertEqual(self.session.stats.rules, 1)
+
+    def test_cli(self):
+        # The session only has a dummy interface; the CLI module would log into a file
+        with mock.patch('logging.basicConfig'):
+            CLI = import_module('UserInterface.CLI')
+
+        def command(statement):
+            return "\n".join(CLI.performer(i, self.session) for i in CLI.parser(statement, CLI.command_dict))
+        self.assertEqual(command("auto budget depth=1"), "No such limit: depth")
+        self.assertEqual(command("auto budget nodes=x"), "Wrong value of the nodes limit: x")
+        self.assertIn("Search stopped, the nodes budget was exceeded", command("auto budget nodes=1 time=60"))
+        self.assertEqual(self.session.stats.nodes, 1)
+        self.assertIn("Proof was succesfully finished", command("auto budget rules=1000"))
+
+
+class TestPartial(SearchCase):
+
+    def setUp(self):
+        super().setUp()
+        self.noninvertible = set(self.session.acc('Auto').NONINVERTIBLE)
+
+    def test_invertible_only(self):
+        for statement in (TestSearch.PROVABLE, "((p or q) -> (q or p)) and (p -> q)", "(p and q) -> (q and (p or r))"):
+            searching = self.search(budget=search.Budget(nodes=1))
+            derivation = searching.prove(*self.start(statement))
+            self.assertEqual(searching.tripped, 'nodes')
+            self.assertIsNotNone(derivation)
+            self.assertFalse(set(rules_of(derivation)) & self.noninvertible)
+
+    def test_committed(self):
+        self.start("(p and q) -> (q and (p or r))")
+        self.session.auto(budget=search.Budget(nodes=1))
+        # right imp, left and and right and are used, q is closed; 'p or r' needs a non-invertible move
+        self.assertEqual(self.closures(), [1, None])
+        self.assertFalse(set(self.session.gettree()[1:]) & self.noninvertible)
+
+    def test_closed(self):
+        searching = self.search(budget=search.Budget(nodes=0))
+        self.assertEqual(searching.prove(*self.start("p -> p")), search.Derivation('right imp', {}, (search.Derivation(None, None, ()),)))
+
+    def test_nothing(self):
+        searching = self.search(budget=search.Budget(nodes=0))
+        self.assertIsNone(searching.prove(*self.start("p or (p -> F)")))
+        self.assertEqual(searching.tripped, 'nodes')
+
+
+class TestStats(test.TestCase):
+
+    def test_merge(self):
+        a = search.Stats(10, 4, 3, 2, 5, 1.5, {'right imp': (2, 0.5), 'left or': (1, 0.25)})
+        b = search.Stats(7, 6, 5, 1, 1, 0.5, {'right imp': (3, 0.25), 'left imp': (4, 1.0)})
+        merged = a.merge(b)
+        self.assertEqual(merged[:6], (17, 10, 5, 3, 6, 2.0))
+        self.assertEqual(merged.rule_time, {'right imp': (5, 0.75), 'left or': (1, 0.25), 'left imp': (4, 1.0)})
+        self.assertEqual(a.rule_time, {'right imp': (2, 0.5), 'left or': (1, 0.25)})
+        self.assertEqual(b.merge(a), merged)
+        self.assertEqual(merged.rules_per_second, 5.0)
+        self.assertEqual(merged.time_per_rule, {'right imp': 0.15, 'left or': 0.25, 'left imp': 0.25})
+
+    def test_empty(self):
+        empty = search.Stats(0, 0, 0, 0, 0, 0.0, {})
+        stats = search.Stats(3, 2, 1, 1, 0, 0.25, {'right imp': (2, 0.25)})
+        self.assertEqual(empty.merge(stats), stats)
+        self.assertEqual(empty.rules_per_second, 0.0)
+
+
+@test.skipUnless(engine.FORK_AVAILABLE, "needs fork")
+class TestParallel(SearchCase):
+    FORMULAS = ["(p -> q) -> ((q -> r) -> (p -> r))", "((p -> q) -> p) -> p", "(p or q) -> (q or p)",
+                "((p or (p -> F)) -> F) -> F", "p -> q"]
+
+    def run_auto(self, parallel):
+        """Splits the conjunction of the formulas into branches and proves them"""
+        engine.Tree.namegen.seed(7)
+        self.session.table.clear()
+        self.start(" and ".join(f"({i})" for i in self.FORMULAS))
+        todo = [self.session.branch]
+        while todo:
+            self.session.branch = todo.pop()
+            todo.extend(self.session.use_rule('right and', {}) or ())
+        out = self.session.auto(parallel)
+        return out, self.state(), len(self.session.table)
+
+    def test_same_as_sequential(self):
+        sequential = self.run_auto(1)
+        with mock.patch('os.cpu_count', return_value=4), mock.patch.object(engine, 'PARALLEL_THRESHOLD', 0):
+            parallel = self.run_auto(3)
+        self.assertEqual(parallel[:2], sequential[:2])
+        self.assertEqual(set(self.closures()), {1, 8})
+
+    def test_budget(self):
+        # The rule and node limits apply to every branch in both modes
+        budget = search.Budget(rules=20)
+        with mock.patch.object(self.session, 'auto', partial(self.session.auto, budget=budget)):
+            sequential = self.run_auto(1)
+            with mock.patch('os.cpu_count', return_value=4), mock.patch.object(engine, 'PARALLEL_THRESHOLD', 0):
+                parallel = self.run_auto(3)
+        self.assertEqual(parallel[:2], sequential[:2])
+        self.assertIn("Search stopped, the rules budget was exceeded", parallel[0])
+        self.assertEqual(set(self.closures()), {1, 8, None})
+
+    def test_table_learns(self):
+        with mock.patch('os.cpu_count', return_value=4), mock.patch.object(engine, 'PARALLEL_THRESHOLD', 0):
+            _, state, size = self.run_auto(3)
+        self.assertGreater(size, 0)
+        # The entries of the workers are in the table, so searching again only finds what's known
+        self.session.undo()
+        misses = self.session.table.misses
+        self.session.auto()
+        self.assertEqual(self.session.table.misses, misses)
+        self.assertEqual(self.session.gettree(), state[0])
+
+    def test_small_not_forked(self):
+        with mock.patch('os.cpu_count', return_value=4), \
+             mock.patch.object(engine.multiprocessing, 'get_context', side_effect=AssertionError("forked")):
+            self.assertEqual(self.run_auto(3)[:2], self.run_auto(1)[:2])
+
+    def test_one_per_cpu(self):
+        with mock.patch('os.cpu_count', return_value=1), mock.patch.object(engine, 'PARALLEL_THRESHOLD', 0), \
+             mock.patch.object(engine.multiprocessing, 'get_context', side_effect=AssertionError("forked")):
+            self.run_auto(3)
+
+
+if __name__ == "__main__":
+    test.main()
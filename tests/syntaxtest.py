@@ -1,7 +1,10 @@
 import unittest as test
 from importlib import import_module
+import json
 import os
+import pickle
 import sys
+import tempfile
 
 sys.path.append('../app/Lexicon')
 import basic
@@ -23,6 +26,120 @@ class TestTokenize(test.TestCase):
     def test_bracket(self):
         self.assertEqual(basic.tokenize("(p v q)", ['or', 'sentvar']), ["(", "sentvar_p", "or_v", "sentvar_q", ")"])
 
+    def test_longest_keyword(self):
+        self.assertEqual(basic.tokenize("p=>q->r", ['imp', 'turnstile', 'sentvar']), ["sentvar_p", "turnstile_=>", "sentvar_q", "imp_->", "sentvar_r"])
+
+    def test_defined_first(self):
+        self.assertEqual(basic.tokenize("pq or p", ['or', 'sentvar'], {'pq': 'sentvar'}), ["sentvar_pq", "or_or", "sentvar_p"])
+
+    def test_reserved_sign(self):
+        with self.assertRaises(basic.utils.CompilerError):
+            basic.tokenize("p_q", ["sentvar", "or"], {'p_q': 'sentvar'})
+
+
+class TestTokens(test.TestCase):
+
+    def test_type(self):
+        self.assertEqual([basic.get_type(i) for i in ("sentvar_p", "or_v", "(", "turnstile_=>")], ["sentvar", "or", "(", "turnstile"])
+
+    def test_lexem(self):
+        self.assertEqual([basic.get_lexem(i) for i in ("sentvar_p", "or_v", ")", "turnstile_=>")], ["p", "v", ")", "=>"])
+
+    def test_shared(self):
+        # Equal tokens are one object, also when they come from separately compiled lexicons or from the workers
+        basic.tokenized_cache.clear()
+        first = basic.tokenize("p v q", ['or', 'sentvar'])
+        basic.simplify_lexicon.cache_clear()
+        second = basic.tokenize("q or p", ['or', 'sentvar'])
+        self.assertIs(first[0], second[2])
+        self.assertIs(first[2], second[0])
+        statements = [f"p v q{' v r'*i}" for i in range(basic.POOL_THRESHOLD)]
+        pooled = list(basic.tokenize_many(statements, ['or', 'sentvar'], processes=2))
+        self.assertIs(pooled[-1][-1], pooled[1][-1])
+        self.assertIs(pooled[-1][0], first[0])
+
+
+class TestTokenizeMany(test.TestCase):
+
+    def setUp(self):
+        basic.tokenized_cache.clear()
+
+    def test_order(self):
+        statements = ["p v q", "(p)", "p v q"]
+        self.assertEqual(list(basic.tokenize_many(statements, ['or', 'sentvar'])),
+                         [basic.tokenize(i, ['or', 'sentvar']) for i in statements])
+
+    def test_cache(self):
+        first = next(basic.tokenize_many(["p v q"], ['or', 'sentvar']))
+        first.append("sentvar_r")
+        self.assertEqual(next(basic.tokenize_many(["p v q"], ['or', 'sentvar'])), ["sentvar_p", "or_v", "sentvar_q"])
+        self.assertEqual(len(basic.tokenized_cache), 1)
+
+    def test_error(self):
+        tokenized = basic.tokenize_many(["p v q", "p_q"], ['or', 'sentvar'], {'p_q': 'sentvar'})
+        self.assertEqual(next(tokenized), ["sentvar_p", "or_v", "sentvar_q"])
+        with self.assertRaises(basic.utils.CompilerError):
+            next(tokenized)
+
+    def test_processes(self):
+        statements = [f"p v q{' v r'*i}" for i in range(basic.POOL_THRESHOLD)]
+        self.assertEqual(list(basic.tokenize_many(statements, ['or', 'sentvar'], processes=2)),
+                         [basic.tokenize(i, ['or', 'sentvar']) for i in statements])
+
+
+class TestLexiconCache(test.TestCase):
+
+    def setUp(self):
+        self.old_dir = basic.CACHE_DIR
+        self.dir = tempfile.TemporaryDirectory()
+        basic.CACHE_DIR = self.dir.name
+        basic.simplify_lexicon.cache_clear()
+
+    def tearDown(self):
+        basic.CACHE_DIR = self.old_dir
+        basic.simplify_lexicon.cache_clear()
+        self.dir.cleanup()
+
+    def test_saved(self):
+        compiled = basic.simplify_lexicon(frozenset(['or', 'sentvar']), frozenset())
+        loaded = basic.load_lexicon(basic.cache_path(frozenset(['or', 'sentvar']), frozenset()))
+        self.assertEqual(compiled, loaded)
+
+    def test_reused(self):
+        basic.simplify_lexicon(frozenset(['or', 'sentvar']), frozenset())
+        basic.simplify_lexicon.cache_clear()
+        self.assertEqual(basic.tokenize("p v q", ['or', 'sentvar']), ["sentvar_p", "or_v", "sentvar_q"])
+
+    def test_key(self):
+        self.assertNotEqual(basic.cache_path(frozenset(['or']), frozenset()),
+                            basic.cache_path(frozenset(['or']), frozenset([('pq', 'sentvar')])))
+
+    def test_broken_file(self):
+        path = basic.cache_path(frozenset(['or', 'sentvar']), frozenset())
+        with open(path, 'wb') as f:
+            f.write(b'not a lexicon')
+        self.assertEqual(basic.tokenize("p v q", ['or', 'sentvar']), ["sentvar_p", "or_v", "sentvar_q"])
+
+    def test_other_revision(self):
+        basic.simplify_lexicon(frozenset(['or', 'sentvar']), frozenset())
+        path = basic.cache_path(frozenset(['or', 'sentvar']), frozenset())
+        with open(path) as f:
+            data = json.load(f)
+        data['revision'] = 'other'
+        with open(path, 'w') as f:
+            json.dump(data, f)
+        self.assertIsNone(basic.load_lexicon(path))
+
+    def test_pickle_ignored(self):
+        path = basic.cache_path(frozenset(['or', 'sentvar']), frozenset())
+        with open(path, 'wb') as f:
+            pickle.dump({'pattern': '', 'defined': {}, 'keywords': {}, 'variables': [], 'trie': {}, 'chars': {}}, f)
+        self.assertIsNone(basic.load_lexicon(path))
+
+    def test_pattern(self):
+        compiled = basic.simplify_lexicon(frozenset(['or', 'sentvar']), frozenset())
+        self.assertEqual(compiled.pattern.findall("p v q"), ["p", "v", "q"])
+
 
 if __name__ == "__main__":
     test.main()
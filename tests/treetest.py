@@ -0,0 +1,346 @@
+import unittest as test
+import os
+import io
+import random
+import struct
+import sys
+
+import benchmark_tree
+
+sys.path.append('../app/')
+cwd = os.getcwd()
+os.chdir('../app/')  # tree.py reads colors.json from the app directory
+try:
+    import tree
+finally:
+    os.chdir(cwd)
+
+
+def build(expansions, history=None):
+    """Builds a tree where every node is identified by its first sentence; returns the nodes by their sentences"""
+    root = tree.Tree(['r'], history=history)
+    nodes = {'r': root}
+    for parent, left, right in expansions:
+        nodes[parent].append((([left],), ([right],)))
+        nodes[left], nodes[right] = nodes[parent].children
+    return nodes
+
+
+EXPANSIONS = (('r', 'a', 'b'), ('b', 'c', 'd'), ('a', 'e', 'f'), ('d', 'g', 'h'),
+              ('e', 'i', 'j'), ('c', 'k', 'l'), ('h', 'm', 'n'), ('f', 'o', 'p'))
+
+
+def ident(node):
+    return None if node is None else node.statements[0][0]
+
+
+class TestNeighbours(test.TestCase):
+    # Results of the implementation which searched the whole dict of leaves
+
+    NODES = {
+        'a': (None, 'b'), 'b': ('a', None), 'c': ('f', 'd'), 'd': ('c', None), 'e': (None, 'f'), 'f': ('e', 'c'),
+        'g': ('l', 'h'), 'h': ('g', None), 'i': (None, 'j'), 'j': ('i', 'o'), 'k': ('p', 'l'), 'l': ('k', 'g'),
+        'm': ('g', 'n'), 'n': ('m', None), 'o': ('j', 'p'), 'p': ('o', 'k'), 'r': (None, None),
+    }
+    BRANCHES = {
+        'g': ('k', 'o'), 'i': (None, 'k'), 'j': ('m', 'l'), 'k': ('i', 'g'), 'l': ('j', 'n'),
+        'm': ('o', 'j'), 'n': ('l', 'p'), 'o': ('g', 'm'), 'p': ('n', None),
+    }
+
+    def setUp(self):
+        self.nodes = build(EXPANSIONS)
+
+    def test_node(self):
+        for name, expected in self.NODES.items():
+            node = self.nodes[name]
+            self.assertEqual((ident(node.getnode_neighbour('L')), ident(node.getnode_neighbour('Right'))), expected, name)
+
+    def test_branch(self):
+        for name, expected in self.BRANCHES.items():
+            node = self.nodes[name]
+            self.assertEqual((ident(node.getbranch_neighbour('Left')), ident(node.getbranch_neighbour('R'))), expected, name)
+
+    def test_wrong_direction(self):
+        with self.assertRaises(tree.TreeError):
+            self.nodes['g'].getbranch_neighbour('up')
+        with self.assertRaises(tree.TreeError):
+            self.nodes['g'].getnode_neighbour('up')
+
+    def test_registry_order(self):
+        leaves = self.nodes['r'].leaves
+        self.assertEqual([ident(i) for i in leaves.values()], ['i', 'k', 'g', 'o', 'm', 'j', 'l', 'n', 'p'])
+        self.assertLess(leaves.position(self.nodes['i'].name), leaves.position(self.nodes['p'].name))
+
+
+def copied_branch(node):
+    """`_getbranch` of the implementation which concatenated the lists of the ancestors"""
+    if node.parent:
+        return copied_branch(node.parent) + node.statements
+    else:
+        return node.statements
+
+
+class TestBranch(test.TestCase):
+
+    def setUp(self):
+        # Nodes of different lengths
+        root = tree.Tree(['r'])
+        self.nodes = {'r': root}
+        for i, (parent, left, right) in enumerate(EXPANSIONS):
+            self.nodes[parent].append((tuple(['x', parent, str(j)] for j in range(i % 3 + 1)),))
+            self.nodes[parent].append((([left],), ([right],)))
+            self.nodes[left], self.nodes[right] = self.nodes[parent].children
+        self.nodes['p'].append(((['y'], ['z']),))
+
+    def test_like_copies(self):
+        for name, node in self.nodes.items():
+            branch, copied = node.getbranch()[0], copied_branch(node)
+            self.assertEqual(list(branch), copied, name)
+            self.assertEqual(len(branch), len(copied))
+            self.assertEqual(branch, copied)
+            self.assertEqual([branch[i] for i in range(-len(copied), len(copied))], copied+copied)
+
+    def test_slices(self):
+        for name in ('r', 'a', 'i', 'j', 'p'):
+            branch, copied = self.nodes[name].getbranch()[0], copied_branch(self.nodes[name])
+            for start in (None, 0, 1, 2, 3, -1, -4, 50):
+                for stop in (None, 0, 2, 4, -1, -3, 50):
+                    for step in (None, 1, 2, -1):
+                        self.assertEqual(branch[start:stop:step], copied[start:stop:step], (name, start, stop, step))
+
+    def test_out_of_range(self):
+        branch = self.nodes['i'].getbranch()[0]
+        for index in (len(branch), -len(branch)-1):
+            with self.assertRaises(IndexError):
+                branch[index]
+
+    def test_no_cache(self):
+        # The view keeps the nodes, not a copy of every ancestor in every node
+        self.nodes['i'].getbranch()
+        self.assertFalse(hasattr(self.nodes['a'], '_path'))
+        self.assertNotIn('_path', tree.Tree.__slots__)
+
+
+class TestMemory(test.TestCase):
+
+    def test_slots(self):
+        node = build(EXPANSIONS)['i']
+        self.assertFalse(hasattr(node, '__dict__'))
+
+    def test_caches(self):
+        # Measured on a copy of the module, as the benchmark replaces `Tree.gen_name`
+        cwd = os.getcwd()
+        os.chdir(benchmark_tree.APP)
+        try:
+            module = benchmark_tree.load(os.path.join(benchmark_tree.APP, 'tree.py'), 'measured_tree')
+        finally:
+            os.chdir(cwd)
+        built, read, printed = benchmark_tree.measure(module, 2000)
+        self.assertAlmostEqual(read, built, delta=1)
+        self.assertLess(printed - read, built/2)
+
+
+class TestNames(test.TestCase):
+
+    def test_palette_first(self):
+        names = tree.NameAllocator(['Red', 'Blue'])
+        self.assertEqual({names.allocate(), names.allocate()}, {'Red', 'Blue'})
+        self.assertEqual(names.allocate(), '1')
+
+    def test_reserved(self):
+        names = tree.NameAllocator(['Red', 'Blue'])
+        names.reserve('Red')
+        names.reserve('1')
+        self.assertEqual([names.allocate(), names.allocate()], ['Blue', '2'])
+
+    def test_unique_past_limit(self):
+        # The names used to run out at 1000 leaves
+        node = tree.Tree(['r'])
+        for i in range(1200):
+            node.append(((f'{i}a',), (f'{i}b',)))
+            node = node.children[1]
+        names = list(node.leaves)
+        self.assertEqual(len(names), 1201)
+        self.assertEqual(len(set(names)), 1201)
+
+
+class TestOpenLeaves(test.TestCase):
+
+    def setUp(self):
+        self.history = tree.History()
+        self.nodes = build(EXPANSIONS, self.history)
+        self.root = self.nodes['r']
+
+    def open_idents(self):
+        return [ident(self.root.leaves[i]) for i in self.root.leaves.open_names()]
+
+    def test_order(self):
+        self.assertEqual(self.open_idents(), ['i', 'k', 'g', 'o', 'm', 'j', 'l', 'n', 'p'])
+        self.assertEqual(ident(self.root.first_open()), 'i')
+        self.assertEqual(ident(self.root.first_open(skip=(self.nodes['i'].name,))), 'k')
+
+    def test_closing(self):
+        self.nodes['i'].close('x')
+        self.nodes['o'].close('x', 0)
+        self.assertEqual(self.open_idents(), ['k', 'g', 'm', 'j', 'l', 'n', 'p'])
+        self.assertEqual(ident(self.root.first_open()), 'k')
+        self.assertEqual(self.root.leaves.open_count(), 7)
+
+    def test_counters(self):
+        for name in ('i', 'k', 'g', 'o', 'm', 'j', 'l', 'n'):
+            self.nodes[name].close('x')
+        self.assertFalse(self.root.is_finished())
+        self.nodes['p'].close('x', 8)
+        self.assertTrue(self.root.is_finished())
+        self.assertFalse(self.root.is_closed())
+        self.nodes['p']._set_closed((1, 'x'))
+        self.assertTrue(self.root.is_closed())
+        self.assertIsNone(self.root.first_open())
+
+    def test_undo(self):
+        self.history.checkpoint()
+        self.nodes['i'].close('x')
+        self.nodes['k'].append(((['s'],), (['t'],)))
+        self.assertEqual(self.open_idents(), ['s', 'g', 'o', 'm', 'j', 'l', 'n', 'p', 't'])
+        self.history.undo()
+        self.assertEqual(self.open_idents(), ['i', 'k', 'g', 'o', 'm', 'j', 'l', 'n', 'p'])
+        self.history.redo()
+        self.assertEqual(self.open_idents(), ['s', 'g', 'o', 'm', 'j', 'l', 'n', 'p', 't'])
+
+    def test_reopened_order(self):
+        self.history.checkpoint()
+        self.nodes['i'].close('x')
+        self.nodes['p'].close('x')
+        self.history.undo()
+        self.assertEqual(ident(self.root.first_open()), 'i')
+        self.assertEqual(self.open_idents()[-1], 'p')
+
+
+def copied_codes(old, used_l):
+    """`add_used` of the implementation which copied the used set for every branch"""
+    new = old.copy()
+    for used in used_l:
+        if used == -1:
+            new.clear()
+        elif used == 0:
+            break
+        else:
+            new.add(tuple(used))
+    return new
+
+
+class TestUsedSet(test.TestCase):
+
+    def test_children_separate(self):
+        root = tree.Tree(['r'], used={('p',)})
+        root.append((('a',), ('b',)))
+        left, right = root.children
+        left.add_used((('q',),))
+        right.add_used((('s',), ('t',)))
+        self.assertEqual(set(root.get_used()), {('p',)})
+        self.assertEqual(set(left.get_used()), {('p',), ('q',)})
+        self.assertEqual(set(right.get_used()), {('p',), ('s',), ('t',)})
+
+    def test_snapshot(self):
+        node = tree.Tree(['r'])
+        node.add_used((('p',),))
+        old = node.get_used()
+        node.add_used((('q',),))
+        self.assertEqual(set(old), {('p',)})
+        self.assertNotIn(('q',), old)
+
+    def test_codes(self):
+        node = tree.Tree(['r'], used={('p',)})
+        node.add_used((('q',), 0, ('r',)))
+        self.assertEqual(set(node.get_used()), {('p',), ('q',)})
+        node.add_used((-1, ('s',)))
+        self.assertEqual(set(node.get_used()), {('s',)})
+
+    def test_unhashable(self):
+        with self.assertRaises(TypeError):
+            ['p'] in tree.UsedSet()
+
+    def test_like_copies(self):
+        rng = random.Random(0)
+        items = [(f'sentvar_{i}',) for i in 'pqrstuvwxyz'] + [('(', 'sentvar_p', ')'), ('sentvar_p', 'and_and', 'sentvar_q')]
+        for _ in range(50):
+            persistent, copied = tree.UsedSet(), set()
+            versions = []
+            for _ in range(40):
+                codes = [rng.choice(items) if rng.random() < 0.85 else rng.choice((-1, 0)) for _ in range(rng.randint(1, 6))]
+                persistent, copied = persistent.apply_codes(codes), copied_codes(copied, codes)
+                versions.append((persistent, copied))
+                self.assertEqual(len(persistent), len(copied))
+                self.assertEqual(set(persistent), copied)
+                self.assertTrue(all((i in persistent) == (i in copied) for i in items))
+            # Older versions aren't changed by the later ones
+            self.assertTrue(all(set(a) == b for a, b in versions))
+
+
+class TestSnapshot(test.TestCase):
+
+    def setUp(self):
+        self.nodes = build(EXPANSIONS)
+        self.root = self.nodes['r']
+        self.nodes['a'].add_used((('p',),))
+        self.nodes['i'].add_used((('q',), ('r',)))
+        self.nodes['j'].add_used((-1, ('s',)))
+        self.nodes['i'].append(((['t'],),))
+        self.nodes['i'].close('x')
+        self.nodes['o'].close('y', 8)
+
+    def dumped(self, meta=None):
+        file = io.BytesIO()
+        self.root.dump(file, meta)
+        return file.getvalue()
+
+    def test_roundtrip(self):
+        root, meta = tree.Tree.load(io.BytesIO(self.dumped({'branch': 'x'})))
+        self.assertEqual(meta, {'branch': 'x'})
+        self.assertEqual(root.gettree(), self.root.gettree())
+        self.assertEqual(list(root.leaves), list(self.root.leaves))
+        for name, leaf in self.root.leaves.items():
+            loaded = root.leaves[name]
+            self.assertEqual(loaded.closed, leaf.closed)
+            self.assertEqual(set(loaded.get_used()), set(leaf.get_used()))
+            self.assertEqual(list(loaded.getbranch()[0]), list(leaf.getbranch()[0]))
+        self.assertEqual(list(root.leaves.open_names()), list(self.root.leaves.open_names()))
+        self.assertEqual((root.is_finished(), root.is_closed()), (self.root.is_finished(), self.root.is_closed()))
+
+    def test_expected(self):
+        data = self.dumped({'FormalSystem': 'a'})
+        tree.Tree.load(io.BytesIO(data), expected={'FormalSystem': 'a'})
+        with self.assertRaises(tree.TreeError):
+            tree.Tree.load(io.BytesIO(data), expected={'FormalSystem': 'b'})
+
+    def test_magic(self):
+        data = b'XXXX' + self.dumped()[4:]
+        with self.assertRaises(tree.TreeError):
+            tree.Tree.load(io.BytesIO(data))
+
+    def test_version(self):
+        data = self.dumped()
+        data = data[:4] + struct.pack('<H', tree.SNAPSHOT_VERSION+1) + data[6:]
+        with self.assertRaises(tree.TreeError):
+            tree.Tree.load(io.BytesIO(data))
+
+    def test_layout(self):
+        # Standard sizes whatever the platform: Q prefixes, 4 byte integers
+        data = self.dumped({'a': 1})
+        self.assertEqual(struct.unpack_from('<4sH', data), (tree.SNAPSHOT_MAGIC, tree.SNAPSHOT_VERSION))
+        length, = struct.unpack_from('<Q', data, 6)
+        self.assertEqual(data[14:14+length], b'{"a": 1}')
+        offset = 14+length
+        count, = struct.unpack_from('<Q', data, offset)
+        lengths = struct.unpack_from(f'<{count}I', data, offset+8)
+        offset += 8 + 4*count
+        self.assertEqual(struct.unpack_from('<Q', data, offset), (sum(lengths),))
+        self.assertIn(b'x', data[offset+8:offset+8+sum(lengths)])
+
+    def test_truncated(self):
+        with self.assertRaises(tree.TreeError):
+            tree.Tree.load(io.BytesIO(self.dumped()[:-3]))
+
+
+if __name__ == "__main__":
+    test.main()
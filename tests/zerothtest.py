@@ -6,6 +6,8 @@ import sys
 sys.path.append('../app/FormalSystem')
 
 import zeroth_order_logic as zol
+import int_seqcal_scottish as scottish
+import int_seqcal_swiss as swiss
 
 def join_to_string(sentence) -> str:
     """Writes the sentence as a string, where tokens are written as `<[token type]_[lexem]>`"""
@@ -298,6 +300,57 @@ class Test_check_contradict(test.TestCase):
 
 
 
+class Test_formula(test.TestCase):
+    PRECEDENCE = {'and': 4, 'or': 4, 'imp': 3, 'sep': 2, 'turnstile': 1}
+    # ~((p and q) -> (r)) or s
+    TOKENS = ('not_~', '(', '(', 'sentvar_p', 'and_and', 'sentvar_q', ')', 'imp_->', '(', 'sentvar_r', ')', ')', 'or_or', 'sentvar_s')
+
+    def index(self, node):
+        return node.match, node.depth, node.top, node.level, node.balanced, node.opening
+
+    def test_shared(self):
+        node = zol.utils.formula(self.TOKENS)
+        self.assertIs(zol.utils.formula(tuple(self.TOKENS)), node)
+        left, right = node.split(12)
+        self.assertIs(zol.utils.formula(self.TOKENS[:12]), left)
+        self.assertIs(zol.utils.formula(('sentvar_s',)), right)
+
+    def test_shared_after_eviction(self):
+        # Nodes in use are never duplicated, even when the cache forgot them
+        node = zol.utils.formula(self.TOKENS)
+        part = node.split(12)[0].reduced()
+        zol.utils.formula.cache_clear()
+        self.assertIs(zol.utils.formula(self.TOKENS), node)
+        self.assertIs(zol.utils.formula(part.tokens), part)
+
+    def test_matching(self):
+        node = zol.utils.formula(self.TOKENS)
+        self.assertEqual([(i, j) for i, j in enumerate(node.match) if j >= 0 and i < j], [(1, 11), (2, 6), (8, 10)])
+        self.assertEqual([i for i, _ in node.top], [0, 12, 13])
+        self.assertTrue(node.balanced)
+        unbalanced = zol.utils.formula(('(', 'sentvar_p', ')', ')', '('))
+        self.assertEqual(unbalanced.match, [2, -1, 0, -1, -1])
+        self.assertFalse(unbalanced.balanced)
+
+    def test_index_of_parts(self):
+        # Indexes read from the parent are the ones the subformula would get on its own
+        nodes = [zol.utils.formula(self.TOKENS)]
+        while nodes:
+            node = nodes.pop()
+            self.assertEqual(self.index(node), self.index(zol.utils.Formula(node.tokens)), node)
+            if (main := node.main(self.PRECEDENCE)) is not None:
+                nodes.extend(i.reduced() for i in node.split(main[0]))
+            elif node.size > 1 and node.tokens[0] != '(':
+                nodes.append(node.split(0)[1].reduced())
+
+    def test_reduced(self):
+        node = zol.utils.formula(('(', '(', 'sentvar_p', 'and_and', '(', 'sentvar_q', ')', ')', ')'))
+        reduced = node.reduced()
+        self.assertEqual(reduced.tokens, ('sentvar_p', 'and_and', '(', 'sentvar_q', ')'))
+        self.assertEqual(self.index(reduced), self.index(zol.utils.Formula(reduced.tokens)))
+        self.assertIs(reduced.reduced(), reduced)
+
+
 class Test_bracket_reduction(test.TestCase):
 
     def setUp(self):
@@ -344,6 +397,175 @@ class Test_bracket_reduction(test.TestCase):
                          '<not_~>(<not_~>(((<not_~><sentvar_q>)<and_and><sentvar_r>)<or_v>((<sentvar_q>))<or_or>(<not_~>(<sentvar_r>))))')
 
 
+class Test_get_literal(test.TestCase):
+
+    def test_contradicting(self):
+        key, _ = zol.get_literal(['not_~', '(', '(', 'sentvar_p', 'and_^', 'sentvar_q', ')', ')'])
+        _, negation = zol.get_literal(['sentvar_p', 'and_^', 'sentvar_q'])
+        self.assertEqual(key, negation)
+
+    def test_double_neg(self):
+        key, _ = zol.get_literal(['not_~', 'not_~', 'sentvar_p'])
+        _, negation = zol.get_literal(['sentvar_p'])
+        self.assertNotEqual(key, negation)
+
+
+class Test_sequent(test.TestCase):
+
+    def test_roundtrip(self):
+        tokens = ['^', 'sentvar_p', 'sep_;', '(', 'sentvar_p', 'and_and', 'sentvar_q', ')', 'turnstile_=>', 'sentvar_q']
+        seq = zol.utils.sequent(tuple(tokens))
+        self.assertEqual(seq.stoup, 0)
+        self.assertEqual(seq[1], ['(', 'sentvar_p', 'and_and', 'sentvar_q', ')'])
+        self.assertEqual(seq.tokens(), tokens)
+
+    def test_modification(self):
+        seq = zol.utils.sequent(('sentvar_p', 'sep_;', 'sentvar_q', 'turnstile_=>', 'sentvar_r'))
+        new = seq.remove(0).add(['sentvar_r'], ['sentvar_r']).conclude(['sentvar_p'])
+        self.assertEqual(new.tokens(), ['sentvar_r', 'sep_;', 'sentvar_r', 'sep_;', 'sentvar_q', 'turnstile_=>', 'sentvar_p'])
+        self.assertEqual(new.count(['sentvar_r']), 2)
+        self.assertNotIn(['sentvar_p'], new)
+        self.assertEqual(seq.tokens(), ['sentvar_p', 'sep_;', 'sentvar_q', 'turnstile_=>', 'sentvar_r'])
+
+
+class Test_stoup(test.TestCase):
+    """Rules used by hand don't manage the stoup, they only keep it in place"""
+
+    def setUp(self):
+        # ^(p -> q) -> r; s => r
+        self.branch = [['^', '(', 'sentvar_p', 'imp_->', 'sentvar_q', ')', 'imp_->', 'sentvar_r', 'sep_;', 'sentvar_s', 'turnstile_=>', 'sentvar_r']]
+
+    def test_left_imp_consumed(self):
+        for system in (scottish, swiss):
+            out, _ = system.use_rule('left imp', self.branch, set(), {'partID': 1}, False)
+            self.assertEqual(out, (
+                (['(', 'sentvar_p', 'imp_->', 'sentvar_q', ')', 'imp_->', 'sentvar_r', 'sep_;', 'sentvar_s', 'turnstile_=>', 'sentvar_p', 'imp_->', 'sentvar_q'],),
+                (['sentvar_r', 'sep_;', 'sentvar_s', 'turnstile_=>', 'sentvar_r'],),
+            ))
+
+    def test_left_imp_kept(self):
+        branch = [['^', 'sentvar_s', 'sep_;', 'sentvar_p', 'imp_->', 'sentvar_q', 'turnstile_=>', 'sentvar_r']]
+        for system in (scottish, swiss):
+            out, _ = system.use_rule('left imp', branch, set(), {'partID': 2}, False)
+            self.assertEqual(out, (
+                (['sentvar_p', 'imp_->', 'sentvar_q', 'sep_;', '^', 'sentvar_s', 'turnstile_=>', 'sentvar_p'],),
+                (['sentvar_q', 'sep_;', '^', 'sentvar_s', 'turnstile_=>', 'sentvar_r'],),
+            ))
+
+    def test_right_or(self):
+        branch = [['^', 'sentvar_s', 'sep_;', 'sentvar_p', 'turnstile_=>', 'sentvar_p', 'or_or', 'sentvar_q']]
+        for system in (scottish, swiss):
+            out, _ = system.use_rule('right or', branch, set(), {'side': 'l'}, False)
+            self.assertEqual(out, ((['^', 'sentvar_s', 'sep_;', 'sentvar_p', 'turnstile_=>', 'sentvar_p'],),))
+
+
+class Test_branch_untouched(test.TestCase):
+    """Rules get the sentences of the proof itself (there are no defensive copies), so they must not change them"""
+    BRANCHES = (
+        # p and q; p or q; (p -> q) -> r => (q and p) or (r -> p)
+        [['sentvar_p', 'and_and', 'sentvar_q', 'sep_;', 'sentvar_p', 'or_or', 'sentvar_q', 'sep_;',
+          '(', 'sentvar_p', 'imp_->', 'sentvar_q', ')', 'imp_->', 'sentvar_r', 'turnstile_=>',
+          '(', 'sentvar_q', 'and_and', 'sentvar_p', ')', 'or_or', '(', 'sentvar_r', 'imp_->', 'sentvar_p', ')']],
+        # ^p -> q; p => (q and p) and (p -> q)
+        [['turnstile_=>', 'sentvar_p'], ['^', 'sentvar_p', 'imp_->', 'sentvar_q', 'sep_;', 'sentvar_p', 'turnstile_=>',
+          '(', 'sentvar_q', 'and_and', 'sentvar_p', ')', 'and_and', '(', 'sentvar_p', 'imp_->', 'sentvar_q', ')']],
+    )
+    CONTEXTS = ({}, {'partID': 1}, {'partID': 2}, {'partID': 3}, {'conn_side': 'l'}, {'conn_side': 'r'})
+
+    def test_rules(self):
+        for system in (scottish, swiss):
+            for branch in self.BRANCHES:
+                for name in system.get_rules():
+                    for context in self.CONTEXTS:
+                        if set(context) != {i.variable for i in system.get_needed_context(name)}:
+                            continue
+                        before = [list(i) for i in branch]
+                        used = {('sentvar_s',)}
+                        try:
+                            out, _ = system.use_rule(name, branch, used, dict(context), False)
+                        except system.utils.FormalSystemError:
+                            continue
+                        self.assertEqual(branch, before, (system.__name__, name, context))
+                        self.assertEqual(used, {('sentvar_s',)})
+                        # The new sentences don't share lists with the branch
+                        for sentence in (j for i in out or () for j in i):
+                            self.assertFalse(any(sentence is i for i in branch))
+
+
+class Test_loop_detection(test.TestCase):
+    # (p -> q) or (q -> p); p and q => p or q
+    BRANCH = [['(', 'sentvar_p', 'imp_->', 'sentvar_q', ')', 'or_or', '(', 'sentvar_q', 'imp_->', 'sentvar_p', ')', 'sep_;',
+               'sentvar_p', 'and_and', 'sentvar_q', 'turnstile_=>', 'sentvar_p', 'or_or', 'sentvar_q']]
+
+    def test_other_connective(self):
+        # Loop detection reads the sides of the connective before the rule is used
+        for name, context in (('left imp', {'partID': 1}), ('left or', {'partID': 2}), ('right imp', {}), ('right and', {})):
+            self.assertEqual(scottish.use_rule(name, self.BRANCH, set(), context, False), (None, None), name)
+
+    def test_sides(self):
+        self.assertEqual(scottish.sides(['(', 'sentvar_p', ')', 'imp_->', 'sentvar_q'], 'imp'),
+                         (['sentvar_p'], ['sentvar_q']))
+        self.assertIsNone(scottish.sides(['sentvar_p', 'imp_->', 'sentvar_q'], 'or'))
+
+    def test_loop(self):
+        branch = [['sentvar_p', 'imp_->', 'sentvar_q', 'turnstile_=>', 'sentvar_p']]
+        with self.assertRaises(scottish.utils.FormalSystemError):
+            scottish.use_rule('left imp', branch, {('sentvar_p',)}, {'partID': 1}, False)
+
+
+class Test_canonical(test.TestCase):
+    PRECEDENCE = {'and': 4, 'or': 4, 'imp': 3, 'sep': 2, 'turnstile': 1}
+
+    def setUp(self):
+        self.func = new_notation(lambda s: list(zol.utils.canonical(s, self.PRECEDENCE)))
+
+    def test_redundant(self):
+        self.assertEqual(self.func('((<sentvar_p>))<and_^>(<sentvar_q>)'), '<sentvar_p><and_^><sentvar_q>')
+
+    def test_inner(self):
+        self.assertEqual(self.func('((<sentvar_p><and_^><sentvar_q>))<imp_->><sentvar_r>'),
+                         self.func('(<sentvar_p><and_^><sentvar_q>)<imp_->>((<sentvar_r>))'))
+
+    def test_structure_kept(self):
+        self.assertNotEqual(self.func('(<sentvar_p><imp_->><sentvar_q>)<imp_->><sentvar_r>'),
+                            self.func('<sentvar_p><imp_->>(<sentvar_q><imp_->><sentvar_r>)'))
+
+    def test_interned(self):
+        a = zol.utils.canonical(['(', 'sentvar_p', ')', 'and_^', 'sentvar_q'], self.PRECEDENCE)
+        b = zol.utils.canonical(['sentvar_p', 'and_^', '(', 'sentvar_q', ')'], self.PRECEDENCE)
+        self.assertIs(a, b)
+
+    def test_sequent_order(self):
+        a = zol.utils.sequent(('sentvar_p', 'sep_;', '(', 'sentvar_q', ')', 'turnstile_=>', 'sentvar_r'))
+        b = zol.utils.sequent(('sentvar_q', 'sep_;', 'sentvar_p', 'turnstile_=>', 'sentvar_r'))
+        self.assertEqual(zol.utils.canonical_sequent(a, self.PRECEDENCE), zol.utils.canonical_sequent(b, self.PRECEDENCE))
+
+    def test_sequent_stoup(self):
+        a = zol.utils.sequent(('^', 'sentvar_p', 'sep_;', 'sentvar_q', 'turnstile_=>', 'sentvar_r'))
+        b = zol.utils.sequent(('sentvar_p', 'sep_;', 'sentvar_q', 'turnstile_=>', 'sentvar_r'))
+        self.assertNotEqual(zol.utils.canonical_sequent(a, self.PRECEDENCE), zol.utils.canonical_sequent(b, self.PRECEDENCE))
+
+    def test_subformulas(self):
+        seq = zol.utils.sequent(('(', 'sentvar_p', 'and_^', 'sentvar_q', ')', 'imp_->', 'sentvar_r', 'turnstile_=>', 'sentvar_q'))
+        self.assertEqual(zol.utils.subformulas(seq, self.PRECEDENCE),
+                         {('(', 'sentvar_p', 'and_^', 'sentvar_q', ')', 'imp_->', 'sentvar_r'),
+                          ('sentvar_p', 'and_^', 'sentvar_q'), ('sentvar_p',), ('sentvar_q',), ('sentvar_r',)})
+
+    def test_readable_used(self):
+        seq = zol.utils.sequent(('sentvar_p', 'sep_;', 'sentvar_q', 'turnstile_=>', '(', 'sentvar_p', ')'))
+        used = {('sentvar_q',), ('sentvar_s',), ('sentvar_q', 'turnstile_=>', 'sentvar_p'),
+                ('sentvar_q', 'turnstile_=>', 'sentvar_s'), ('sentvar_p', 'and_^', 'sentvar_q')}
+        self.assertEqual(zol.utils.readable_used(used, seq, self.PRECEDENCE),
+                         {('sentvar_q',), ('sentvar_q', 'turnstile_=>', 'sentvar_p')})
+
+    def test_state_key(self):
+        for system in (scottish, swiss):
+            a = system.state_key([['sentvar_p', 'sep_;', 'sentvar_q', 'turnstile_=>', 'sentvar_p']], {('sentvar_q',), ('sentvar_s',)})
+            b = system.state_key([['sentvar_r'], ['sentvar_q', 'sep_;', 'sentvar_p', 'turnstile_=>', 'sentvar_p']], {('sentvar_q',)})
+            self.assertEqual(a, b)
+            self.assertNotEqual(a, system.state_key([['sentvar_q', 'sep_;', 'sentvar_p', 'turnstile_=>', 'sentvar_p']], set()))
+
+
 
 if __name__ == "__main__":
     test.main()